@@ -1,23 +1,64 @@
+import time
+
+start_time = time.perf_counter()  # see --profile-startup
+
+import argparse
 import logging
 import sys
 
 from PyQt5.QtWidgets import QApplication
 
+qt_time = time.perf_counter()
+
 from colorful_logger_app.constants import *
 from colorful_logger_app.logger_gui import MainWindow
 
+app_time = time.perf_counter()
+
 __author__ = APP_AUTHOR
 __license__ = APP_LICENCE
 __version__ = APP_VERSION
 __email__ = APP_AUTHOR_EMAIL
 __status__ = APP_STATUS
 
+
+def startup_report(steps) -> str:
+    """return the time of each (name, end time) step of the startup, from start_time"""
+    lines = []
+    last = start_time
+    for name, end in steps:
+        lines.append("{0:<20} {1:8.1f} ms".format(name, (end - last) * 1000))
+        last = end
+    lines.append("{0:<20} {1:8.1f} ms".format("total", (last - start_time) * 1000))
+    return "\n".join(lines)
+
+
 if __name__ == '__main__':
-    logging.basicConfig(stream=sys.stdout, level=logging.DEBUG, format="%(levelname)-8s : %(message)s")
+    import multiprocessing
+    multiprocessing.freeze_support()  # the bulk parser workers of a frozen application
+    parser = argparse.ArgumentParser(description=APP_NAME)
+    parser.add_argument("file", nargs="?", default=fake_log_dev_path, help="log file to open, - follows stdin")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time of the imports and of the construction of the window")
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stderr if args.file == "-" else sys.stdout, level=logging.DEBUG,
+                        format="%(levelname)-8s : %(message)s")
     app = QApplication([])
+    app_created = time.perf_counter()
     window = MainWindow()
+    window_created = time.perf_counter()
     window.show()
-    with open(fake_log_dev_path) as file:
-        for line in file.readlines():
-            window.log_area.appendPlainText(line.rstrip("\n"))
-    app.exec()
\ No newline at end of file
+    app.processEvents()  # the first paint of the window
+    window_shown = time.perf_counter()
+    if args.file == "-":
+        from colorful_logger_app.core import stdin_source
+        window.add_log_source(stdin_source())
+    else:
+        window.open_log_file(args.file)
+    if args.profile_startup:
+        print(startup_report([("import PyQt5", qt_time), ("import application", app_time),
+                              ("QApplication", app_created), ("MainWindow", window_created),
+                              ("first paint", window_shown), ("open log", time.perf_counter())]),
+              file=sys.stderr)
+    app.exec()
@@ -0,0 +1,202 @@
+"""
+    Measure the ingestion, highlighting, filtering and search of the log view on synthetic
+    logs shaped like tests/fake_logs.txt, headless, and save the results as JSON.
+    Each size runs in its own process so the peak RSS is the one of that size.
+
+    python bench_main.py --sizes 10000,1000000,10000000 --output bench.json
+    python bench_main.py --sizes 10000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from colorful_logger_app import LOGGER_TAGS
+from colorful_logger_app.constants import *
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+SOURCES = ["src/display.c", "src/main.c", "comm/tcpSSL.c", "comm/gprs.c", "drv/printer.c", "app/transação.c"]
+FUNCTIONS = ["displayShowMessageDialog", "tcp_ssl_open_conn", "s_tcp_ssl_set_error", "gprs_attach", "prn_feed"]
+MESSAGES = ["message : VERSÃO SOFTWARE", "wifi not connected", "error : -10005", "Connect Timeout - 30",
+            "saiu", "conexão recusada pelo servidor", "title : (null)", "messageAlign : 2", "rx 0A 1B 2C 3D crc 0x1F40"]
+CONTINUATIONS = ["    0A 1B 2C 3D 4E 5F 60 71 82 93 A4 B5", "    at state machine step 12", "    parâmetros inválidos"]
+SEARCHED = "conexão"
+FILTERED_TAGS = ["WARN", "ERROR", "FATAL"]
+HIGHLIGHT_SAMPLE_LINES = 10000
+
+
+def synthetic_lines(count: int, seed: int = 1):
+    """yield count lines like tests/fake_logs.txt: timestamped lines with a tag, a source and a
+    function, about one untagged continuation line in ten and accented (Latin-1) text"""
+    rand = random.Random(seed)
+    tags = [tag["name"] for tag in LOGGER_TAGS[1:]]
+    weights = [5, 40, 30, 10, 12, 3]
+    start = time.mktime((2020, 4, 11, 15, 6, 23, 0, 0, -1))
+    for index in range(count):
+        if rand.random() < 0.1:
+            yield rand.choice(CONTINUATIONS)
+            continue
+        stamp = time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(start + index // 50))
+        yield "[{0}] {1:<5} {2}:{3}: [{4}] - {5}".format(stamp, rand.choices(tags, weights)[0], rand.choice(SOURCES),
+                                                         rand.randint(1, 900), rand.choice(FUNCTIONS),
+                                                         rand.choice(MESSAGES))
+
+
+def peak_rss_mb():
+    """return the peak resident set size of the process in MB, None where unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(size: int) -> dict:
+    """measure one size in this process, return the metrics: the names end with their unit,
+    _lines_per_s is better when higher, the others when lower"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from colorful_logger_app.core import log_filter_by_tag, BulkParser
+    from colorful_logger_app import find_tag_by_name
+    from colorful_logger_app.logger_gui import MainWindow
+
+    app = QApplication.instance() or QApplication([])
+    results = {"lines": size}
+
+    window = MainWindow()
+    window.resize(800, 600)
+    window.show()
+    app.processEvents()
+    add_line = window.add_line_to_log_area
+    start = time.perf_counter()
+    for line in synthetic_lines(size):
+        add_line(line)
+    results["append_lines_per_s"] = size / (time.perf_counter() - start)
+    start = time.perf_counter()
+    app.processEvents()  # lay out the rows and paint the bottom of the view
+    results["view_refresh_ms"] = (time.perf_counter() - start) * 1000
+
+    batch_window = MainWindow()
+    lines = synthetic_lines(size)
+    start = time.perf_counter()
+    for _ in range(0, size, SERIAL_BATCH_MAX_LINES):
+        batch_window.add_lines_to_log_area([line for line, _ in zip(lines, range(SERIAL_BATCH_MAX_LINES))])
+    results["append_batch_lines_per_s"] = size / (time.perf_counter() - start)
+    batch_window.close()
+    del batch_window
+
+    delegate = window.log_area.itemDelegate()
+    delegate.set_options(tag=True, timestamp=True, function=True, module_source=True, hex_dump=True)
+    store = window.log_buffer.store
+    sample = [store[row] for row in range(min(len(store), HIGHLIGHT_SAMPLE_LINES))]
+    start = time.perf_counter()
+    for line in sample:
+        delegate.highlightBlock(line.text, line.info)
+    results["highlight_block_us"] = (time.perf_counter() - start) * 1e6 / max(len(sample), 1)
+
+    tags = [find_tag_by_name(name) for name in FILTERED_TAGS]
+    start = time.perf_counter()
+    log_filter_by_tag(window.log_buffer.tag_index, tags)
+    results["filter_by_tag_ms"] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    window.filter_document_tags(FILTERED_TAGS)
+    results["filter_view_ms"] = (time.perf_counter() - start) * 1000
+    window.filter_document_tags([LOGGER_TAGS[0]["name"]])
+    app.processEvents()  # the view is laid out again, see view_refresh_ms
+
+    window.log_filters.filter_line.setText(SEARCHED)
+    start = time.perf_counter()
+    window.search_log_area()
+    while not len(window.log_search) and window.search_timer.isActive():
+        app.processEvents()
+    results["search_first_match_ms"] = (time.perf_counter() - start) * 1000
+    while window.search_timer.isActive():
+        app.processEvents()
+    results["search_all_ms"] = (time.perf_counter() - start) * 1000
+    results["search_matches"] = len(window.log_search)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.log")
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(line + "\n" for line in synthetic_lines(size))
+        for name, workers in (("bulk_parse_1_worker_lines_per_s", 1), ("bulk_parse_lines_per_s", None)):
+            start = time.perf_counter()
+            for _ in BulkParser(workers=workers).chunks(path):
+                pass
+            results[name] = size / (time.perf_counter() - start)
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    window.close()
+    return results
+
+
+def compare(results: dict, previous: dict, threshold: float) -> list:
+    """return the (size, metric, previous, current) of the metrics worse than previous by more than threshold"""
+    regressions = []
+    for size, metrics in results.items():
+        for name, value in metrics.items():
+            old = previous.get(size, {}).get(name)
+            if not old or value is None or name in ("lines", "search_matches"):
+                continue
+            ratio = old / value if name.endswith("_per_s") else value / old
+            if ratio > 1 + threshold:
+                regressions.append((size, name, old, value))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="{0} - benchmark".format(APP_NAME))
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="comma separated numbers of lines")
+    parser.add_argument("--output", help="JSON file of the results, printed if omitted")
+    parser.add_argument("--compare", help="JSON file of a previous run, exit with 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolerated slow down, 0.2 is 20%%")
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)  # one size, in the child process
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.run is not None:
+        json.dump(run_benchmark(args.run), sys.stdout)
+        return 0
+
+    results = {}
+    for size in (int(size) for size in args.sizes.split(",")):
+        print("{0} lines...".format(size), file=sys.stderr)
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", str(size)],
+                               stdout=subprocess.PIPE, check=True)
+        results[str(size)] = json.loads(child.stdout)
+    report = {"version": APP_VERSION, "python": platform.python_version(), "platform": platform.platform(),
+              "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)["results"]
+        regressions = compare(results, previous, args.threshold)
+        for size, name, old, value in regressions:
+            print("{0} lines: {1} {2:.4g} -> {3:.4g}".format(size, name, old, value), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+    Colorize and filter a log file (or stdin) in the terminal, without PyQt.
+
+    python cli_main.py tests/fake_logs.txt --tags WARN,ERROR,FATAL --timestamp
+    cat device.log | python cli_main.py --search gprs
+"""
+import argparse
+import sys
+
+from colorful_logger_app import LOGGER_TAGS, find_tag_by_name
+from colorful_logger_app.constants import *
+from colorful_logger_app.core import log_classify, log_selected_tags
+from colorful_logger_app.core.ansi import ansi_colorize
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="{0} - colorize and filter logs".format(APP_NAME))
+    parser.add_argument("file", nargs="?", help="log file, stdin if omitted")
+    parser.add_argument("--tags", default=LOGGER_TAGS[0]["name"],
+                        help="comma separated tags to show, untagged lines are always shown "
+                             "({0})".format("|".join(tag["name"] for tag in LOGGER_TAGS)))
+    parser.add_argument("--search", help="show only the lines containing this text (case insensitive)")
+    parser.add_argument("--color", choices=["auto", "always", "never"], default="auto")
+    parser.add_argument("--timestamp", action="store_true", help="highlight the timestamps")
+    parser.add_argument("--function", action="store_true", help="highlight the function names")
+    parser.add_argument("--source", action="store_true", help="highlight the module/source")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    tags = []
+    for name in args.tags.split(","):
+        tag = find_tag_by_name(name.strip().upper())
+        if tag is None:
+            print("unknown tag: {0}".format(name), file=sys.stderr)
+            return 2
+        tags.append(tag)
+    selected = log_selected_tags(tags)
+    search = args.search.lower() if args.search else None
+    color = args.color == "always" or (args.color == "auto" and sys.stdout.isatty())
+
+    source = open(args.file, encoding="utf-8", errors="replace") if args.file else sys.stdin
+    try:
+        for line in source:
+            line = line.rstrip("\r\n")
+            info = log_classify(line)
+            if selected is not None and info.tag != 0 and info.tag not in selected:
+                continue
+            if search is not None and search not in line.lower():
+                continue
+            if color:
+                line = ansi_colorize(line, info, args.timestamp, args.function, args.source)
+            sys.stdout.write(line + "\n")
+    except BrokenPipeError:
+        pass
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,5 @@
-import logging
 from typing import Dict, List
 
-logger = logging.getLogger(__name__)
-
 LOGGER_TAGS: List[Dict[str, str]] = [
     {"name": "ALL", "color": "black"},
     {"name": "TRACE", "color": "gray"},
@@ -16,9 +13,9 @@ LOGGER_TAGS: List[Dict[str, str]] = [
 DEFAULT_COLORS = ["black", "gray", "blue", "green", "darkMagenta", "red", "darkred", "yellow"]
 
 LOGGER_TIMESTAMPS:  List[Dict[str, str]] = [
-    {"name": "YYYY[:/]MM[:/]DD HH:MM:SS", "rule": "([0-9]{4})(\\:|\\/)([0-2]{2})(\\:|\\/)([0-9]{2}) ([0-9]{2})\\:(["
+    {"name": "YYYY[:/]MM[:/]DD HH:MM:SS", "rule": "([0-9]{4})(\\:|\\/)([0-1][0-9])(\\:|\\/)([0-9]{2}) ([0-9]{2})\\:(["
                                                   "0-9]{2})\\:([0-9]{2})"},
-    {"name":"YYYY[:/]MM[:/]DD", "rule": "([0-9]{4})(\\:|\\/)([0-2]{2})(\\:|\\/)([0-9]{2})"},
+    {"name":"YYYY[:/]MM[:/]DD", "rule": "([0-9]{4})(\\:|\\/)([0-1][0-9])(\\:|\\/)([0-9]{2})"},
     {"name":"HH:MM:SS", "rule": "([0-9]{2})\\:([0-9]{2})\\:([0-9]{2})"}]
 
 
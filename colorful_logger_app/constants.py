@@ -5,4 +5,110 @@ APP_AUTHOR_EMAIL = "anderson.macedo@outlook.com"
 APP_STATUS = "development"
 APP_LICENCE = "GPL"
 
-fake_log_dev_path = "tests/fake_logs.txt"
\ No newline at end of file
+fake_log_dev_path = "tests/fake_logs.txt"
+
+# Serial ingestion batching: the worker emits the collected lines every
+# SERIAL_BATCH_INTERVAL_MS or as soon as SERIAL_BATCH_MAX_LINES are pending
+SERIAL_BATCH_INTERVAL_MS = 50
+SERIAL_BATCH_MAX_LINES = 1000
+
+# Log store limits: the oldest lines are evicted when either one is exceeded
+LOG_STORE_MAX_LINES = 1000000
+LOG_STORE_MAX_BYTES = 128 * 1024 * 1024
+
+# Tags are searched only in the first LOG_HEADER_SIZE characters of a line
+LOG_HEADER_SIZE = 35
+
+# Width of the log view rows, in characters
+LOG_VIEW_COLUMNS = 400
+
+# Timestamp, tag, source and function are searched in the first LOG_CLASSIFY_SIZE characters
+LOG_CLASSIFY_SIZE = 128
+
+# Colors of the optional highlighted fields, see HighlightOptionsDialog
+HIGHLIGHT_TIMESTAMP_COLOR = "darkCyan"
+HIGHLIGHT_FUNCTION_COLOR = "darkBlue"
+HIGHLIGHT_MODULE_SOURCE_COLOR = "darkGreen"
+HIGHLIGHT_HEX_DUMP_COLOR = "darkOrange"
+
+# Highlighted rows kept laid out by the log view, a few screens
+HIGHLIGHT_CACHE_LINES = 1024
+
+# Log files are read in chunks of LOAD_CHUNK_SIZE bytes, each chunk is sent as one batch
+LOAD_CHUNK_SIZE = 1024 * 1024
+
+# Lines of a memory-mapped log kept decoded, the visible rows and a little more
+MAPPED_CACHE_LINES = 2048
+
+# Files of at least BULK_PARSE_MIN_SIZE bytes, and the memory-mapped logs, are classified by a pool of
+# processes (BULK_WORKERS, None for one per core) in chunks of BULK_CHUNK_SIZE bytes,
+# see colorful_logger_app.core.bulk
+BULK_PARSE_MIN_SIZE = 16 * 1024 * 1024
+BULK_CHUNK_SIZE = 2 * 1024 * 1024
+BULK_WORKERS = None
+
+# Indexes of the large files (see colorful_logger_app.core.indexcache), saved in ~/CONFIG_DIR_NAME/INDEX_CACHE_DIR_NAME.
+# At most INDEX_CACHE_MAX_FILES are kept, a file that grew is recognized by its first and last
+# INDEX_CACHE_CHECK_SIZE indexed bytes
+INDEX_CACHE_DIR_NAME = "index"
+INDEX_CACHE_MAX_FILES = 32
+INDEX_CACHE_CHECK_SIZE = 4096
+
+# Lines searched per step of an incremental search and time given to each step
+SEARCH_SCAN_LINES = 20000
+SEARCH_STEP_MS = 20
+# Lines evaluated per step of a query, see colorful_logger_app.core.query (a step also takes SEARCH_STEP_MS at most)
+QUERY_SCAN_LINES = 20000
+
+# Background of the search matches in the log view
+SEARCH_MATCH_COLOR = "yellow"
+SEARCH_CURRENT_MATCH_COLOR = "orange"
+
+# Serial lines are shown at most once every LOG_REFRESH_INTERVAL_MS, whatever the number of ports
+LOG_REFRESH_INTERVAL_MS = 100
+
+# Names of the sources painted before the lines of the merged log
+SOURCE_LABEL_COLOR = "gray"
+
+# I/O sources (see colorful_logger_app.core.sources): bytes read at once, interval of the
+# sources that are polled (file tail, ports without file descriptor) and TCP reconnection delay
+SOURCE_READ_SIZE = 64 * 1024
+SOURCE_POLL_INTERVAL_MS = 100
+SOURCE_RECONNECT_DELAY_MS = 2000
+SYSLOG_PORT = 514
+
+# Journals of the raw serial chunks (see colorful_logger_app.core.journal): size and age of a block
+# written at once (a crash loses the block being filled at most), gzip level and, when replaying as
+# fast as possible, records replayed before letting the other sources run
+JOURNAL_BLOCK_SIZE = 64 * 1024
+JOURNAL_BLOCK_INTERVAL_MS = 1000
+JOURNAL_GZIP_LEVEL = 1
+JOURNAL_REPLAY_YIELD_RECORDS = 256
+
+# Lines read per chunk of an export, the progress is reported after each chunk
+EXPORT_CHUNK_LINES = 10000
+
+# Highlight rule profiles (see colorful_logger_app.core.profiles), saved in ~/CONFIG_DIR_NAME/PROFILES_FILE_NAME
+CONFIG_DIR_NAME = ".colorful_logger"
+PROFILES_FILE_NAME = "profiles.json"
+DEFAULT_PROFILE_NAME = "Default"
+# Lines re-tagged per step when a profile is activated
+PROFILE_RETAG_LINES = 20000
+
+# The metrics panel (View > Metrics) is refreshed every METRICS_REFRESH_INTERVAL_MS
+METRICS_REFRESH_INTERVAL_MS = 1000
+# The sources panel (View > Sources) is refreshed every SOURCES_REFRESH_INTERVAL_MS while shown
+SOURCES_REFRESH_INTERVAL_MS = 1000
+
+# Lines read and not shown yet kept at most, see colorful_logger_app.core.handoff.LineQueue. A blocked
+# reader checks every LINE_QUEUE_BLOCK_CHECK_MS whether it was stopped
+LINE_QUEUE_MAX_LINES = 50000
+LINE_QUEUE_BLOCK_CHECK_MS = 100
+# Lines shown in place of the lines dropped or collapsed by a full queue
+LINE_QUEUE_DROPPED_MARKER = "<<< {0} lines dropped >>>"
+LINE_QUEUE_REPEATED_MARKER = "<<< previous line repeated {0} more times >>>"
+
+# Counter of a collapsed line (copies, first and last receive times), painted after the line and exported
+LOG_REPEAT_FORMAT = "x{0}  {1} - {2}"
+# The receive rate of each source is shown in the status bar, updated every RATE_SUMMARY_INTERVAL_MS
+RATE_SUMMARY_INTERVAL_MS = 1000
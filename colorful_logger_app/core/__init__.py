@@ -0,0 +1,50 @@
+"""
+    Log processing without PyQt: classification, bounded storage, tag and time filtering,
+    search and the I/O sources.
+    The GUI in colorful_logger_app.logger_gui is a view over these classes.
+    Only the classifier, the line store and the tag filter are imported with the package, the
+    other modules are imported when one of their names is first used (see __getattr__) so the
+    package imports in a few ms: the sources need asyncio, the bulk parser multiprocessing, ...
+"""
+import importlib
+
+from colorful_logger_app.core.classifier import LineInfo, LogClassifier, default_classifier, log_classify
+from colorful_logger_app.core.filters import TagIndex, TagFilter, log_filter_by_tag, log_selected_tags
+from colorful_logger_app.core.metrics import Metrics, metrics, timed
+from colorful_logger_app.core.store import LogLine, LogStore
+
+# module: names imported on first use
+_LAZY_MODULES = {
+    "buffer": ["LogBuffer", "merge_by_time", "repeat_key", "repeat_label"],
+    "bulk": ["BulkParser", "ParsedChunk", "chunk_bounds", "parse_chunk"],
+    "export": ["LogExport", "export_format", "line_fields", "EXPORT_TEXT", "EXPORT_HTML", "EXPORT_JSON",
+               "EXPORT_FORMATS"],
+    "handoff": ["LineQueue", "POLICIES", "POLICY_BLOCK", "POLICY_DROP_OLDEST", "POLICY_COLLAPSE"],
+    "indexcache": ["load_index_cache", "save_index_cache", "index_cache_dir"],
+    "journal": ["JournalWriter", "JournalReader", "ReplaySource", "journal_compression"],
+    "loader": ["LineSplitter", "log_tail_offset", "read_lines"],
+    "mapped": ["MappedLog"],
+    "profiles": ["HighlightRule", "RuleMatcher", "RuleProfile", "default_profile", "load_profiles", "save_profiles",
+                 "RULE_KEYWORD", "RULE_PREFIX", "RULE_REGEX", "RULE_KINDS"],
+    "query": ["Query", "QueryFilter", "parse_query", "QUERY_FIELDS"],
+    "rows": ["VisibleRows"],
+    "search": ["LogSearch", "compile_search", "SEARCH_MODES", "SEARCH_IGNORE_CASE"],
+    "sources": ["LogSource", "SourceLoop", "SerialSource", "TcpClientSource", "TcpServerSource", "UdpSyslogSource",
+                "FileTailSource", "PipeSource", "stdin_source"],
+    "symbols": ["SymbolIndex", "SymbolTable", "source_name", "function_name", "SYMBOL_FIELDS"],
+    "timeindex": ["TimeIndex", "NO_TIME", "format_time", "parse_time_query"],
+}
+_LAZY_NAMES = {name: module for module, names in _LAZY_MODULES.items() for name in names}
+
+
+def __getattr__(name: str):
+    """import the module of a name of _LAZY_MODULES on first use"""
+    if name not in _LAZY_NAMES:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    value = getattr(importlib.import_module("colorful_logger_app.core." + _LAZY_NAMES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
@@ -0,0 +1,48 @@
+from colorful_logger_app import LOGGER_TAGS
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.classifier import LineInfo
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+# ANSI SGR codes of the color names used by LOGGER_TAGS and the highlight options
+ANSI_COLORS = {
+    "black": "30", "darkred": "31", "green": "32", "darkGreen": "32", "yellow": "33", "blue": "94",
+    "darkBlue": "34", "darkMagenta": "35", "darkCyan": "36", "gray": "90", "red": "91", "magenta": "95",
+    "cyan": "96", "white": "97",
+}
+ANSI_RESET = "\x1b[0m"
+
+
+def ansi_color(name: str, bold: bool = False, underline: bool = False) -> str:
+    """return the ANSI escape sequence of a color name, empty if the color is unknown"""
+    codes = ([ANSI_COLORS[name]] if name in ANSI_COLORS else []) + (["1"] if bold else []) + (["4"] if underline else [])
+    return "\x1b[{0}m".format(";".join(codes)) if codes else ""
+
+
+def ansi_colorize(text: str, info: LineInfo, timestamp=False, function=False, module_source=False) -> str:
+    """return the text with the tag (and optionally the other fields) colored like the log view"""
+    spans = []
+    if info.tag_start >= 0:
+        spans.append((info.tag_start, info.tag_end, ansi_color(LOGGER_TAGS[info.tag]["color"], True, True)))
+    if timestamp and info.timestamp_start >= 0:
+        spans.append((info.timestamp_start, info.timestamp_end, ansi_color(HIGHLIGHT_TIMESTAMP_COLOR)))
+    if module_source and info.source_start >= 0:
+        spans.append((info.source_start, info.source_end, ansi_color(HIGHLIGHT_MODULE_SOURCE_COLOR)))
+    if function and info.function_start >= 0:
+        spans.append((info.function_start, info.function_end, ansi_color(HIGHLIGHT_FUNCTION_COLOR)))
+    if not spans:
+        return text
+    spans.sort()
+    parts = []
+    position = 0
+    for start, end, sequence in spans:
+        if start < position:  # overlapping field, keep the first one
+            continue
+        parts += [text[position:start], sequence, text[start:end], ANSI_RESET]
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
@@ -0,0 +1,197 @@
+import time
+from heapq import merge
+from itertools import repeat
+from operator import itemgetter
+from typing import Iterable, List, Optional, Tuple
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.classifier import LineInfo, LogClassifier, default_classifier
+from colorful_logger_app.core.filters import TagIndex
+from colorful_logger_app.core.rows import VisibleRows
+from colorful_logger_app.core.store import ChunkLine, LogStore, LogLine
+from colorful_logger_app.core.symbols import SymbolIndex
+from colorful_logger_app.core.timeindex import TimeIndex
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+
+def repeat_key(text: str, info: LineInfo) -> str:
+    """return the text of a line without its timestamp, the lines repeating it have the same key"""
+    if info.timestamp_start < 0:
+        return text
+    return text[:info.timestamp_start] + text[info.timestamp_end:]
+
+
+def repeat_label(line: LogLine, entry: list) -> str:
+    """return the counter of a collapsed line: the number of copies and the first and last receive times"""
+    return LOG_REPEAT_FORMAT.format(entry[0] + 1, clock_time(line.timestamp), clock_time(entry[1]))
+
+
+def clock_time(timestamp: float) -> str:
+    return time.strftime("%H:%M:%S", time.localtime(timestamp)) + ".{0:03d}".format(int(timestamp * 1000) % 1000)
+
+
+class LogBuffer(VisibleRows):
+    """
+        Classify, store and index log lines and keep the lines selected by the tag filter.
+        Rows are the positions of the visible lines, see VisibleRows.
+        When collapse is set, a line repeating the last stored line of the same source
+        (timestamp aside) is not stored: it is counted in repeats, see repeat().
+        The time of each line is indexed in time_index: a time range keeps only the lines
+        from a time to another, on top of the tag filter, see set_time_range. The source
+        file and function of each line are indexed in symbol_index.
+    """
+
+    def __init__(self, max_lines: int = LOG_STORE_MAX_LINES, max_bytes: int = LOG_STORE_MAX_BYTES,
+                 classifier: LogClassifier = None):
+        super(LogBuffer, self).__init__()
+        self.store = LogStore(max_lines, max_bytes)
+        self.tag_index = TagIndex(self.store.first_seq)
+        self.time_index = TimeIndex(self.store.first_seq)
+        self.symbol_index = SymbolIndex(self.store.first_seq)
+        self.classifier = default_classifier if classifier is None else classifier
+        self.collapse = False
+        self.repeats = {}  # sequence number: [repeats folded in the line, receive time of the last one]
+        self.folded = {}  # source: lines folded since the start
+
+    @property
+    def first_seq(self) -> int:
+        return self.store.first_seq
+
+    @property
+    def next_seq(self) -> int:
+        return self.store.next_seq
+
+    def texts(self, start_seq: int, end_seq: int) -> List[str]:
+        """return the text of the lines in [start_seq, end_seq), visible or not"""
+        return self.store.texts(start_seq, end_seq)
+
+    def append(self, texts: Iterable[str]) -> int:
+        """classify and store the lines, return the number of visible lines evicted"""
+        classify = self.classifier.classify
+        return self.append_classified([(text, classify(text)) for text in texts])
+
+    def append_classified(self, lines: List[tuple], timestamps: Iterable[float] = None,
+                          sources: Iterable[int] = None) -> int:
+        """store (text, LineInfo) pairs, return the number of visible lines evicted.
+        See LogStore.extend for timestamps and sources"""
+        timestamps = repeat(time.time()) if timestamps is None else timestamps
+        if self.collapse:
+            lines, timestamps, sources = self.fold(lines, timestamps, sources)
+        first, end = map(self.rank, self.bounds())
+        self.store.extend(lines, timestamps, sources)
+        self.tag_index.extend(info.tag for text, info in lines)
+        self.time_index.extend(lines, timestamps, self.classifier.parse_time)
+        self.symbol_index.extend(lines)
+        return self.appended(first, end)
+
+    def append_chunk(self, texts: List[str], chunk) -> int:
+        """store the lines of a ParsedChunk of a file, texts are its decoded lines (see chunk_texts),
+        return the number of visible lines evicted. The LineInfo of a line is built when it is read"""
+        if self.collapse:
+            return self.append_classified(chunk.lines(texts))
+        timestamp = time.time()
+        first, end = map(self.rank, self.bounds())
+        append_line = self.store.append_line
+        for index, text in enumerate(texts):
+            append_line(ChunkLine(text, chunk, index, timestamp))
+        self.tag_index.extend(chunk.tags)
+        self.time_index.extend_times(chunk.times, repeat(timestamp))
+        self.symbol_index.extend_chunk(chunk)
+        return self.appended(first, end)
+
+    def appended(self, first: int, end: int) -> int:
+        """prune the indexes of the evicted lines and sync the filter after lines were stored,
+        return the number of visible lines evicted from the rows [first, end) shown before"""
+        self.tag_index.prune(self.store.first_seq)
+        self.time_index.prune(self.store.first_seq)
+        self.symbol_index.prune(self.store.first_seq)
+        repeats = self.repeats
+        while repeats and next(iter(repeats)) < self.store.first_seq:
+            del repeats[next(iter(repeats))]
+        if self.tag_filter is not None:
+            self.tag_filter.sync()
+        # rows of [first, end) evicted, the ranks do not change when lines are evicted
+        return min(max(self.rank(self.store.first_seq) - first, 0), end - first)
+
+    def retag(self, start_seq: int, end_seq: int) -> int:
+        """classify again the lines in [start_seq, end_seq) with the current classifier,
+        return the number of lines whose tag changed. Call set_filter once done"""
+        classify = self.classifier.classify
+        changed = 0
+        for seq in range(max(start_seq, self.store.first_seq), min(end_seq, self.store.next_seq)):
+            line = self.store.line(seq)
+            info = classify(line.text)
+            line.info = info
+            if line.tag != info.tag:
+                line.tag = info.tag
+                self.tag_index.set(seq, info.tag)
+                changed += 1
+        return changed
+
+    def fold(self, lines: List[tuple], timestamps: Iterable[float],
+             sources: Iterable[int] = None) -> Tuple[List[tuple], List[float], List[int]]:
+        """count the lines repeating the line before them in repeats, return the other ones"""
+        sources = repeat(0) if sources is None else sources
+        last_seq = self.store.next_seq - 1
+        last = self.store.line(last_seq)
+        last_key = (last.source, repeat_key(last.text, last.info)) if last is not None else None
+        kept_lines, kept_timestamps, kept_sources = [], [], []
+        for line, timestamp, source in zip(lines, timestamps, sources):
+            key = (source, repeat_key(*line))
+            if key == last_key:
+                entry = self.repeats.get(last_seq)
+                if entry is None:
+                    self.repeats[last_seq] = [1, timestamp]
+                else:
+                    entry[0] += 1
+                    entry[1] = timestamp
+                self.folded[source] = self.folded.get(source, 0) + 1
+                continue
+            kept_lines.append(line)
+            kept_timestamps.append(timestamp)
+            kept_sources.append(source)
+            last_key = key
+            last_seq = self.store.next_seq + len(kept_lines) - 1
+        return kept_lines, kept_timestamps, kept_sources
+
+    def repeat(self, seq: int) -> Optional[list]:
+        """return [repeats, receive time of the last one] of a collapsed line, None if it was not repeated"""
+        return self.repeats.get(seq)
+
+    def clear(self) -> None:
+        self.store.clear()
+        self.repeats.clear()
+        self.tag_index.clear(self.store.first_seq)
+        self.time_index.clear(self.store.first_seq)
+        self.symbol_index.clear(self.store.first_seq)
+        self.set_filter(self.tags_selected)
+
+    def line(self, row: int) -> Optional[LogLine]:
+        """return the visible line at row"""
+        return self.store.line(self.seq(row))
+
+    def line_at(self, seq: int) -> Optional[LogLine]:
+        """return the line seq, visible or not, None if evicted"""
+        return self.store.line(seq)
+
+
+def merge_by_time(runs: List[Tuple[int, List[tuple], List[float]]]) -> Tuple[List[tuple], List[float], List[int]]:
+    """
+        Interleave the lines received from several sources by receive time.
+        runs are (source, lines, timestamps) with the lines of each run in time order,
+        lines received at the same time keep the order of runs.
+        Return the merged (lines, timestamps, sources).
+    """
+    if len(runs) == 1:
+        source, lines, timestamps = runs[0]
+        return lines, timestamps, [source] * len(lines)
+    merged = list(merge(*(zip(timestamps, repeat(source), lines) for source, lines, timestamps in runs),
+                        key=itemgetter(0)))
+    timestamps = [timestamp for timestamp, _, _ in merged]
+    sources = [source for _, source, _ in merged]
+    return [line for _, _, line in merged], timestamps, sources
@@ -0,0 +1,171 @@
+import os
+from array import array
+from collections import deque
+from itertools import accumulate, count, islice
+from operator import add
+from typing import Callable, Iterator, List, Tuple
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.classifier import LineInfo, LogClassifier, default_classifier
+from colorful_logger_app.core.symbols import function_name, source_name
+from colorful_logger_app.core.timeindex import parse_times
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+class ParsedChunk:
+    """
+        The lines of a chunk of a file classified, in columns. For the line i: ends[i] is the
+        file position one byte after its text (as in MappedLog), tags[i] its index in LOGGER_TAGS,
+        rules[i] its timestamp rule, spans[8 * i:8 * i + 8] the [start, end) of its tag,
+        timestamp, source and function (as in LineInfo) and times[i] the time of its timestamp,
+        see parse_times. sources[i] and functions[i] are the ids of its source file and function
+        in source_names and function_names, the symbols of the chunk (see SymbolIndex.extend_chunk).
+        Arrays are pickled as a few bytes objects, not as an object per line.
+    """
+    __slots__ = ("start", "end", "ends", "tags", "rules", "spans", "times", "sources", "functions", "source_names",
+                 "function_names")
+
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+        self.ends = array("Q")
+        self.tags = b""
+        self.rules = array("b")
+        self.spans = array("i")
+        self.times = array("d")
+        self.sources = array("I")
+        self.functions = array("I")
+        self.source_names = [""]
+        self.function_names = [""]
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def info(self, index: int) -> LineInfo:
+        """return the LineInfo of the line index"""
+        info = LineInfo()
+        info.tag = self.tags[index]
+        info.timestamp_rule = self.rules[index]
+        (info.tag_start, info.tag_end, info.timestamp_start, info.timestamp_end, info.source_start,
+         info.source_end, info.function_start, info.function_end) = self.spans[8 * index:8 * index + 8]
+        return info
+
+    def lines(self, texts: List[str]) -> List[tuple]:
+        """return the (text, LineInfo) pairs of the texts of the chunk, see chunk_texts"""
+        return [(text, self.info(index)) for index, text in enumerate(texts)]
+
+
+def chunk_texts(data: bytes) -> List[str]:
+    """return the lines of a chunk cut after a newline, decoded as UTF-8 with the invalid bytes replaced"""
+    text = data.decode("utf-8", errors="replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+    lines = text.split("\n")
+    if lines[-1]:
+        lines[-1] = lines[-1].rstrip("\r")
+    else:
+        lines.pop()
+    return lines
+
+
+def chunk_bounds(path: str, start: int = 0, chunk_size: int = BULK_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """return the [start, end) positions of the chunks of a file from start, each ending after a newline.
+    A line cut at start is skipped"""
+    bounds = []
+    with open(path, "rb") as file:
+        size = file.seek(0, 2)
+        if start:
+            file.seek(start - 1)
+            if file.read(1) != b"\n":
+                start += len(file.readline())
+        while start < size:
+            file.seek(min(start + chunk_size, size))
+            end = min(file.tell() + len(file.readline()), size)
+            bounds.append((start, end))
+            start = end
+    return bounds
+
+
+def parse_chunk(path: str, start: int, end: int, classifier: LogClassifier = default_classifier) -> ParsedChunk:
+    """classify the lines of the chunk [start, end) of a file, see chunk_bounds. Runs in the pool processes"""
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    chunk = ParsedChunk(start, end)
+    raw_lines = data.split(b"\n")
+    if not raw_lines[-1]:
+        raw_lines.pop()
+    chunk.ends = array("Q", map(add, accumulate(map(len, raw_lines)), count(start + 1)))
+    lines = [(text, classifier.classify(text)) for text in chunk_texts(data)]
+    chunk.tags = bytes(info.tag for text, info in lines)
+    chunk.rules = array("b", (info.timestamp_rule for text, info in lines))
+    spans = chunk.spans
+    for text, info in lines:
+        spans.extend((info.tag_start, info.tag_end, info.timestamp_start, info.timestamp_end, info.source_start,
+                      info.source_end, info.function_start, info.function_end))
+    chunk.times = array("d", parse_times(lines, classifier.parse_time))
+    for names, symbols, name_of in ((chunk.source_names, chunk.sources, source_name),
+                                    (chunk.function_names, chunk.functions, function_name)):
+        ids = {"": 0}
+        for text, info in lines:
+            name = name_of(text, info)
+            symbol = ids.get(name)
+            if symbol is None:
+                symbol = ids[name] = len(names)
+                names.append(name)
+            symbols.append(symbol)
+    return chunk
+
+
+class BulkParser:
+    """
+        Classify files on a pool of processes: the file is cut in chunks at line boundaries,
+        each chunk is classified by a worker process and sent back in columns (ParsedChunk),
+        the chunks are returned in file order. At most two chunks per worker are pending,
+        so the memory used does not depend on the size of the file.
+        A file of a single chunk, or a pool of one worker, is classified in this process.
+    """
+
+    def __init__(self, classifier: LogClassifier = None, workers: int = BULK_WORKERS,
+                 chunk_size: int = BULK_CHUNK_SIZE):
+        self.classifier = default_classifier if classifier is None else classifier
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+
+    def chunks(self, path: str, start: int = 0, cancel: Callable[[], bool] = None) -> Iterator[ParsedChunk]:
+        """yield the classified chunks of a file from start, until cancel returns True"""
+        bounds = iter(chunk_bounds(path, start, self.chunk_size))
+        if self.workers < 2 or os.path.getsize(path) - start <= self.chunk_size:
+            for chunk_start, chunk_end in bounds:
+                if cancel is not None and cancel():
+                    return
+                yield parse_chunk(path, chunk_start, chunk_end, self.classifier)
+            return
+        # imported here, multiprocessing slows down the start of the application
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn: the workers do not inherit the threads of the GUI
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            pending = deque(executor.submit(parse_chunk, path, chunk_start, chunk_end, self.classifier)
+                            for chunk_start, chunk_end in islice(bounds, 2 * self.workers))
+            while pending:
+                if cancel is not None and cancel():
+                    for future in pending:
+                        future.cancel()
+                    return
+                chunk = pending.popleft().result()
+                for chunk_start, chunk_end in islice(bounds, 1):
+                    pending.append(executor.submit(parse_chunk, path, chunk_start, chunk_end, self.classifier))
+                yield chunk
+
+    def texts(self, path: str, start: int = 0, cancel: Callable[[], bool] = None) \
+            -> Iterator[Tuple[List[str], ParsedChunk]]:
+        """yield the decoded lines of each chunk with the chunk, see LogBuffer.append_chunk"""
+        with open(path, "rb") as file:
+            for chunk in self.chunks(path, start, cancel):
+                file.seek(chunk.start)
+                yield chunk_texts(file.read(chunk.end - chunk.start)), chunk
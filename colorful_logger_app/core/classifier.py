@@ -0,0 +1,190 @@
+import re
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from colorful_logger_app import LOGGER_TAGS, LOGGER_TIMESTAMPS
+from colorful_logger_app.constants import *
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+# source file and line (src/display.c:476) and function name ([displayShowMessageDialog]),
+# a bracketed tag name ([INFO]) is not a function, see LogClassifier
+SOURCE_RULE = r"[\w.\\/-]+\.\w+:[0-9]+"
+FUNCTION_RULE = r"\[(?!(?:{0})\])[A-Za-z_]\w*\]"
+# hex numbers (0x1F40) and hex dumps of at least 4 bytes (0A 1B 2C 3D), highlighted when painted only
+HEX_DUMP_RULE = r"\b0[xX][0-9A-Fa-f]+\b|\b[0-9A-Fa-f]{2}(?: [0-9A-Fa-f]{2}){3,}\b"
+# fields of a timestamp format name (YYYY/MM/DD HH:MM:SS) and numbers of a timestamp
+TIMESTAMP_FIELD_RULE = re.compile(r"YYYY|MM|DD|HH|SS")
+NUMBER_RULE = re.compile(r"[0-9]+")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class LineInfo:
+    """
+        Fields found in a log line: the tag index in LOGGER_TAGS and the [start, end)
+        spans of the tag, timestamp, source file:line and function. A missing field has
+        start == end == -1. timestamp_rule is the index in LOGGER_TIMESTAMPS of the
+        timestamp format found.
+    """
+    __slots__ = ("tag", "tag_start", "tag_end", "timestamp_rule", "timestamp_start", "timestamp_end",
+                 "source_start", "source_end", "function_start", "function_end")
+
+    def __init__(self):
+        self.tag = 0
+        self.tag_start = self.tag_end = -1
+        self.timestamp_rule = -1
+        self.timestamp_start = self.timestamp_end = -1
+        self.source_start = self.source_end = -1
+        self.function_start = self.function_end = -1
+
+
+def timestamp_fields(name: str) -> List[str]:
+    """
+        return the fields of a timestamp format name, in the order of its numbers:
+        YYYY/MM/DD HH:MM:SS gives year, month, day, hour, minute, second.
+        MM is the month before HH and the minutes after it.
+    """
+    fields = []
+    for token in TIMESTAMP_FIELD_RULE.findall(name):
+        if token == "MM":
+            fields.append("minute" if "hour" in fields else "month")
+        else:
+            fields.append({"YYYY": "year", "DD": "day", "HH": "hour", "SS": "second"}[token])
+    return fields
+
+
+def keyword_regex(words: Iterable[str]) -> str:
+    """
+        return a regular expression matching any of the words, built as a trie so the
+        words sharing a prefix are tried together: the cost of a match grows with the
+        length of the words, not with their number. The longest word wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def expression(node):
+        end = "" in node
+        branches = [re.escape(char) + expression(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and (not end or len(branches[0]) == 1):
+            body = branches[0]
+        else:
+            body = "(?:{0})".format("|".join(branches))
+        return body + "?" if end else body
+
+    return expression(trie)
+
+
+class LogClassifier:
+    """
+        Parse a log line in a single pass, with one regular expression alternating the
+        timestamp rules, the tag rules, the source and the function rules.
+        Only the first LOG_CLASSIFY_SIZE characters are scanned and a tag is accepted
+        only in the first LOG_HEADER_SIZE characters.
+        tag_rules are (regular expression, index in LOGGER_TAGS) pairs, by default the
+        names of the tags. See colorful_logger_app.core.profiles for user defined rules.
+    """
+
+    def __init__(self, tags: List[Dict[str, str]] = None, timestamps: List[Dict[str, str]] = None,
+                 tag_rules: List[Tuple[str, int]] = None):
+        self.tags = LOGGER_TAGS if tags is None else tags
+        self.timestamps = LOGGER_TIMESTAMPS if timestamps is None else timestamps
+        if tag_rules is None:
+            names = sorted(range(len(self.tags)), key=lambda index: len(self.tags[index]["name"]), reverse=True)
+            tag_rules = [(re.escape(self.tags[index]["name"]), index) for index in names]
+        self.tag_rules = tag_rules
+        self.rule_tags = {"tag{0}".format(number): tag for number, (rule, tag) in enumerate(tag_rules)}
+
+        alternatives = ["(?P<ts{0}>{1})".format(index, timestamp["rule"])
+                        for index, timestamp in enumerate(self.timestamps)]
+        tag_alternatives = "|".join("(?P<tag{0}>{1})".format(number, rule) for number, (rule, tag) in enumerate(tag_rules))
+        if tag_rules:
+            alternatives.append(tag_alternatives)
+        alternatives.append("(?P<source>{0})".format(SOURCE_RULE))
+        names = keyword_regex(tag["name"] for tag in self.tags if tag["name"])
+        alternatives.append("(?P<function>{0})".format(FUNCTION_RULE.format(names) if names else r"\[[A-Za-z_]\w*\]"))
+        self.pattern = re.compile("|".join(alternatives))
+
+        # tag rules only, to tag raw lines without decoding them
+        self.tag_pattern_bytes = re.compile(tag_alternatives.encode()) if tag_rules else None
+        self.timestamp_fields = [timestamp_fields(timestamp["name"]) for timestamp in self.timestamps]
+
+    def classify(self, text: str) -> LineInfo:
+        info = LineInfo()
+        missing = 4
+        rule_tags = self.rule_tags
+        for match in self.pattern.finditer(text, 0, LOG_CLASSIFY_SIZE):
+            kind = match.lastgroup
+            tag = rule_tags.get(kind)
+            if tag is not None:
+                if info.tag_start < 0 and match.start() < LOG_HEADER_SIZE:
+                    info.tag = tag
+                    info.tag_start, info.tag_end = match.span()
+                    missing -= 1
+            elif kind == "source":
+                if info.source_start < 0:
+                    info.source_start, info.source_end = match.span()
+                    missing -= 1
+            elif kind == "function":
+                if info.function_start < 0:
+                    info.function_start, info.function_end = match.span()
+                    missing -= 1
+            elif info.timestamp_start < 0:
+                info.timestamp_rule = int(kind[2:])
+                info.timestamp_start, info.timestamp_end = match.span()
+                missing -= 1
+            if not missing:
+                break
+        return info
+
+    def parse_time(self, text: str, info: LineInfo, day: float = 0.0) -> Optional[float]:
+        """
+            return the time of the timestamp found in a line, in seconds since the epoch
+            as if it was UTC (the time zone of the device is not known), None if it can
+            not be read. day is the midnight of the date of a timestamp without a date.
+        """
+        if info.timestamp_rule < 0:
+            return None
+        fields = self.timestamp_fields[info.timestamp_rule]
+        values = dict(zip(fields, map(int, NUMBER_RULE.findall(text, info.timestamp_start, info.timestamp_end))))
+        if not fields or len(values) < len(fields):
+            return None
+        if "year" in values:
+            try:
+                day = (date(values["year"], values.get("month", 1), values.get("day", 1)).toordinal()
+                       - EPOCH_ORDINAL) * 86400
+            except ValueError:
+                return None
+        return day + values.get("hour", 0) * 3600 + values.get("minute", 0) * 60 + values.get("second", 0)
+
+    def digest(self) -> str:
+        """return a hash of the rules, it changes when a line would be classified differently"""
+        import hashlib
+        import json
+        rules = [self.pattern.pattern, sorted(self.rule_tags.items()), [tag["name"] for tag in self.tags],
+                 self.timestamp_fields, LOG_CLASSIFY_SIZE, LOG_HEADER_SIZE]
+        return hashlib.sha1(json.dumps(rules).encode()).hexdigest()
+
+    def tag_bytes(self, line: bytes) -> int:
+        """return the index in LOGGER_TAGS of the first tag found in the header of a raw line"""
+        if self.tag_pattern_bytes is None:
+            return 0
+        match = self.tag_pattern_bytes.search(line, 0, LOG_HEADER_SIZE)
+        return self.rule_tags[match.lastgroup] if match else 0
+
+
+default_classifier = LogClassifier()
+
+
+def log_classify(text: str) -> LineInfo:
+    """classify a line with the LOGGER_TAGS and LOGGER_TIMESTAMPS rules"""
+    return default_classifier.classify(text)
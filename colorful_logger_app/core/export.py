@@ -0,0 +1,141 @@
+import html
+import json
+from typing import Iterator, Optional, Pattern, TextIO
+
+from colorful_logger_app import LOGGER_TAGS
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.buffer import repeat_label
+from colorful_logger_app.core.classifier import LineInfo
+from colorful_logger_app.core.store import LogLine
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+EXPORT_TEXT = 0
+EXPORT_HTML = 1
+EXPORT_JSON = 2
+EXPORT_FORMATS = ["Text (*.txt *.log)", "HTML (*.html *.htm)", "JSON Lines (*.jsonl)"]
+
+
+def export_format(path: str) -> int:
+    """return the export format of a file name: .html/.htm HTML, .jsonl/.json JSON Lines, otherwise text"""
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension in ("html", "htm"):
+        return EXPORT_HTML
+    if extension in ("jsonl", "json"):
+        return EXPORT_JSON
+    return EXPORT_TEXT
+
+
+def line_fields(line: LogLine) -> dict:
+    """return the fields found by the classifier in a line, the message is the text after them"""
+    text, info = line.text, line.info
+    end = max(info.timestamp_end, info.tag_end, info.source_end, info.function_end, 0)
+    return {
+        "time": line.timestamp,
+        "timestamp": text[info.timestamp_start:info.timestamp_end] if info.timestamp_start >= 0 else None,
+        "tag": LOGGER_TAGS[info.tag]["name"] if info.tag_start >= 0 else None,
+        "source": text[info.source_start:info.source_end] if info.source_start >= 0 else None,
+        "function": text[info.function_start + 1:info.function_end - 1] if info.function_start >= 0 else None,
+        "message": text[end:].lstrip(" :-"),
+    }
+
+
+def html_colorize(text: str, info: LineInfo) -> str:
+    """return the text escaped for HTML, the fields in spans of the classes of html_style"""
+    spans = [(start, end, name) for start, end, name in (
+        (info.timestamp_start, info.timestamp_end, "timestamp"),
+        (info.tag_start, info.tag_end, "tag{0}".format(info.tag)),
+        (info.source_start, info.source_end, "source"),
+        (info.function_start, info.function_end, "function")) if start >= 0]
+    if not spans:
+        return html.escape(text)
+    spans.sort()
+    parts = []
+    position = 0
+    for start, end, name in spans:
+        if start < position:
+            continue
+        parts.append(html.escape(text[position:start]))
+        parts.append('<span class="{0}">{1}</span>'.format(name, html.escape(text[start:end])))
+        position = end
+    parts.append(html.escape(text[position:]))
+    return "".join(parts)
+
+
+def html_style() -> str:
+    """return the CSS of the classes used by html_colorize, the colors of the log view"""
+    rules = [".tag{0} {{ color: {1}; font-weight: bold; text-decoration: underline; }}".format(index, tag["color"])
+             for index, tag in enumerate(LOGGER_TAGS)]
+    rules.append(".timestamp {{ color: {0}; }}".format(HIGHLIGHT_TIMESTAMP_COLOR))
+    rules.append(".source {{ color: {0}; font-style: italic; }}".format(HIGHLIGHT_MODULE_SOURCE_COLOR))
+    rules.append(".function {{ color: {0}; }}".format(HIGHLIGHT_FUNCTION_COLOR))
+    rules.append(".repeat {{ color: {0}; }}".format(SOURCE_LABEL_COLOR))
+    return "\n".join(rules)
+
+
+class LogExport:
+    """
+        Write the lines of a LogBuffer or a MappedLog shown in the view (by its tag filter or
+        query and its time range) and matching an optional search pattern, as text, HTML or
+        JSON Lines. A query is evaluated to the end first, the lines it did not reach yet are
+        not written. The filter and the range of lines are taken when the export is created,
+        write() can then run on another thread: lines are read one at a time by sequence number
+        and written in chunks, memory does not grow with the number of lines. Lines evicted
+        before being written are skipped. A collapsed line is written once, with its counter.
+    """
+
+    def __init__(self, source, export: int = EXPORT_TEXT, pattern: Optional[Pattern] = None):
+        self.source = source
+        self.format = export
+        self.pattern = pattern
+        self.tag_filter = source.tag_filter  # None shows every line
+        self.start_seq, self.end_seq = source.bounds()  # the time range if any
+        self.n_lines = 0
+
+    def __len__(self) -> int:
+        """return the number of lines read, visible or not"""
+        return self.end_seq - self.start_seq
+
+    def is_selected(self, seq: int, line: LogLine) -> bool:
+        if self.tag_filter is not None and not self.tag_filter.is_visible(seq):
+            return False
+        return self.pattern is None or self.pattern.search(line.text) is not None
+
+    def write(self, file: TextIO, chunk_lines: int = EXPORT_CHUNK_LINES) -> Iterator[int]:
+        """write the lines to file, yield the number of lines read after each chunk"""
+        if self.format == EXPORT_HTML:
+            file.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{0}</title>\n'
+                       '<style>\n{1}\n</style>\n</head>\n<body>\n<pre>\n'.format(APP_NAME, html_style()))
+        for chunk_start in range(self.start_seq, self.end_seq, chunk_lines):
+            parts = []
+            for seq in range(chunk_start, min(chunk_start + chunk_lines, self.end_seq)):
+                line = self.source.line_at(seq)
+                if line is None or not self.is_selected(seq, line):
+                    continue
+                parts.append(self.format_line(line, self.source.repeat(seq)))
+            file.write("".join(parts))
+            self.n_lines += len(parts)
+            yield min(chunk_start + chunk_lines, self.end_seq) - self.start_seq
+        if self.format == EXPORT_HTML:
+            file.write("</pre>\n</body>\n</html>\n")
+
+    def format_line(self, line: LogLine, repeat: Optional[list] = None) -> str:
+        """format a line, repeat is its [repeats, last receive time] if it was collapsed"""
+        if self.format == EXPORT_HTML:
+            text = html_colorize(line.text, line.info)
+            if repeat is not None:
+                text += '  <span class="repeat">{0}</span>'.format(html.escape(repeat_label(line, repeat)))
+            return text + "\n"
+        if self.format == EXPORT_JSON:
+            fields = line_fields(line)
+            if repeat is not None:
+                fields["repeats"] = repeat[0] + 1
+                fields["last_time"] = repeat[1]
+            return json.dumps(fields, ensure_ascii=False) + "\n"
+        if repeat is not None:
+            return "{0}  [{1}]\n".format(line.text, repeat_label(line, repeat))
+        return line.text + "\n"
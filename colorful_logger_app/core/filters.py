@@ -0,0 +1,179 @@
+from bisect import bisect_right
+from itertools import compress, islice
+from typing import Iterable, Optional, Union
+
+from colorful_logger_app import LOGGER_TAGS
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.metrics import timed
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+INDEX_BLOCK_SIZE = 4096
+
+
+class TagIndex:
+    """
+        Tag column of the stored lines: one byte per line holding its index in LOGGER_TAGS,
+        0 (ALL) for the untagged lines. Position i holds the line with sequence number base + i,
+        base is always a multiple of INDEX_BLOCK_SIZE.
+    """
+
+    def __init__(self, first_seq: int = 0):
+        self.base = first_seq - first_seq % INDEX_BLOCK_SIZE
+        self.tags = bytearray(first_seq - self.base)
+        self.first_seq = first_seq
+
+    def add(self, seq: int, tag: int) -> None:
+        """index a new line, seq must follow the last indexed line"""
+        if seq != self.next_seq:
+            raise ValueError("line {0} added after line {1}".format(seq, self.next_seq - 1))
+        self.tags.append(tag)
+
+    def extend(self, tags: Iterable[int]) -> None:
+        self.tags.extend(tags)
+
+    def set(self, seq: int, tag: int) -> None:
+        """change the tag of an indexed line, the filters must be rebuilt"""
+        self.tags[seq - self.base] = tag
+
+    @property
+    def next_seq(self) -> int:
+        return self.base + len(self.tags)
+
+    def tag(self, seq: int) -> int:
+        return self.tags[seq - self.base]
+
+    def count(self, tag: int) -> int:
+        """return the number of live lines marked with tag"""
+        return self.tags.count(tag, self.first_seq - self.base)
+
+    def prune(self, first_seq: int) -> None:
+        """forget the lines evicted from the store (seq < first_seq), whole blocks at a time"""
+        self.first_seq = first_seq
+        dead = (first_seq - self.base) // INDEX_BLOCK_SIZE * INDEX_BLOCK_SIZE
+        if dead:
+            del self.tags[:dead]
+            self.base += dead
+
+    def clear(self, first_seq: int) -> None:
+        self.__init__(first_seq)
+
+
+class TagFilter:
+    """
+        Visible lines of a tag filter: a bitmap over the tag column plus the running count
+        of visible lines at the end of each block. Building it touches the tag column in C
+        (bytes.translate and bytes.count), row lookups bisect the block counts and decode a
+        single block.
+    """
+
+    def __init__(self, tag_index: TagIndex, selected: set):
+        self.tag_index = tag_index
+        self.selected = selected
+        # untagged lines are always visible
+        self.table = bytes(1 if tag == 0 or tag in selected else 0 for tag in range(256))
+        self.base = tag_index.base
+        self.mask = bytearray()
+        self.block_counts = []  # visible lines from the origin to the end of each block
+        self.origin = 0  # visible lines in the blocks already dropped
+        self.removed = 0  # visible lines evicted, rank of the first live line
+        self._block = None  # (block number, positions of the visible lines) of the last decoded block
+        self.sync()
+
+    def __len__(self) -> int:
+        return (self.block_counts[-1] if self.block_counts else self.origin) - self.removed
+
+    def sync(self) -> None:
+        """follow the lines added to and evicted from the tag index"""
+        tag_index = self.tag_index
+        if self.base + len(self.mask) < tag_index.base:
+            # lines evicted before the filter saw them, restart at the index base
+            self.origin = len(self) + self.removed
+            self.mask = bytearray()
+            self.block_counts = []
+            self.base = tag_index.base
+            self._block = None
+        while self.base < tag_index.base:
+            del self.mask[:INDEX_BLOCK_SIZE]
+            self.origin = self.block_counts.pop(0)
+            self.base += INDEX_BLOCK_SIZE
+            self._block = None
+        start = len(self.mask)
+        if start < len(tag_index.tags):
+            self.mask += self.new_mask(start)
+            first_block = start // INDEX_BLOCK_SIZE
+            del self.block_counts[first_block:]
+            count = self.block_counts[-1] if self.block_counts else self.origin
+            for offset in range(first_block * INDEX_BLOCK_SIZE, len(self.mask), INDEX_BLOCK_SIZE):
+                count += self.mask.count(1, offset, offset + INDEX_BLOCK_SIZE)
+                self.block_counts.append(count)
+            if self._block is not None and self._block[0] >= first_block:
+                self._block = None
+        self.removed = self.rank(tag_index.first_seq)
+
+    def new_mask(self, start: int) -> bytes:
+        """return the mask of the indexed lines from the position start"""
+        return self.tag_index.tags[start:].translate(self.table)
+
+    def is_done(self) -> bool:
+        """return True when every indexed line is in the mask"""
+        return self.base + len(self.mask) >= self.tag_index.next_seq
+
+    def rank(self, seq: int) -> int:
+        """return the number of visible lines before seq, counted from the origin"""
+        position = seq - self.base
+        block = position // INDEX_BLOCK_SIZE
+        count = self.block_counts[block - 1] if block else self.origin
+        return count + self.mask.count(1, block * INDEX_BLOCK_SIZE, position)
+
+    def is_visible(self, seq: int) -> bool:
+        position = seq - self.base
+        return seq >= self.tag_index.first_seq and 0 <= position < len(self.mask) and self.mask[position] == 1
+
+    def seq(self, row: int) -> int:
+        """return the sequence number of the visible line at row"""
+        rank = row + self.removed
+        block = bisect_right(self.block_counts, rank)
+        if self._block is None or self._block[0] != block:
+            start = block * INDEX_BLOCK_SIZE
+            positions = list(compress(range(start, start + INDEX_BLOCK_SIZE),
+                                      self.mask[start:start + INDEX_BLOCK_SIZE]))
+            self._block = (block, positions)
+        count = self.block_counts[block - 1] if block else self.origin
+        return self.base + self._block[1][rank - count]
+
+    def row(self, seq: int) -> int:
+        """return the row of the line seq, -1 if it is not visible"""
+        return self.rank(seq) - self.removed if self.is_visible(seq) else -1
+
+    def __iter__(self):
+        start = self.tag_index.first_seq - self.base
+        return iter(compress(range(self.base + start, self.base + len(self.mask)), islice(self.mask, start, None)))
+
+
+def log_selected_tags(tags_selected: Union[dict, Iterable[dict], None]) -> Optional[set]:
+    """return the set of indexes of the selected tags, None if every tag is selected"""
+    if tags_selected is None or isinstance(tags_selected, dict):
+        tags_selected = [tags_selected]
+    selected = set()
+    for tag in tags_selected:
+        if tag is None or tag == LOGGER_TAGS[0]:
+            return None
+        selected.add(LOGGER_TAGS.index(tag))
+    return selected if selected else None
+
+
+@timed("log_filter_by_tag")
+def log_filter_by_tag(tag_index: TagIndex, tags_selected: Union[dict, Iterable[dict], None]) -> Optional[TagFilter]:
+    """ Filter the indexed lines according to one tag or a list of tags.
+        Return the visible lines, None if every line is visible.
+        Untagged lines are always visible.
+    """
+    selected = log_selected_tags(tags_selected)
+    if selected is None:
+        return None
+    return TagFilter(tag_index, selected)
@@ -0,0 +1,153 @@
+import threading
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.metrics import metrics
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+# What a full LineQueue does with the lines put into it
+POLICY_BLOCK = "block"  # the reader waits, the device and the OS buffers absorb the burst
+POLICY_DROP_OLDEST = "drop_oldest"  # the oldest lines not shown yet are dropped
+POLICY_COLLAPSE = "collapse"  # repeated lines are collapsed, then the oldest lines are dropped
+POLICIES = [POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COLLAPSE]
+
+dropped_lines = metrics.counter("lines.dropped")
+
+
+def dropped_marker(count: int) -> str:
+    return LINE_QUEUE_DROPPED_MARKER.format(count)
+
+
+def repeated_marker(count: int) -> str:
+    return LINE_QUEUE_REPEATED_MARKER.format(count)
+
+
+class LineQueue:
+    """
+        Bounded hand-off of the lines read by the reader threads to the GUI thread.
+        At most max_lines lines are pending, so the memory and the work of the next
+        refresh stay bounded whatever the rate of the sources. When full, policy decides:
+        see POLICIES. The lines dropped are counted and replaced by a marker line, put
+        before the next lines of their source.
+        notify is called once when the queue stops being empty, until take() is called.
+    """
+
+    def __init__(self, max_lines: int = LINE_QUEUE_MAX_LINES, policy: str = POLICY_DROP_OLDEST,
+                 notify: Callable[[], None] = None):
+        if policy not in POLICIES:
+            raise ValueError("Unknown policy {0}".format(policy))
+        self.max_lines = max_lines
+        self.policy = policy
+        self.notify = notify
+        self.lock = threading.Lock()
+        self.not_full = threading.Condition(self.lock)
+        self.batches = deque()  # [source, lines, timestamps, collapsed] in arrival order
+        self.n_lines = 0
+        self.dropped = {}  # source: (lines dropped since the last take, receive time of the last one)
+        self.n_dropped = 0
+        self.notified = False
+        self.closed = False
+
+    def __len__(self) -> int:
+        return self.n_lines
+
+    def put(self, source: int, lines: List[str], timestamps: List[float], block: bool = True,
+            cancel: Optional[threading.Event] = None) -> None:
+        """
+            Queue the lines of a source. With the block policy, wait for room unless block
+            is False (the GUI thread must not wait for itself) or until cancel is set or the
+            queue is closed, the lines are then queued anyway.
+        """
+        if not lines:
+            return
+        with self.lock:
+            if self.policy == POLICY_BLOCK and block:
+                while (self.n_lines and self.n_lines + len(lines) > self.max_lines and not self.closed
+                       and not (cancel is not None and cancel.is_set())):
+                    self.not_full.wait(LINE_QUEUE_BLOCK_CHECK_MS / 1000)
+            if self.closed:
+                return
+            self.batches.append([source, list(lines), list(timestamps), False])
+            self.n_lines += len(lines)
+            if self.n_lines > self.max_lines and self.policy != POLICY_BLOCK:
+                if self.policy == POLICY_COLLAPSE:
+                    self._collapse()
+                self._drop_oldest()
+            notify = not self.notified
+            self.notified = True
+        if notify and self.notify is not None:
+            self.notify()
+
+    def take(self) -> List[Tuple[int, List[str], List[float]]]:
+        """return the pending (source, lines, timestamps) batches, with the markers of the dropped lines"""
+        with self.lock:
+            batches = [(source, lines, timestamps) for source, lines, timestamps, _ in self.batches]
+            dropped, self.dropped = self.dropped, {}
+            self.batches.clear()
+            self.n_lines = 0
+            self.notified = False
+            self.not_full.notify_all()
+        for source, (count, timestamp) in dropped.items():
+            batches.insert(0, (source, [dropped_marker(count)], [timestamp]))
+        return batches
+
+    def close(self) -> None:
+        """wake the waiting readers, the lines put from now on are ignored"""
+        with self.lock:
+            self.closed = True
+            self.not_full.notify_all()
+
+    def _count_dropped(self, source: int, count: int, timestamp: float) -> None:
+        previous = self.dropped.get(source, (0, timestamp))[0]
+        self.dropped[source] = (previous + count, timestamp)
+        self.n_dropped += count
+        dropped_lines.add(count)
+
+    def _drop_oldest(self) -> None:
+        excess = self.n_lines - self.max_lines
+        while excess > 0:
+            batch = self.batches[0]
+            source, lines, timestamps, _ = batch
+            count = min(excess, len(lines))
+            self._count_dropped(source, count, timestamps[count - 1])
+            if count == len(lines):
+                self.batches.popleft()
+            else:
+                del lines[:count]
+                del timestamps[:count]
+            self.n_lines -= count
+            excess -= count
+
+    def _collapse(self) -> None:
+        """replace the runs of a repeated line by the line and a marker counting the repeats,
+        in the batches not collapsed yet"""
+        for batch in self.batches:
+            source, lines, timestamps, collapsed = batch
+            if collapsed:
+                continue
+            collapsed_lines = []
+            collapsed_timestamps = []
+            index = 0
+            while index < len(lines):
+                end = index + 1
+                while end < len(lines) and lines[end] == lines[index]:
+                    end += 1
+                collapsed_lines.append(lines[index])
+                collapsed_timestamps.append(timestamps[index])
+                if end - index > 2:
+                    collapsed_lines.append(repeated_marker(end - index - 1))
+                    collapsed_timestamps.append(timestamps[end - 1])
+                    self.n_dropped += end - index - 1
+                    dropped_lines.add(end - index - 1)
+                elif end - index == 2:
+                    collapsed_lines.append(lines[index])
+                    collapsed_timestamps.append(timestamps[index + 1])
+                index = end
+            self.n_lines -= len(lines) - len(collapsed_lines)
+            batch[1:] = collapsed_lines, collapsed_timestamps, True
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from itertools import accumulate
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.filters import TagIndex
+from colorful_logger_app.core.mapped import MappedLog
+from colorful_logger_app.core.symbols import SYMBOL_FIELDS, SymbolIndex
+from colorful_logger_app.core.timeindex import NO_TIME, TimeIndex
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+# Index cache format: a header (magic, hash of the path, hash of the classifier, size and mtime
+# of the file, number of lines, hash of the indexed bytes, see index_check, size of the symbols)
+# followed by the columns of the MappedLog: the line offsets (lines + 1 Q), the times (lines d),
+# the tags (lines B), the source and function ids (lines I each), the posting lists of the
+# sources then of the functions (Q) and the symbols: JSON of the names and posting list lengths
+INDEX_CACHE_MAGIC = b"CLI\x02"
+INDEX_CACHE_HEADER = struct.Struct("<4s20s20sQdQ20sQ")
+
+
+def index_cache_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), CONFIG_DIR_NAME, INDEX_CACHE_DIR_NAME)
+
+
+def index_cache_path(path: str, directory: str = None) -> str:
+    """return the cache file of the index of the log file path"""
+    directory = index_cache_dir() if directory is None else directory
+    return os.path.join(directory, path_key(path).hex() + ".idx")
+
+
+def path_key(path: str) -> bytes:
+    return hashlib.sha1(os.path.abspath(path).encode()).digest()
+
+
+def index_check(data, indexed: int) -> bytes:
+    """return a hash of the first and last INDEX_CACHE_CHECK_SIZE bytes of the indexed part of a file"""
+    check = hashlib.sha1(data[:min(indexed, INDEX_CACHE_CHECK_SIZE)])
+    check.update(data[max(indexed - INDEX_CACHE_CHECK_SIZE, 0):indexed])
+    return check.digest()
+
+
+def save_index_cache(mapped_log: MappedLog, directory: str = None) -> str:
+    """
+        save the index of mapped_log, replacing the cache of the same file at once.
+        The oldest caches are removed beyond INDEX_CACHE_MAX_FILES. Return the cache file.
+    """
+    path = index_cache_path(mapped_log.path, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = mapped_log.next_seq
+    tables = [mapped_log.symbol_index.table(field) for field in SYMBOL_FIELDS]
+    symbols = json.dumps({field: {"names": table.names, "counts": [len(posting) for posting in table.postings]}
+                          for field, table in zip(SYMBOL_FIELDS, tables)}).encode()
+    header = INDEX_CACHE_HEADER.pack(INDEX_CACHE_MAGIC, path_key(mapped_log.path),
+                                     bytes.fromhex(mapped_log.classifier.digest()), mapped_log.size,
+                                     mapped_log.modified, lines, index_check(mapped_log.map, mapped_log.indexed),
+                                     len(symbols))
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(header)
+        file.write(mapped_log.offsets)
+        file.write(mapped_log.time_index.times)
+        file.write(mapped_log.tag_index.tags)
+        for table in tables:
+            file.write(table.column)
+        for table in tables:
+            for posting in table.postings:
+                file.write(posting)
+        file.write(symbols)
+    os.replace(temporary, path)
+
+    caches = sorted((entry for entry in os.scandir(os.path.dirname(path)) if entry.name.endswith(".idx")),
+                    key=lambda entry: entry.stat().st_mtime)
+    for entry in caches[:-INDEX_CACHE_MAX_FILES]:
+        os.remove(entry.path)
+    return path
+
+
+def load_index_cache(mapped_log: MappedLog, directory: str = None) -> bool:
+    """
+        replace the index of a MappedLog not indexed yet by its cache, if the cache is for the
+        same file and classifier. The cache of a file that only grew is loaded too, the lines
+        after mapped_log.indexed remain to be indexed. Return True if the cache was loaded.
+        The columns are read from the mapped cache file, see MappedLog.index_map, except the
+        tags that are copied: they are rewritten when the profile changes.
+    """
+    path = index_cache_path(mapped_log.path, directory)
+    try:
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # no cache, or an empty file
+        return False
+    view = None  # the mapped cache file is kept once loaded
+    try:
+        magic, key, classifier, size, modified, lines, check, symbols_size = INDEX_CACHE_HEADER.unpack_from(data)
+        if (magic != INDEX_CACHE_MAGIC or key != path_key(mapped_log.path)
+                or classifier != bytes.fromhex(mapped_log.classifier.digest()) or size > mapped_log.size
+                or size == mapped_log.size and modified != mapped_log.modified):
+            return False
+        position = INDEX_CACHE_HEADER.size
+        times_position = position + 8 * (lines + 1)
+        tags_position = times_position + 8 * lines
+        symbols_position = tags_position + lines
+        symbols = json.loads(data[len(data) - symbols_size:].decode()) if symbols_size <= len(data) else {}
+        names = [symbols[field]["names"] for field in SYMBOL_FIELDS]
+        counts = [symbols[field]["counts"] for field in SYMBOL_FIELDS]
+        if len(data) != symbols_position + 8 * lines + 8 * sum(map(sum, counts)) + symbols_size:
+            return False
+        indexed = min(struct.unpack_from("<Q", data, times_position - 8)[0], size)
+        if index_check(mapped_log.map, indexed) != check:
+            return False
+        view = memoryview(data)
+    except (struct.error, ValueError, KeyError, TypeError):
+        return False
+    finally:
+        if view is None:
+            data.close()
+
+    mapped_log.release_index()
+    mapped_log.index_map = data
+    mapped_log.offsets = view[position:times_position].cast("Q")
+    mapped_log.tag_index = TagIndex(0)
+    mapped_log.tag_index.tags = bytearray(view[tags_position:symbols_position])
+    mapped_log.time_index = TimeIndex(0)
+    mapped_log.time_index.times = view[times_position:tags_position].cast("d")
+    mapped_log.symbol_index = SymbolIndex(0)
+    postings_position = symbols_position + 8 * lines
+    for field, table_names, table_counts in zip(SYMBOL_FIELDS, names, counts):
+        table = mapped_log.symbol_index.table(field)
+        table.names = table_names
+        table.ids = {name: symbol for symbol, name in enumerate(table_names)}
+        table.column = view[symbols_position:symbols_position + 4 * lines].cast("I")
+        symbols_position += 4 * lines
+        postings = view[postings_position:postings_position + 8 * sum(table_counts)].cast("Q")
+        postings_position += 8 * len(postings)
+        table.postings = [postings[end - length:end] for end, length in zip(accumulate(table_counts), table_counts)]
+
+    if mapped_log.offsets[-1] > size < mapped_log.size:
+        # the last line was not complete, it is indexed again with the rest of the file
+        mapped_log.own_index()
+        del mapped_log.offsets[-1], mapped_log.time_index.times[-1], mapped_log.tag_index.tags[-1]
+        for field in SYMBOL_FIELDS:
+            table = mapped_log.symbol_index.table(field)
+            symbol = table.column.pop()
+            if symbol:
+                table.postings[symbol].pop()
+    times = mapped_log.time_index.times
+    mapped_log.time_index.last = times[-1] if times else NO_TIME
+    if mapped_log.tag_filter is not None:
+        mapped_log.set_filter(mapped_log.tags_selected)
+    return True
@@ -0,0 +1,286 @@
+import asyncio
+import gzip
+import struct
+import threading
+import time
+import zlib
+from typing import Iterator, Optional, Tuple
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.loader import LineSplitter
+from colorful_logger_app.core.sources import LogSource, Emit
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for .zst journals
+    zstandard = None
+
+# errors of the compressed data cut by a crash or corrupted
+DECOMPRESS_ERRORS = (EOFError, OSError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+# Journal format: a header (magic, compression, wall clock time of the start) followed by
+# blocks of records compressed separately, so a crash loses the block being filled at most
+# and a time is found without decompressing the blocks before it. A block is the time of
+# its first record, its compressed size, its size and the compressed records. A record is
+# the receive time in seconds since the start (monotonic clock), the source id, the size
+# and the raw bytes. The journals of the first version, one compressed stream of records
+# without blocks, are still read.
+JOURNAL_MAGIC = b"CLJ\x02"
+JOURNAL_MAGIC_STREAM = b"CLJ\x01"
+JOURNAL_HEADER = struct.Struct("<4sBd")
+JOURNAL_BLOCK = struct.Struct("<dII")
+JOURNAL_RECORD = struct.Struct("<dHI")
+
+COMPRESSION_NONE = 0
+COMPRESSION_GZIP = 1
+COMPRESSION_ZSTD = 2
+
+
+def journal_compression(path: str) -> int:
+    """return the compression of a journal named path: .gz gzip, .zst zstd, otherwise none"""
+    if path.endswith(".gz"):
+        return COMPRESSION_GZIP
+    if path.endswith(".zst"):
+        return COMPRESSION_ZSTD
+    return COMPRESSION_NONE
+
+
+def _check_zstd() -> None:
+    if zstandard is None:
+        raise ValueError("zstd journals need the zstandard package")
+
+
+class JournalWriter:
+    """
+        Append the raw chunks received from the sources to a journal file.
+        Writes can be called from several threads. The records are kept in a block, compressed
+        and written when it reaches JOURNAL_BLOCK_SIZE bytes or JOURNAL_BLOCK_INTERVAL_MS of age.
+    """
+
+    def __init__(self, path: str, compression: int = None):
+        compression = journal_compression(path) if compression is None else compression
+        if compression == COMPRESSION_ZSTD:
+            _check_zstd()
+        self.path = path
+        self.lock = threading.Lock()
+        self.closed = False
+        self.start = time.monotonic()
+        self.compression = compression
+        self.compressor = zstandard.ZstdCompressor() if compression == COMPRESSION_ZSTD else None
+        self.file = open(path, "wb")
+        self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, compression, time.time()))
+        self.block = bytearray()  # records not written yet
+        self.block_time = 0.0  # timestamp of the first record of the block
+        self.block_deadline = 0.0  # monotonic time the block is written at the latest
+        self.n_records = 0
+
+    def write(self, source: int, data: bytes, timestamp: float = None) -> None:
+        """record a chunk received now (or timestamp seconds after the start), ignored once closed"""
+        now = time.monotonic()
+        if timestamp is None:
+            timestamp = now - self.start
+        with self.lock:
+            if self.closed:
+                return
+            if not self.block:
+                self.block_time = timestamp
+                self.block_deadline = now + JOURNAL_BLOCK_INTERVAL_MS / 1000
+            self.block += JOURNAL_RECORD.pack(timestamp, source, len(data))
+            self.block += data
+            self.n_records += 1
+            if len(self.block) >= JOURNAL_BLOCK_SIZE or now >= self.block_deadline:
+                self._write_block()
+
+    def flush(self) -> None:
+        """write the records of the block being filled"""
+        with self.lock:
+            if not self.closed:
+                self._write_block()
+
+    def _write_block(self) -> None:
+        """compress and write the block, called with the lock held"""
+        if not self.block:
+            return
+        data = bytes(self.block)
+        if self.compression == COMPRESSION_GZIP:
+            data = gzip.compress(data, JOURNAL_GZIP_LEVEL)
+        elif self.compression == COMPRESSION_ZSTD:
+            data = self.compressor.compress(data)
+        self.file.write(JOURNAL_BLOCK.pack(self.block_time, len(data), len(self.block)))
+        self.file.write(data)
+        self.file.flush()
+        self.block = bytearray()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._write_block()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class JournalReader:
+    """Iterate over the (timestamp, source, data) records of a journal.
+    The journal ends at the last complete record before a cut (a crash) or corrupted data."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        magic, compression, self.start_time = JOURNAL_HEADER.unpack(self.file.read(JOURNAL_HEADER.size))
+        if magic not in (JOURNAL_MAGIC, JOURNAL_MAGIC_STREAM):
+            self.file.close()
+            raise ValueError("{0} is not a journal".format(path))
+        if compression == COMPRESSION_ZSTD:
+            _check_zstd()
+        self.compression = compression
+        self.skip_before = None  # timestamp of the first record iterated, see seek
+        self.stream = None  # decompressed records of a journal without blocks
+        if magic == JOURNAL_MAGIC_STREAM:
+            if compression == COMPRESSION_GZIP:
+                self.stream = gzip.GzipFile(fileobj=self.file, mode="rb")
+            elif compression == COMPRESSION_ZSTD:
+                self.stream = zstandard.ZstdDecompressor().stream_reader(self.file)
+            else:
+                self.stream = self.file
+
+    def __iter__(self) -> Iterator[Tuple[float, int, bytes]]:
+        records = self._block_records() if self.stream is None else self._stream_records()
+        for record in records:
+            if self.skip_before is None or record[0] >= self.skip_before:
+                yield record
+
+    def seek(self, timestamp: float) -> None:
+        """iterate from the first record received at or after timestamp, the blocks before
+        it are skipped without reading them"""
+        self.skip_before = timestamp
+        if self.stream is not None:
+            return
+        position = start = JOURNAL_HEADER.size
+        self.file.seek(position)
+        while True:
+            header = self.file.read(JOURNAL_BLOCK.size)
+            if len(header) < JOURNAL_BLOCK.size:
+                break
+            first_time, compressed_size, size = JOURNAL_BLOCK.unpack(header)
+            if first_time > timestamp:
+                break
+            start = position
+            position = self.file.seek(compressed_size, 1)
+        self.file.seek(start)
+
+    def _block_records(self) -> Iterator[Tuple[float, int, bytes]]:
+        while True:
+            header = self.file.read(JOURNAL_BLOCK.size)
+            if len(header) < JOURNAL_BLOCK.size:
+                return
+            first_time, compressed_size, size = JOURNAL_BLOCK.unpack(header)
+            try:
+                # the complete records of a block cut by a crash are read too
+                data = self._decompress(self.file.read(compressed_size), size)
+            except DECOMPRESS_ERRORS:
+                return
+            position = 0
+            while position + JOURNAL_RECORD.size <= len(data):
+                timestamp, source, record_size = JOURNAL_RECORD.unpack_from(data, position)
+                position += JOURNAL_RECORD.size
+                if position + record_size > len(data):
+                    return
+                yield timestamp, source, data[position:position + record_size]
+                position += record_size
+            if len(data) < size:
+                return
+
+    def _decompress(self, data: bytes, size: int) -> bytes:
+        if self.compression == COMPRESSION_GZIP:
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, size)
+        if self.compression == COMPRESSION_ZSTD:
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return data
+
+    def _stream_records(self) -> Iterator[Tuple[float, int, bytes]]:
+        while True:
+            header = self._read(JOURNAL_RECORD.size)
+            if len(header) < JOURNAL_RECORD.size:
+                return
+            timestamp, source, size = JOURNAL_RECORD.unpack(header)
+            data = self._read(size)
+            if len(data) < size:
+                return
+            yield timestamp, source, data
+
+    def _read(self, size: int) -> bytes:
+        try:
+            data = self.stream.read(size)
+            while 0 < len(data) < size:
+                more = self.stream.read(size - len(data))
+                if not more:
+                    break
+                data += more
+        except DECOMPRESS_ERRORS:  # a compressed stream cut by a crash has no end marker
+            return b""
+        return data
+
+    def close(self) -> None:
+        if self.stream is not None and self.stream is not self.file:
+            self.stream.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplaySource(LogSource):
+    """
+        Play a journal back through a SourceLoop, keeping the time between the records
+        divided by speed. Speed 0 replays as fast as possible.
+        The chunks of every recorded source are split in lines separately.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, source: Optional[int] = None):
+        super(ReplaySource, self).__init__("replay:{0}".format(path))
+        self.path = path
+        self.speed = speed
+        self.source = source  # replay only this recorded source, None for all of them
+
+    async def run(self, emit: Emit) -> None:
+        splitters = {}
+        try:
+            with JournalReader(self.path) as journal:
+                self.started.set()
+                start = None
+                for count, (timestamp, source, data) in enumerate(journal):
+                    if self.source is not None and source != self.source:
+                        continue
+                    if self.speed > 0:
+                        if start is None:
+                            start = time.monotonic() - timestamp / self.speed
+                        delay = start + timestamp / self.speed - time.monotonic()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    elif count % JOURNAL_REPLAY_YIELD_RECORDS == 0:
+                        await asyncio.sleep(0)  # let the other sources run
+                    splitter = splitters.get(source)
+                    if splitter is None:
+                        splitter = splitters[source] = LineSplitter()
+                    lines = splitter.split(data)
+                    if lines:
+                        emit(lines)
+        finally:  # the last lines of each source, even when the replay is stopped or fails
+            for splitter in splitters.values():
+                emit(splitter.flush())
+
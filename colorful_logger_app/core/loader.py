@@ -0,0 +1,91 @@
+import codecs
+from typing import BinaryIO, Iterator, List, Tuple
+
+from colorful_logger_app.constants import *
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+
+def log_tail_offset(file: BinaryIO, max_lines: int, max_bytes: int) -> int:
+    """
+        return the file position of the first line that fits in a store limited to
+        max_lines and max_bytes, everything before would be evicted anyway.
+        The newlines are counted backwards from the end of the file. The byte limit is
+        exact for single byte encodings, the store counts characters and not newlines.
+    """
+    size = file.seek(0, 2)
+    limit = max(0, size - max_bytes - max_lines)
+    if size == 0:
+        return 0
+    file.seek(size - 1)
+    # the newline ending the last line does not start a new one
+    wanted = max_lines + (1 if file.read(1) == b"\n" else 0)
+    position = size
+    while position > limit:
+        chunk_start = max(limit, position - LOAD_CHUNK_SIZE)
+        file.seek(chunk_start)
+        chunk = file.read(position - chunk_start)
+        count = chunk.count(b"\n")
+        if count >= wanted:
+            end = len(chunk)
+            for _ in range(wanted):
+                end = chunk.rfind(b"\n", 0, end)
+            return chunk_start + end + 1
+        wanted -= count
+        position = chunk_start
+    return limit
+
+
+class LineSplitter:
+    """
+        Split a stream of bytes in lines. The text is decoded as UTF-8 incrementally,
+        a character cut between two chunks is kept whole and invalid bytes are replaced.
+    """
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.pending = ""
+
+    def split(self, data: bytes) -> List[str]:
+        """return the lines completed by data"""
+        text = self.pending + self.decoder.decode(data)
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        lines = text.split("\n")
+        self.pending = lines.pop()
+        return lines
+
+    def flush(self) -> List[str]:
+        """return the last line if it was not ended by a newline"""
+        pending = self.pending + self.decoder.decode(b"", final=True)
+        self.pending = ""
+        return [pending.rstrip("\r")] if pending else []
+
+
+def read_lines(file: BinaryIO, start: int = 0, chunk_size: int = LOAD_CHUNK_SIZE) -> Iterator[Tuple[List[str], int]]:
+    """
+        read a binary file from start in chunks of chunk_size bytes, yield the lines completed
+        by each chunk and the file position reached. A line cut at start is skipped.
+        The text is decoded as UTF-8, invalid bytes are replaced.
+    """
+    if start:
+        file.seek(start - 1)
+        if file.read(1) != b"\n":
+            file.readline()
+    else:
+        file.seek(0)
+    splitter = LineSplitter()
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        lines = splitter.split(chunk)
+        if lines:
+            yield lines, file.tell()
+    lines = splitter.flush()
+    if lines:
+        yield lines, file.tell()
@@ -0,0 +1,193 @@
+import mmap
+import os
+from array import array
+from collections import OrderedDict
+from itertools import repeat
+from typing import List, Optional
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.bulk import ParsedChunk, parse_chunk
+from colorful_logger_app.core.classifier import LogClassifier, default_classifier
+from colorful_logger_app.core.filters import TagIndex
+from colorful_logger_app.core.rows import VisibleRows
+from colorful_logger_app.core.store import LogLine
+from colorful_logger_app.core.symbols import SYMBOL_FIELDS, SymbolIndex
+from colorful_logger_app.core.timeindex import TimeIndex
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+
+class MappedLog(VisibleRows):
+    """
+        Read only log file accessed through mmap.
+        The index holds the offset of every line (array('Q')), its tag (TagIndex), its
+        time (TimeIndex) and its source file and function (SymbolIndex), the text of a line
+        is decoded and classified again when it is read.
+        The index is built by scan() and add_scan(), so scanning can run on another thread
+        or in other processes, see BulkParser.
+        Same interface as LogBuffer for the log view, the sequence number of a line is its number.
+        An index loaded from its cache reads its columns from the mapped cache file, index_map,
+        until the file grows, see own_index.
+    """
+
+    def __init__(self, path: str, classifier: LogClassifier = None):
+        super(MappedLog, self).__init__()
+        self.path = path
+        self.classifier = default_classifier if classifier is None else classifier
+        self.file = open(path, "rb")
+        self.size = self.file.seek(0, 2)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.offsets = array("Q", [0])  # start of each line, then the end of the indexed part
+        self.tag_index = TagIndex(0)
+        self.time_index = TimeIndex(0)
+        self.symbol_index = SymbolIndex(0)
+        self.index_map = None  # :type mmap.mmap of the index cache, see load_index_cache
+        self.modified = os.path.getmtime(path)  # day of the timestamps without a date before the first date
+        self.collapse = False  # a file is shown as it is, see repeat()
+        self._cache = OrderedDict()  # decoded lines, see MAPPED_CACHE_LINES
+
+    def close(self) -> None:
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+        self.release_index()
+
+    def own_index(self) -> None:
+        """copy the columns read from index_map to arrays, so they can grow"""
+        if self.index_map is None:
+            return
+        self.offsets = as_array("Q", self.offsets)
+        self.time_index.times = as_array("d", self.time_index.times)
+        for field in SYMBOL_FIELDS:
+            table = self.symbol_index.table(field)
+            table.column = as_array("I", table.column)
+            table.postings = [as_array("Q", posting) for posting in table.postings]
+        self.release_index()
+
+    def release_index(self) -> None:
+        """close index_map, or let it close when collected while a view of it is used"""
+        index_map, self.index_map = self.index_map, None
+        if index_map is not None:
+            try:
+                index_map.close()
+            except BufferError:
+                pass
+
+    @property
+    def indexed(self) -> int:
+        """return the number of bytes already indexed"""
+        return min(self.offsets[-1], self.size)
+
+    def is_indexed(self) -> bool:
+        return self.indexed >= self.size
+
+    def scan(self, start: int, chunk_size: int = LOAD_CHUNK_SIZE) -> ParsedChunk:
+        """
+            classify the lines starting in [start, start + chunk_size), the last one is read to its end.
+            Does not change the index, see add_scan.
+        """
+        end = min(start + chunk_size, self.size)
+        if end < self.size:
+            newline = self.map.rfind(b"\n", start, end)
+            if newline < 0:
+                newline = self.map.find(b"\n", end)
+            end = newline + 1 if newline >= 0 else self.size
+        return parse_chunk(self.path, start, end, self.classifier)
+
+    def add_scan(self, chunk: ParsedChunk) -> int:
+        """add a chunk classified by scan or by a BulkParser to the index, return 0 (no line is ever evicted).
+        The chunks must be added in file order"""
+        self.own_index()
+        # a line ends one byte after its text, the newline (or the end of the file)
+        self.offsets.extend(chunk.ends)
+        self.tag_index.extend(chunk.tags)
+        self.time_index.extend_times(chunk.times, repeat(self.modified))
+        self.symbol_index.extend_chunk(chunk)
+        if self.tag_filter is not None:
+            self.tag_filter.sync()
+        return 0
+
+    def index_all(self, chunk_size: int = LOAD_CHUNK_SIZE) -> None:
+        """index the whole file on the calling thread"""
+        while not self.is_indexed():
+            self.add_scan(self.scan(self.indexed, chunk_size))
+
+    def retag(self, start_seq: int, end_seq: int) -> int:
+        """classify again the lines in [start_seq, end_seq) with the current classifier,
+        return the number of lines whose tag changed. Call set_filter once done, see LogBuffer.retag"""
+        classify = self.classifier.classify
+        tags = self.tag_index.tags
+        changed = 0
+        for seq, text in enumerate(self.texts(start_seq, end_seq), start_seq):
+            self._cache.pop(seq, None)
+            tag = classify(text).tag
+            if tags[seq] != tag:
+                self.tag_index.set(seq, tag)
+                changed += 1
+        return changed
+
+    def text(self, seq: int) -> str:
+        """decode the line seq"""
+        text = self.map[self.offsets[seq]:self.offsets[seq + 1] - 1].decode("utf-8", errors="replace")
+        return text[:-1] if text.endswith("\r") else text
+
+    @property
+    def first_seq(self) -> int:
+        return 0
+
+    @property
+    def next_seq(self) -> int:
+        return len(self.offsets) - 1
+
+    def texts(self, start_seq: int, end_seq: int) -> List[str]:
+        """decode the lines in [start_seq, end_seq) at once"""
+        end_seq = min(end_seq, self.next_seq)
+        if start_seq >= end_seq:
+            return []
+        text = self.map[self.offsets[start_seq]:self.offsets[end_seq] - 1].decode("utf-8", errors="replace")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+            if text.endswith("\r"):
+                text = text[:-1]
+        return text.split("\n")
+
+    def line(self, row: int) -> Optional[LogLine]:
+        """return the visible line at row, decoded and classified"""
+        seq = self.seq(row)
+        line = self._cache.get(seq)
+        if line is None:
+            text = self.text(seq)
+            line = LogLine(text, self.classifier.classify(text))
+            self._cache[seq] = line
+            if len(self._cache) > MAPPED_CACHE_LINES:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(seq)
+        return line
+
+    def line_at(self, seq: int) -> Optional[LogLine]:
+        """return the line seq, visible or not, decoded and classified without the cache"""
+        if not 0 <= seq < self.next_seq:
+            return None
+        text = self.text(seq)
+        return LogLine(text, self.classifier.classify(text))
+
+    def repeat(self, seq: int) -> Optional[list]:
+        """lines are never collapsed in a file, see LogBuffer.repeat"""
+        return None
+
+    def clear(self) -> None:
+        """the file is read only, nothing is removed"""
+
+
+def as_array(typecode: str, values) -> array:
+    """return values, an array or a memoryview, as an array"""
+    if isinstance(values, array):
+        return values
+    copy = array(typecode)
+    copy.frombytes(values.cast("B"))
+    return copy
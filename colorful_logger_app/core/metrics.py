@@ -0,0 +1,187 @@
+import functools
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from colorful_logger_app.constants import *
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+# Latencies are counted in buckets of powers of 2 microseconds: bucket b holds [2^(b-1), 2^b) us
+HISTOGRAM_BUCKETS = 32
+
+
+class Counter:
+    """A total (bytes, lines, ...) and its rate between two snapshots. Can be added from any thread."""
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+        self._last_value = 0
+        self._last_time = time.monotonic()
+
+    def add(self, count: int = 1) -> None:
+        with self.lock:
+            self.value += count
+
+    def rate(self) -> float:
+        """return the increase per second since the last call"""
+        now = time.monotonic()
+        value = self.value
+        elapsed = now - self._last_time
+        rate = (value - self._last_value) / elapsed if elapsed > 0 else 0.0
+        self._last_value, self._last_time = value, now
+        return rate
+
+    def snapshot(self) -> dict:
+        return {"total": self.value, "rate": self.rate()}
+
+
+class Gauge:
+    """A level (queue depth, ...) and the highest level reached, or the value returned by probe"""
+
+    def __init__(self, probe: Optional[Callable[[], float]] = None):
+        self.value = 0
+        self.peak = 0
+        self.probe = probe
+        self.lock = threading.Lock()
+
+    def add(self, count: int = 1) -> None:
+        with self.lock:
+            self.value += count
+            if self.value > self.peak:
+                self.peak = self.value
+
+    def snapshot(self) -> dict:
+        if self.probe is not None:
+            return {"value": self.probe()}
+        return {"value": self.value, "peak": self.peak}
+
+
+class Histogram:
+    """Latencies in buckets of powers of 2 microseconds, see HISTOGRAM_BUCKETS"""
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.buckets[min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """return the upper bound in seconds of the bucket holding the given percentile"""
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(50), "p99": self.percentile(99), "max": self.max}
+
+
+class Metrics:
+    """
+        Registry of the counters, gauges and histograms of the hot paths, by name.
+        Disabled by default: the instrumented code checks enabled before measuring, so
+        while disabled a call costs one test, or one more function call with timed.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}  # type: Dict[str, Counter]
+        self.gauges = {}  # type: Dict[str, Gauge]
+        self.histograms = {}  # type: Dict[str, Histogram]
+
+    def counter(self, name: str) -> Counter:
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = Counter()
+        return counter
+
+    def gauge(self, name: str, probe: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self.gauges.get(name)
+        if gauge is None:
+            gauge = self.gauges[name] = Gauge(probe)
+        elif probe is not None:
+            gauge.probe = probe
+        return gauge
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def snapshot(self) -> Dict[str, dict]:
+        """return the current values by name, the rates are computed since the last snapshot"""
+        values = {name: counter.snapshot() for name, counter in self.counters.items()}
+        values.update((name, gauge.snapshot()) for name, gauge in self.gauges.items())
+        values.update((name, histogram.snapshot()) for name, histogram in self.histograms.items())
+        return values
+
+    def reset(self) -> None:
+        """forget the values, the registered objects and the levels of the gauges are kept"""
+        for counter in self.counters.values():
+            counter.__init__()
+        for gauge in self.gauges.values():
+            gauge.peak = gauge.value
+        for histogram in self.histograms.values():
+            histogram.__init__()
+
+
+metrics = Metrics()
+
+
+def timed(name: str):
+    """decorator recording the duration of each call in the histogram name, while metrics are enabled"""
+    histogram = metrics.histogram(name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def format_duration(seconds: float) -> str:
+    if seconds >= 1:
+        return "{0:.2f} s".format(seconds)
+    if seconds >= 1e-3:
+        return "{0:.1f} ms".format(seconds * 1e3)
+    return "{0:.0f} us".format(seconds * 1e6)
+
+
+def format_metric(values: dict) -> str:
+    """return the values of a snapshot entry as text"""
+    if "p99" in values:
+        return "{0} calls, mean {1}, p50 {2}, p99 {3}, max {4}".format(
+            values["count"], format_duration(values["mean"]), format_duration(values["p50"]),
+            format_duration(values["p99"]), format_duration(values["max"]))
+    if "rate" in values:
+        return "{0}, {1:.0f}/s".format(values["total"], values["rate"])
+    if "peak" in values:
+        return "{0} (peak {1})".format(values["value"], values["peak"])
+    return str(values["value"])
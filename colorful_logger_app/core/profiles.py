@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from colorful_logger_app import LOGGER_TAGS, LOGGER_TIMESTAMPS, find_tag_by_name
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.classifier import LogClassifier, keyword_regex
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+logger = logging.getLogger(__name__)
+
+RULE_KEYWORD = "keyword"
+RULE_PREFIX = "prefix"
+RULE_REGEX = "regex"
+RULE_KINDS = [RULE_KEYWORD, RULE_PREFIX, RULE_REGEX]
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class HighlightRule:
+    """
+        A user defined rule: a keyword (whole word), a prefix (start of the line) or a regular
+        expression, painted with a color and a style. A rule with a tag (name in LOGGER_TAGS)
+        also tags the lines where it is found in the header, for the tag filter.
+    """
+
+    def __init__(self, kind: str, pattern: str, color: str = "black", bold: bool = False, italic: bool = False,
+                 underline: bool = False, tag: Optional[str] = None):
+        self.kind = kind
+        self.pattern = pattern
+        self.color = color
+        self.bold = bold
+        self.italic = italic
+        self.underline = underline
+        self.tag = tag
+
+    def regex(self) -> str:
+        """return the regular expression of the rule"""
+        if self.kind == RULE_KEYWORD:
+            return word_regex(keyword_regex([self.pattern]), self.pattern)
+        if self.kind == RULE_PREFIX:
+            return "^" + re.escape(self.pattern)
+        return self.pattern
+
+    def validate(self) -> None:
+        """raise ValueError if the rule can not be compiled"""
+        if self.kind not in RULE_KINDS:
+            raise ValueError("Unknown rule kind {0}".format(self.kind))
+        if not self.pattern:
+            raise ValueError("Empty {0} rule".format(self.kind))
+        if self.tag is not None and find_tag_by_name(self.tag) is None:
+            raise ValueError("Unknown tag {0}".format(self.tag))
+        try:
+            pattern = re.compile(self.regex())
+        except re.error as e:
+            raise ValueError("Invalid regex {0} : {1}".format(self.pattern, e))
+        if pattern.groupindex:
+            raise ValueError("Named groups are not allowed : {0}".format(self.pattern))
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "pattern": self.pattern, "color": self.color, "bold": self.bold,
+                "italic": self.italic, "underline": self.underline, "tag": self.tag}
+
+    @staticmethod
+    def from_dict(values: dict) -> "HighlightRule":
+        return HighlightRule(values["kind"], values["pattern"], values.get("color", "black"),
+                             values.get("bold", False), values.get("italic", False), values.get("underline", False),
+                             values.get("tag"))
+
+
+def word_regex(regex: str, sample: str) -> str:
+    """match regex as a whole word when sample starts and ends with word characters"""
+    if sample[:1].isalnum() or sample[:1] == "_":
+        regex = r"(?<!\w)" + regex
+    if sample[-1:].isalnum() or sample[-1:] == "_":
+        regex += r"(?!\w)"
+    return regex
+
+
+class RuleMatcher:
+    """
+        The rules of a profile compiled into one matcher. The keywords made of word
+        characters are found by looking up each word of the line in a dict, their number
+        does not change the cost of a line. The other rules are alternated in one regular
+        expression.
+    """
+
+    def __init__(self, rules: List[HighlightRule]):
+        self.rules = rules
+        self.words = {}  # keyword: index of its rule
+        self.groups = {}  # group name: index of its rule
+        alternatives = []
+        for index, rule in enumerate(rules):
+            if rule.kind == RULE_KEYWORD and WORD_PATTERN.fullmatch(rule.pattern):
+                self.words.setdefault(rule.pattern, index)
+            else:
+                self.groups["r{0}".format(index)] = index
+                alternatives.append("(?P<r{0}>{1})".format(index, rule.regex()))
+        self.pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """iterate over the (start, end, rule index) of the rules found in text"""
+        if self.words:
+            words = self.words
+            for match in WORD_PATTERN.finditer(text):
+                index = words.get(match.group())
+                if index is not None:
+                    yield match.start(), match.end(), index
+        if self.pattern is not None:
+            for match in self.pattern.finditer(text):
+                if match.start() != match.end():
+                    yield match.start(), match.end(), self.groups[match.lastgroup]
+
+
+class RuleProfile:
+    """A named set of highlight rules, with the timestamp formats of the device family"""
+
+    def __init__(self, name: str, rules: List[HighlightRule] = None, timestamps: List[Dict[str, str]] = None):
+        self.name = name
+        self.rules = [] if rules is None else rules
+        self.timestamps = LOGGER_TIMESTAMPS if timestamps is None else timestamps
+
+    def validate(self) -> None:
+        for rule in self.rules:
+            rule.validate()
+
+    def tag_rules(self) -> List[Tuple[str, int]]:
+        """return the (regular expression, index in LOGGER_TAGS) of the rules with a tag, for LogClassifier.
+        The keywords of a tag are merged in one expression"""
+        keywords = {}
+        tag_rules = []
+        for rule in self.rules:
+            if rule.tag is None:
+                continue
+            tag = LOGGER_TAGS.index(find_tag_by_name(rule.tag))
+            if rule.kind == RULE_KEYWORD:
+                keywords.setdefault(tag, []).append(rule.pattern)
+            else:
+                tag_rules.append((rule.regex(), tag))
+        for tag, words in keywords.items():
+            word_rules = [word for word in words if WORD_PATTERN.fullmatch(word)]
+            if word_rules:
+                tag_rules.append((r"(?<!\w)" + keyword_regex(word_rules) + r"(?!\w)", tag))
+            tag_rules += [(word_regex(re.escape(word), word), tag) for word in words if word not in word_rules]
+        return tag_rules
+
+    def classifier(self) -> LogClassifier:
+        return LogClassifier(timestamps=self.timestamps, tag_rules=self.tag_rules())
+
+    def matcher(self) -> RuleMatcher:
+        return RuleMatcher(self.rules)
+
+    def digest(self) -> str:
+        """return a hash of the rules, it changes when the lines would be classified differently"""
+        return hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "rules": [rule.to_dict() for rule in self.rules], "timestamps": self.timestamps}
+
+    @staticmethod
+    def from_dict(values: dict) -> "RuleProfile":
+        return RuleProfile(values["name"], [HighlightRule.from_dict(rule) for rule in values.get("rules", [])],
+                           values.get("timestamps"))
+
+
+def default_profile() -> RuleProfile:
+    """return the profile of the LOGGER_TAGS names"""
+    return RuleProfile(DEFAULT_PROFILE_NAME,
+                       [HighlightRule(RULE_KEYWORD, tag["name"], tag["color"], bold=True, underline=True,
+                                      tag=tag["name"]) for tag in LOGGER_TAGS[1:]])
+
+
+def profiles_path() -> str:
+    return os.path.join(os.path.expanduser("~"), CONFIG_DIR_NAME, PROFILES_FILE_NAME)
+
+
+def load_profiles(path: str = None) -> Tuple[List[RuleProfile], Optional[str]]:
+    """
+        return the profiles saved in path and the name of the active one (None for the
+        built-in tags). The default profile is always present. An unreadable file is ignored.
+    """
+    path = profiles_path() if path is None else path
+    profiles = []
+    active = None
+    try:
+        with open(path, encoding="utf-8") as file:
+            values = json.load(file)
+        profiles = [RuleProfile.from_dict(profile) for profile in values.get("profiles", [])]
+        active = values.get("active")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Ignoring the profiles of {0} : {1}".format(path, e))
+    if not any(profile.name == DEFAULT_PROFILE_NAME for profile in profiles):
+        profiles.insert(0, default_profile())
+    return profiles, active
+
+
+def save_profiles(profiles: List[RuleProfile], active: Optional[str], path: str = None) -> None:
+    """save the profiles and the name of the active one to path, replacing it at once"""
+    path = profiles_path() if path is None else path
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump({"active": active, "profiles": [profile.to_dict() for profile in profiles]}, file, indent=2)
+    os.replace(temporary, path)
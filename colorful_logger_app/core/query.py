@@ -0,0 +1,388 @@
+import math
+import re
+from bisect import bisect_right
+from itertools import accumulate, compress
+from typing import List, Optional
+
+from colorful_logger_app import LOGGER_TAGS
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.filters import TagFilter
+from colorful_logger_app.core.symbols import SYMBOL_FIELDS, function_name, source_name
+from colorful_logger_app.core.timeindex import NO_TIME, parse_time_query
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+# tokens of a query: parentheses, "quoted strings", the .. of a time range, operators and words
+QUERY_TOKEN_RULE = re.compile(r'\s*(?:(?P<open>\()|(?P<close>\))|(?P<string>"(?:[^"\\]|\\.)*")|(?P<range>\.\.)'
+                              r'|(?P<op>!=|!~|>=|<=|=|~|<|>)|(?P<word>(?:[^\s()"=!~<>.]|\.(?!\.))+))')
+QUERY_FIELDS = ["tag", "time", "src", "func", "text"]
+QUERY_KEYWORDS = ["and", "or", "not", "in"]
+
+
+class QueryBlock:
+    """
+        Lines evaluated by a query step: the lines with sequence numbers [start, end) and their tags.
+        A mask is a number with one byte per line, 1 when the line matches: byte i (bits 8 * i)
+        for the line start + i, so masks are combined with & | ~ on whole blocks at once.
+        Texts and classified lines are read from the source only for the clauses without index.
+    """
+
+    def __init__(self, source, start: int, end: int, tags: bytes):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.tags = tags
+        self._texts = None
+
+    def texts(self) -> List[str]:
+        """return the texts of the lines, empty for the lines already evicted"""
+        if self._texts is None:
+            first = max(self.start, self.source.first_seq)
+            self._texts = [""] * (first - self.start) + self.source.texts(first, self.end)
+        return self._texts
+
+    def positions(self, mask: int) -> List[int]:
+        """return the positions (line - start) of the lines of a mask"""
+        return list(compress(range(self.end - self.start), mask.to_bytes(self.end - self.start, "little")))
+
+    def mask(self, positions) -> int:
+        """return the mask of the lines at positions"""
+        mask = bytearray(self.end - self.start)
+        for position in positions:
+            mask[position] = 1
+        return int.from_bytes(mask, "little")
+
+
+class TagClause:
+    """tag compared to a tag name, in the order of LOGGER_TAGS. The untagged lines have no tag"""
+    indexed = True
+
+    def __init__(self, op: str, tag: int):
+        tests = {"=": tag.__eq__, "!=": tag.__ne__, "<": tag.__gt__, "<=": tag.__ge__,
+                 ">": tag.__lt__, ">=": tag.__le__}
+        if op not in tests:
+            raise ValueError("Invalid operator {0} for tag".format(op))
+        test = tests[op]
+        if tag == 0:  # tag = ALL
+            self.table = bytes(1 if op in ("=", "<=", ">=") else 0 for index in range(256))
+        else:
+            self.table = bytes(1 if index and test(index) or not index and op == "!=" else 0 for index in range(256))
+
+    def mask(self, block: QueryBlock, candidates: int) -> int:
+        return candidates & int.from_bytes(block.tags.translate(self.table), "little")
+
+
+class TimeClause:
+    """time of the line from start to end included (times of TimeIndex), None is no bound"""
+    indexed = True
+
+    def __init__(self, start: Optional[float], end: Optional[float]):
+        self.start = start
+        self.end = end
+
+    def mask(self, block: QueryBlock, candidates: int) -> int:
+        first, end = block.source.time_index.range(self.start, self.end)
+        first = min(max(first, block.start), block.end) - block.start
+        end = min(max(end, block.start), block.end) - block.start
+        if first >= end:
+            return 0
+        return candidates & int.from_bytes(bytes(first) + b"\x01" * (end - first), "little")
+
+
+class FieldClause:
+    """
+        A field of the line equal to (=) or containing (~, ignoring case) a value, or the opposite
+        (!=, !~). Fields: src the source file without the line number, func the function name
+        without brackets, text the whole line. A missing field is empty.
+        Candidates are first searched for the value in their joined texts, then their field is checked.
+        See SymbolClause for the src and func fields of the sources with a SymbolIndex.
+    """
+    indexed = False
+
+    def __init__(self, field: str, op: str, value: str):
+        if op not in ("=", "!=", "~", "!~"):
+            raise ValueError("Invalid operator {0} for {1}".format(op, field))
+        self.field = field
+        self.negated = op.startswith("!")
+        self.contains = op.endswith("~")
+        self.value = value.lower() if self.contains else value
+        self.pattern = re.compile(re.escape(value), re.IGNORECASE if self.contains else 0)
+
+    def field_text(self, line) -> str:
+        if self.field == "src":
+            return source_name(line.text, line.info)
+        if self.field == "func":
+            return function_name(line.text, line.info)
+        return line.text
+
+    def test_text(self, text: str) -> bool:
+        return self.value in text.lower() if self.contains else text == self.value
+
+    def test(self, line) -> bool:
+        return line is not None and self.test_text(self.field_text(line))
+
+    def mask(self, block: QueryBlock, candidates: int) -> int:
+        positions = block.positions(candidates)
+        if self.value and "\n" not in self.value:
+            # one pass over the joined texts, most lines are rejected without reading their fields
+            texts = block.texts()
+            line_ends = list(accumulate(len(texts[position]) + 1 for position in positions))
+            found = []
+            joined = "\n".join(texts[position] for position in positions)
+            for match in self.pattern.finditer(joined):
+                index = bisect_right(line_ends, match.start())
+                if not found or found[-1] != positions[index]:
+                    found.append(positions[index])
+            positions = found
+        if self.field != "text" or not self.contains:
+            line_at = block.source.line_at
+            positions = [position for position in positions if self.test(line_at(block.start + position))]
+        matched = block.mask(positions)
+        return candidates & ~matched if self.negated else matched
+
+
+class SymbolClause(FieldClause):
+    """
+        A src or func clause answered by the symbol index: the names of the field are tested
+        once and the lines of the names found are read from their posting lists.
+    """
+    indexed = True
+
+    def mask(self, block: QueryBlock, candidates: int) -> int:
+        symbol_index = getattr(block.source, "symbol_index", None)
+        if symbol_index is None:
+            return super(SymbolClause, self).mask(block, candidates)
+        table = symbol_index.table(self.field)
+        positions = []
+        for symbol, name in enumerate(table.names):
+            if name is not None and self.test_text(name):
+                positions.extend(seq - block.start for seq in table.seqs(symbol, block.start, block.end))
+        matched = candidates & block.mask(positions)
+        return candidates & ~matched if self.negated else matched
+
+
+class AndClause:
+    """lines matching every clause"""
+    indexed = False
+
+    def __init__(self, clauses: list):
+        # the clauses answered by an index first, the others only read the lines they leave
+        self.clauses = sorted(clauses, key=lambda clause: not clause.indexed)
+        self.indexed = all(clause.indexed for clause in clauses)
+
+    def mask(self, block: QueryBlock, candidates: int) -> int:
+        for clause in self.clauses:
+            if not candidates:
+                break
+            candidates = clause.mask(block, candidates)
+        return candidates
+
+
+class OrClause:
+    """lines matching any clause, a line is not evaluated again once matched"""
+    indexed = False
+
+    def __init__(self, clauses: list):
+        self.clauses = sorted(clauses, key=lambda clause: not clause.indexed)
+        self.indexed = all(clause.indexed for clause in clauses)
+
+    def mask(self, block: QueryBlock, candidates: int) -> int:
+        matched = 0
+        for clause in self.clauses:
+            if not candidates:
+                break
+            found = clause.mask(block, candidates)
+            matched |= found
+            candidates &= ~found
+        return matched
+
+
+class NotClause:
+    """lines not matching the clause"""
+
+    def __init__(self, clause):
+        self.clause = clause
+        self.indexed = clause.indexed
+
+    def mask(self, block: QueryBlock, candidates: int) -> int:
+        return candidates & ~self.clause.mask(block, candidates)
+
+
+class Query:
+    """
+        A compiled query, see parse_query: a plan of clauses evaluated on blocks of lines.
+        The tag, time, source and function clauses use the tag and time columns and the symbol
+        index, the text clauses read only the lines left by the other clauses of an and.
+    """
+
+    def __init__(self, text: str, clause):
+        self.text = text
+        self.clause = clause
+
+    def mask(self, block: QueryBlock, candidates: int) -> int:
+        return self.clause.mask(block, candidates)
+
+
+class QueryParser:
+    """
+        Recursive descent parser of the query language:
+            query := and ("or" and)*
+            and   := not (["and"] not)*
+            not   := "not" not | "(" query ")" | clause
+            clause := tag op NAME | time op TIME | time in [TIME]..[TIME] | (src|func|text) op VALUE | VALUE
+        op is = != < <= > >= for tag and time, = != ~ !~ for the other fields.
+        A value alone is searched in the text, ignoring case.
+    """
+
+    def __init__(self, text: str, reference: float = NO_TIME):
+        self.text = text
+        self.reference = reference
+        self.tokens = []  # (kind, value)
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = QUERY_TOKEN_RULE.match(text, position)
+            if match is None or match.end() == position:
+                raise ValueError("Invalid query at {0}".format(text[position:].strip()))
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "string":
+                value = re.sub(r"\\(.)", r"\1", value[1:-1])
+            self.tokens.append((kind, value))
+            position = match.end()
+        self.position = 0
+
+    def peek(self, kind: str = None, value: str = None) -> bool:
+        if self.position >= len(self.tokens):
+            return False
+        token_kind, token_value = self.tokens[self.position]
+        if kind is not None and token_kind != kind:
+            return False
+        return value is None or token_kind == "word" and token_value.lower() == value
+
+    def next(self, kind: str, what: str) -> str:
+        if not self.peek(kind):
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else "the end"
+            raise ValueError("Expected {0} instead of {1}".format(what, found))
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def parse(self) -> Query:
+        if not self.tokens:
+            raise ValueError("Empty query")
+        clause = self.parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError("Unexpected {0}".format(self.tokens[self.position][1]))
+        return Query(self.text, clause)
+
+    def parse_or(self):
+        clauses = [self.parse_and()]
+        while self.peek("word", "or"):
+            self.position += 1
+            clauses.append(self.parse_and())
+        return clauses[0] if len(clauses) == 1 else OrClause(clauses)
+
+    def parse_and(self):
+        clauses = [self.parse_not()]
+        while self.position < len(self.tokens) and not self.peek("close") and not self.peek("word", "or"):
+            if self.peek("word", "and"):
+                self.position += 1
+            clauses.append(self.parse_not())
+        return clauses[0] if len(clauses) == 1 else AndClause(clauses)
+
+    def parse_not(self):
+        if self.peek("word", "not"):
+            self.position += 1
+            return NotClause(self.parse_not())
+        if self.peek("open"):
+            self.position += 1
+            clause = self.parse_or()
+            self.next("close", ")")
+            return clause
+        return self.parse_clause()
+
+    def peek_value(self) -> bool:
+        """return True if the next token is a string or a word other than a keyword"""
+        return self.peek("string") or self.peek("word") and not any(self.peek("word", keyword)
+                                                                      for keyword in QUERY_KEYWORDS)
+
+    def parse_value(self, what: str) -> str:
+        if self.peek_value():
+            self.position += 1
+            return self.tokens[self.position - 1][1]
+        return self.next("string", what)
+
+    def parse_clause(self):
+        position = self.position
+        value = self.parse_value("a clause")
+        field = value.lower()
+        if field not in QUERY_FIELDS or self.tokens[position][0] == "string" \
+                or not (self.peek("op") or field == "time" and self.peek("word", "in")):
+            return FieldClause("text", "~", value)
+        if field == "time":
+            return self.parse_time()
+        op = self.next("op", "an operator")
+        value = self.parse_value("a value")
+        if field == "tag":
+            names = [tag["name"].lower() for tag in LOGGER_TAGS]
+            if value.lower() not in names:
+                raise ValueError("Unknown tag {0}, expected one of {1}".format(
+                    value, ", ".join(tag["name"] for tag in LOGGER_TAGS)))
+            return TagClause(op, names.index(value.lower()))
+        return SymbolClause(field, op, value) if field in SYMBOL_FIELDS else FieldClause(field, op, value)
+
+    def parse_time(self):
+        if self.peek("word", "in"):
+            self.position += 1
+            start = self.time(self.parse_value("a time")) if not self.peek("range") else None
+            self.next("range", "..")
+            end = self.time(self.parse_value("a time")) if self.peek_value() else None
+            return TimeClause(start, end)
+        op = self.next("op", "an operator")
+        timestamp = self.time(self.parse_value("a time"))
+        if op == "=":
+            return TimeClause(timestamp, timestamp)
+        if op in (">=", ">"):
+            return TimeClause(timestamp if op == ">=" else math.nextafter(timestamp, math.inf), None)
+        if op in ("<=", "<"):
+            return TimeClause(None, timestamp if op == "<=" else math.nextafter(timestamp, -math.inf))
+        raise ValueError("Invalid operator {0} for time".format(op))
+
+    def time(self, text: str) -> float:
+        return parse_time_query(text, self.reference)
+
+
+def parse_query(text: str, reference: float = NO_TIME) -> Query:
+    """
+        compile a query, ex: tag>=WARN and src~"display.c" and time in 15:06:20..15:07.
+        A time without a date is on the day of reference, see parse_time_query.
+        Raise ValueError if invalid. See QueryParser for the syntax
+    """
+    return QueryParser(text, reference).parse()
+
+
+class QueryFilter(TagFilter):
+    """
+        Visible lines of a query and of the selected tags, as a TagFilter: the mask grows by
+        QUERY_SCAN_LINES lines per sync(), so the first results are shown before the whole
+        log is evaluated, see is_done(). Lines not evaluated yet are not visible.
+    """
+
+    def __init__(self, source, query: Query, selected: Optional[set]):
+        self.source = source
+        self.query = query
+        super(QueryFilter, self).__init__(source.tag_index, set(range(256)) if selected is None else selected)
+
+    def new_mask(self, start: int) -> bytes:
+        end = min(len(self.tag_index.tags), start + QUERY_SCAN_LINES)
+        tags = self.tag_index.tags[start:end]
+        block = QueryBlock(self.source, self.tag_index.base + start, self.tag_index.base + end, tags)
+        mask = self.query.mask(block, int.from_bytes(tags.translate(self.table), "little"))
+        return mask.to_bytes(end - start, "little")
+
+    def rank(self, seq: int) -> int:
+        return super(QueryFilter, self).rank(min(seq, self.base + len(self.mask)))
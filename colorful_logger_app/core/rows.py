@@ -0,0 +1,111 @@
+from itertools import islice
+from typing import Iterable, Optional, Tuple
+
+from colorful_logger_app import LOGGER_TAGS
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.filters import TagIndex, log_filter_by_tag, log_selected_tags
+from colorful_logger_app.core.query import Query, QueryFilter
+from colorful_logger_app.core.symbols import SymbolIndex
+from colorful_logger_app.core.timeindex import TimeIndex
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+
+class VisibleRows:
+    """
+        Rows of the lines of a LogBuffer or a MappedLog: the lines selected by the tag filter
+        (a QueryFilter when a query is set) and, when set, by the time range. Row 0 is the
+        oldest visible line.
+        Subclasses provide first_seq, next_seq, tag_index, time_index and symbol_index.
+    """
+    tag_index: TagIndex
+    time_index: TimeIndex
+    symbol_index: SymbolIndex
+
+    def __init__(self):
+        self.tag_filter = None  # :type TagFilter None if every line is visible
+        self.tags_selected = [LOGGER_TAGS[0]]
+        self.time_range = None  # (start, end) times of the visible lines, None if every line is visible
+        self.query = None  # :type Query the visible lines match, None if every line is visible
+
+    @property
+    def first_seq(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def next_seq(self) -> int:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        """return the number of visible lines"""
+        if self.time_range is None and self.tag_filter is not None:
+            return len(self.tag_filter)
+        first, end = self.bounds()
+        return self.rank(end) - self.rank(first)
+
+    def bounds(self) -> Tuple[int, int]:
+        """return the [first, end) sequence numbers of the lines in the time range"""
+        if self.time_range is None:
+            return self.first_seq, self.next_seq
+        return self.time_index.range(*self.time_range)
+
+    def rank(self, seq: int) -> int:
+        """return the number of lines of the tag filter before seq, counted from any origin"""
+        return seq if self.tag_filter is None else self.tag_filter.rank(seq)
+
+    def seq(self, row: int) -> int:
+        """return the sequence number of the visible line at row"""
+        if self.time_range is not None:
+            first = self.bounds()[0]
+            if self.tag_filter is None:
+                return first + row
+            row += self.tag_filter.rank(first) - self.tag_filter.removed
+        return self.first_seq + row if self.tag_filter is None else self.tag_filter.seq(row)
+
+    def row(self, seq: int) -> int:
+        """return the row of the line seq, -1 if it is not visible"""
+        first, end = self.bounds()
+        if not first <= seq < end:
+            return -1
+        if self.tag_filter is None:
+            return seq - first
+        if self.time_range is None:
+            return self.tag_filter.row(seq)
+        return self.rank(seq) - self.rank(first) if self.tag_filter.is_visible(seq) else -1
+
+    def visible_seqs(self) -> Iterable[int]:
+        """iterate over the sequence numbers of the visible lines"""
+        first, end = self.bounds()
+        if self.tag_filter is None:
+            return iter(range(first, end))
+        if self.time_range is None:
+            return iter(self.tag_filter)
+        skip = self.tag_filter.rank(first) - self.tag_filter.removed
+        return islice(self.tag_filter, skip, skip + len(self))
+
+    def set_filter(self, tags_selected) -> None:
+        """show only the lines with one of tags_selected and the untagged lines"""
+        self.tags_selected = tags_selected
+        if self.query is None:
+            self.tag_filter = log_filter_by_tag(self.tag_index, tags_selected)
+        else:
+            self.tag_filter = QueryFilter(self, self.query, log_selected_tags(tags_selected))
+
+    def set_query(self, query: Optional[Query]) -> None:
+        """show only the lines matching query too, None for every line. The lines are evaluated
+        a step at a time by tag_filter.sync(), see QueryFilter"""
+        self.query = query
+        self.set_filter(self.tags_selected)
+
+    def set_time_range(self, start: Optional[float], end: Optional[float]) -> None:
+        """show only the lines from start to end included (times of time_index), None is no bound"""
+        self.time_range = None if start is None and end is None else (start, end)
+
+    def find_time(self, timestamp: float) -> int:
+        """return the row of the first visible line at timestamp or after, the number of rows if none"""
+        first, end = self.bounds()
+        return self.rank(min(max(self.time_index.find(timestamp), first), end)) - self.rank(first)
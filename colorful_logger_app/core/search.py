@@ -0,0 +1,128 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Optional, Pattern, Tuple
+
+from colorful_logger_app.constants import *
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+SEARCH_TEXT = 0
+SEARCH_IGNORE_CASE = 1
+SEARCH_REGEX = 2
+SEARCH_MODES = ["Text", "Text (ignore case)", "Regex"]
+
+
+def compile_search(text: str, mode: int = SEARCH_IGNORE_CASE) -> Pattern:
+    """compile the searched text, raise re.error for an invalid regex"""
+    if mode == SEARCH_REGEX:
+        return re.compile(text, re.MULTILINE)
+    return re.compile(re.escape(text), re.IGNORECASE if mode == SEARCH_IGNORE_CASE else 0)
+
+
+class LogSearch:
+    """
+        Matches of a pattern in the visible lines of a LogBuffer or a MappedLog, sorted by
+        (sequence number, start). scan() searches the lines not searched yet, a chunk at a
+        time, so new lines are searched without searching the old ones again.
+        Lines the query of a QueryFilter did not evaluate yet are not searched.
+        Matches of evicted lines are dropped.
+    """
+
+    def __init__(self, source, pattern: Pattern):
+        self.source = source
+        self.pattern = pattern
+        self.seqs = array("Q")
+        self.starts = array("L")
+        self.ends = array("L")
+        self.first = 0  # first live match
+        self.scanned = source.first_seq  # lines before it were searched
+
+    def __len__(self) -> int:
+        return len(self.seqs) - self.first
+
+    def is_done(self) -> bool:
+        """return True when every line received so far was searched, so never before the query is evaluated"""
+        return self.scanned >= self.source.next_seq
+
+    def prune(self) -> None:
+        """drop the matches of the evicted lines"""
+        first = bisect_left(self.seqs, self.source.first_seq, self.first)
+        if first > len(self.seqs) // 2:
+            del self.seqs[:first]
+            del self.starts[:first]
+            del self.ends[:first]
+            first = 0
+        self.first = first
+
+    def scan(self, max_lines: int = SEARCH_SCAN_LINES) -> int:
+        """search the next max_lines lines, return the number of new matches"""
+        self.prune()
+        start = max(self.scanned, self.source.first_seq)
+        end = min(self.source.next_seq, start + max_lines)
+        tag_filter = self.source.tag_filter
+        if tag_filter is not None:  # the visibility of the lines after the mask is not known yet
+            end = max(start, min(end, tag_filter.base + len(tag_filter.mask)))
+        self.scanned = end
+        texts = self.source.texts(start, end)
+        if not texts:
+            return 0
+        # one pass over the joined lines, positions are mapped back to lines only on a match
+        joined = "\n".join(texts)
+        found = 0
+        line_ends = None
+        for match in self.pattern.finditer(joined):
+            if match.start() == match.end() or "\n" in match.group():
+                continue
+            if line_ends is None:
+                line_ends = list(accumulate(len(text) + 1 for text in texts))
+            line = bisect_right(line_ends, match.start())
+            seq = start + line
+            if self.source.row(seq) < 0:  # hidden by the tag filter
+                continue
+            line_start = line_ends[line - 1] if line else 0
+            self.seqs.append(seq)
+            self.starts.append(match.start() - line_start)
+            self.ends.append(match.end() - line_start)
+            found += 1
+        return found
+
+    def scan_all(self) -> None:
+        tag_filter = self.source.tag_filter
+        while not self.is_done():
+            if tag_filter is not None and not tag_filter.is_done():
+                tag_filter.sync()
+            self.scan()
+
+    def match(self, index: int) -> Tuple[int, int, int]:
+        """return the (sequence number, start, end) of a match"""
+        return self.seqs[index], self.starts[index], self.ends[index]
+
+    def position(self, index: int) -> int:
+        """return the position (0 is the first match) of a match index"""
+        return index - self.first
+
+    def next(self, seq: int, start: int = -1) -> Optional[int]:
+        """return the index of the first match after (seq, start), wrapping around.
+        start -1 includes the matches of the line seq"""
+        if not len(self):
+            return None
+        index = bisect_left(self.seqs, seq, self.first)
+        while index < len(self.seqs) and self.seqs[index] == seq and self.starts[index] <= start:
+            index += 1
+        return index if index < len(self.seqs) else self.first
+
+    def previous(self, seq: int, start: int = -1) -> Optional[int]:
+        """return the index of the last match before (seq, start), wrapping around.
+        start -1 excludes the matches of the line seq"""
+        if not len(self):
+            return None
+        index = bisect_right(self.seqs, seq, self.first) - 1
+        while index >= self.first and self.seqs[index] == seq and self.starts[index] >= start:
+            index -= 1
+        return index if index >= self.first else len(self.seqs) - 1
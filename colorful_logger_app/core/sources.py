@@ -0,0 +1,352 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from typing import BinaryIO, Callable, List
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.loader import LineSplitter
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+logger = logging.getLogger(__name__)
+
+# sink(source id, lines, receive time of each line)
+Sink = Callable[[int, List[str], List[float]], None]
+# emit(lines) passes the complete lines read by a source
+Emit = Callable[[List[str]], None]
+
+
+async def read_stream(reader: asyncio.StreamReader, emit: Emit) -> None:
+    """read a stream until its end and emit its lines"""
+    splitter = LineSplitter()
+    try:
+        while True:
+            data = await reader.read(SOURCE_READ_SIZE)
+            if not data:
+                break
+            lines = splitter.split(data)
+            if lines:
+                emit(lines)
+    finally:
+        lines = splitter.flush()
+        if lines:
+            emit(lines)
+
+
+class LogSource:
+    """
+        A source of log lines read by a SourceLoop. run() reads until the end of
+        the source or until it is cancelled and emits the complete lines.
+        started is set once the source is ready to receive (listening sockets, ...).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = threading.Event()
+
+    async def run(self, emit: Emit) -> None:
+        raise NotImplementedError
+
+
+class SerialSource(LogSource):
+    """Read an open pyserial port without blocking: the loop waits for the port to be
+    readable, or polls it every SOURCE_POLL_INTERVAL_MS where ports have no file descriptor"""
+
+    def __init__(self, serial_handler):
+        super(SerialSource, self).__init__(serial_handler.port)
+        self.serial_handler = serial_handler
+
+    async def run(self, emit: Emit) -> None:
+        handler = self.serial_handler
+        handler.timeout = 0
+        splitter = LineSplitter()
+        try:
+            fd = handler.fileno()
+        except (AttributeError, OSError):
+            fd = None
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        if fd is not None:
+            loop.add_reader(fd, readable.set)
+        self.started.set()
+        try:
+            while handler.isOpen():
+                if fd is not None:
+                    await readable.wait()
+                    readable.clear()
+                data = handler.read(handler.in_waiting or 1)
+                if data:
+                    lines = splitter.split(data)
+                    if lines:
+                        emit(lines)
+                elif fd is None:
+                    await asyncio.sleep(SOURCE_POLL_INTERVAL_MS / 1000)
+        except OSError as e:  # SerialException, the device was removed
+            logger.warning("{0} : {1}".format(self.name, e))
+        finally:
+            if fd is not None:
+                loop.remove_reader(fd)
+            lines = splitter.flush()
+            if lines:
+                emit(lines)
+
+
+class TcpClientSource(LogSource):
+    """Read the lines sent by a TCP server (ser2net, ...), reconnecting when the connection is lost"""
+
+    def __init__(self, host: str, port: int, reconnect_delay_ms: int = SOURCE_RECONNECT_DELAY_MS):
+        super(TcpClientSource, self).__init__("tcp://{0}:{1}".format(host, port))
+        self.host = host
+        self.port = port
+        self.reconnect_delay_ms = reconnect_delay_ms
+
+    async def run(self, emit: Emit) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                logger.warning("{0} : {1}".format(self.name, e))
+            else:
+                self.started.set()
+                try:
+                    await read_stream(reader, emit)
+                except OSError as e:
+                    logger.warning("{0} : {1}".format(self.name, e))
+                finally:
+                    writer.close()
+            await asyncio.sleep(self.reconnect_delay_ms / 1000)
+
+
+class TcpServerSource(LogSource):
+    """Accept TCP connections and read the lines of every client, port 0 picks a free port"""
+
+    def __init__(self, host: str, port: int):
+        super(TcpServerSource, self).__init__("tcp-listen://{0}:{1}".format(host, port))
+        self.host = host
+        self.port = port
+        self.writers = set()
+
+    async def run(self, emit: Emit) -> None:
+        async def read_client(reader, writer):
+            self.writers.add(writer)
+            try:
+                await read_stream(reader, emit)
+            except OSError as e:
+                logger.warning("{0} : {1}".format(self.name, e))
+            finally:
+                self.writers.discard(writer)
+                writer.close()
+
+        server = await asyncio.start_server(read_client, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.started.set()
+        try:
+            await server.serve_forever()
+        finally:
+            server.close()
+            for writer in list(self.writers):
+                writer.close()
+
+
+class UdpSyslogSource(LogSource):
+    """Receive syslog messages (or any text) over UDP, each datagram holds one or more lines.
+    Port 0 picks a free port"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = SYSLOG_PORT):
+        super(UdpSyslogSource, self).__init__("udp://{0}:{1}".format(host, port))
+        self.host = host
+        self.port = port
+
+    async def run(self, emit: Emit) -> None:
+        class Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, address):
+                emit(data.decode(errors="replace").rstrip("\r\n").split("\n"))
+
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(Protocol, local_addr=(self.host, self.port))
+        self.port = transport.get_extra_info("sockname")[1]
+        self.started.set()
+        try:
+            await loop.create_future()  # until cancelled
+        finally:
+            transport.close()
+
+
+class FileTailSource(LogSource):
+    """
+        Follow the lines appended to a file (tail -f). The file is checked every
+        SOURCE_POLL_INTERVAL_MS, a rotated file is read to its end and the new file is
+        read from its start, a truncated file is read again from its start.
+    """
+
+    def __init__(self, path: str, from_end: bool = True, poll_interval_ms: int = SOURCE_POLL_INTERVAL_MS):
+        super(FileTailSource, self).__init__(path)
+        self.path = path
+        self.from_end = from_end
+        self.poll_interval_ms = poll_interval_ms
+
+    async def run(self, emit: Emit) -> None:
+        file = None
+        splitter = LineSplitter()
+        first = True
+        try:
+            while True:
+                try:
+                    stat = os.stat(self.path)
+                except OSError:
+                    stat = None
+                if stat is not None and (file is None or os.fstat(file.fileno()).st_ino != stat.st_ino):
+                    if file is not None:  # rotated: end of the old file, then the new one
+                        self._read(file, splitter, emit)
+                        emit(splitter.flush())
+                        file.close()
+                    file = open(self.path, "rb")
+                    splitter = LineSplitter()
+                    if first and self.from_end:
+                        file.seek(0, 2)
+                    first = False
+                elif stat is not None and stat.st_size < file.tell():  # truncated
+                    emit(splitter.flush())
+                    file.seek(0)
+                    splitter = LineSplitter()
+                self.started.set()
+                if file is not None:
+                    self._read(file, splitter, emit)
+                await asyncio.sleep(self.poll_interval_ms / 1000)
+        finally:
+            if file is not None:
+                file.close()
+
+    @staticmethod
+    def _read(file: BinaryIO, splitter: LineSplitter, emit: Emit) -> None:
+        while True:
+            data = file.read(LOAD_CHUNK_SIZE)
+            if not data:
+                return
+            lines = splitter.split(data)
+            if lines:
+                emit(lines)
+
+
+class PipeSource(LogSource):
+    """Read the lines of a pipe, ex: the standard input of a command"""
+
+    def __init__(self, pipe: BinaryIO, name: str = "pipe"):
+        super(PipeSource, self).__init__(name)
+        self.pipe = pipe
+
+    async def run(self, emit: Emit) -> None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), self.pipe)
+        self.started.set()
+        try:
+            await read_stream(reader, emit)
+        finally:
+            transport.close()
+
+
+def stdin_source() -> PipeSource:
+    """return a source reading the standard input"""
+    return PipeSource(sys.stdin.buffer, "stdin")
+
+
+class SourceLoop:
+    """
+        Read LogSources on one asyncio event loop running in a background thread.
+        The lines of every source are batched: sink(source id, lines, timestamps) is called
+        from the loop thread every batch_interval_ms, or as soon as batch_max_lines lines
+        of a source are pending. add() and remove() can be called from any thread.
+    """
+
+    def __init__(self, sink: Sink, batch_interval_ms: int = SERIAL_BATCH_INTERVAL_MS,
+                 batch_max_lines: int = SERIAL_BATCH_MAX_LINES):
+        self.sink = sink
+        self.batch_interval_ms = batch_interval_ms
+        self.batch_max_lines = batch_max_lines
+        self.loop = None  # :type asyncio.AbstractEventLoop
+        self.thread = None  # :type threading.Thread
+        self.sources = {}  # source id: LogSource
+        self._tasks = {}  # source id: asyncio.Task, used on the loop thread only
+        self._pending = {}  # source id: (lines, timestamps)
+        self._flush_handle = None
+
+    def start(self) -> None:
+        if self.thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="SourceLoop", daemon=True)
+        self.thread.start()
+
+    def add(self, source_id: int, source: LogSource) -> None:
+        """start reading a source, its lines are sent with source_id"""
+        self.start()
+        self.sources[source_id] = source
+        self.loop.call_soon_threadsafe(self._start_source, source_id, source)
+
+    def remove(self, source_id: int) -> None:
+        """stop reading a source, the lines already read are sent"""
+        if self.sources.pop(source_id, None) is not None:
+            self.loop.call_soon_threadsafe(self._stop_source, source_id)
+
+    def stop(self) -> None:
+        """stop every source and the loop thread"""
+        if self.thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._stop_all(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.sources.clear()
+        self.thread = self.loop = None
+
+    def _start_source(self, source_id: int, source: LogSource) -> None:
+        self._tasks[source_id] = self.loop.create_task(self._read(source_id, source))
+
+    def _stop_source(self, source_id: int) -> None:
+        task = self._tasks.get(source_id)
+        if task is not None:
+            task.cancel()
+
+    async def _stop_all(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _read(self, source_id: int, source: LogSource) -> None:
+        try:
+            await source.run(lambda lines: self._queue(source_id, lines))
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Source {0} failed".format(source.name))
+        finally:
+            del self._tasks[source_id]
+            self._flush()
+
+    def _queue(self, source_id: int, lines: List[str]) -> None:
+        if not lines:
+            return
+        pending_lines, timestamps = self._pending.setdefault(source_id, ([], []))
+        pending_lines += lines
+        timestamps += [time.time()] * len(lines)
+        if len(pending_lines) >= self.batch_max_lines:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.batch_interval_ms / 1000, self._flush)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for source_id, (lines, timestamps) in pending.items():
+            self.sink(source_id, lines, timestamps)
@@ -0,0 +1,140 @@
+import time
+from itertools import repeat
+from typing import Iterable, Iterator, List, Optional
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.classifier import LineInfo
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+
+class LogLine:
+    """A stored log line: the text, the index of its tag in LOGGER_TAGS, the receive time,
+    the id of the source it was received from (0 for local lines) and the fields found by the classifier"""
+    __slots__ = ("text", "tag", "timestamp", "source", "info")
+
+    def __init__(self, text: str, info: LineInfo = None, timestamp: float = 0.0, source: int = 0):
+        self.text = text
+        self.info = info
+        self.tag = info.tag if info is not None else 0
+        self.timestamp = timestamp
+        self.source = source
+
+
+class ChunkLine(LogLine):
+    """A stored line of a ParsedChunk, its LineInfo is built from the columns of the chunk when first read"""
+    __slots__ = ("chunk", "index")
+
+    def __init__(self, text: str, chunk, index: int, timestamp: float = 0.0, source: int = 0):
+        self.text = text
+        self.tag = chunk.tags[index]
+        self.timestamp = timestamp
+        self.source = source
+        self.chunk = chunk
+        self.index = index
+
+    def __getattr__(self, name: str):
+        # called while the info slot is not set
+        if name != "info":
+            raise AttributeError(name)
+        self.info = self.chunk.info(self.index)
+        self.chunk = None
+        return self.info
+
+
+class LogStore:
+    """
+        Bounded ring buffer of log lines.
+        Every line receives a sequence number that never changes, so indexes built
+        over the store stay valid after the oldest lines are evicted.
+        Lines are evicted when max_lines is reached or when the text of the
+        stored lines exceeds max_bytes.
+    """
+
+    def __init__(self, max_lines: int = LOG_STORE_MAX_LINES, max_bytes: int = LOG_STORE_MAX_BYTES):
+        if max_lines < 1:
+            raise ValueError("max_lines must be at least 1")
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self._slots = [None] * max_lines
+        self.first_seq = 0  # sequence number of the oldest stored line
+        self.next_seq = 0  # sequence number of the next appended line
+        self.n_bytes = 0
+        self.n_evicted = 0
+
+    def __len__(self) -> int:
+        return self.next_seq - self.first_seq
+
+    def __getitem__(self, row: int) -> LogLine:
+        """return the line at row (0 is the oldest stored line)"""
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("row out of range")
+        return self._slots[(self.first_seq + row) % self.max_lines]
+
+    def __iter__(self) -> Iterator[LogLine]:
+        for seq in range(self.first_seq, self.next_seq):
+            yield self._slots[seq % self.max_lines]
+
+    def line(self, seq: int) -> Optional[LogLine]:
+        """return the line with the sequence number seq, None if evicted or not yet stored"""
+        if self.first_seq <= seq < self.next_seq:
+            return self._slots[seq % self.max_lines]
+        return None
+
+    def texts(self, start_seq: int, end_seq: int) -> List[str]:
+        """return the text of the stored lines in [start_seq, end_seq)"""
+        start_seq = max(start_seq, self.first_seq)
+        end_seq = min(end_seq, self.next_seq)
+        if start_seq >= end_seq:
+            return []
+        start = start_seq % self.max_lines
+        end = start + end_seq - start_seq
+        if end <= self.max_lines:
+            lines = self._slots[start:end]
+        else:
+            lines = self._slots[start:] + self._slots[:end - self.max_lines]
+        return [line.text for line in lines]
+
+    def append(self, text: str, info: LineInfo = None, timestamp: float = None, source: int = 0) -> int:
+        """append a line and return its sequence number"""
+        return self.append_line(LogLine(text, info, time.time() if timestamp is None else timestamp, source))
+
+    def append_line(self, line: LogLine) -> int:
+        """append a LogLine and return its sequence number"""
+        if len(self) == self.max_lines:
+            self._evict_oldest()
+        seq = self.next_seq
+        self._slots[seq % self.max_lines] = line
+        self.next_seq += 1
+        self.n_bytes += len(line.text)
+        while self.n_bytes > self.max_bytes and len(self) > 1:
+            self._evict_oldest()
+        return seq
+
+    def extend(self, lines: Iterable[tuple], timestamps: Iterable[float] = None,
+               sources: Iterable[int] = None) -> None:
+        """append (text, LineInfo) pairs. timestamps and sources are given per line,
+        by default all the lines get the current time and the source 0"""
+        timestamps = repeat(time.time()) if timestamps is None else timestamps
+        sources = repeat(0) if sources is None else sources
+        for (text, info), timestamp, source in zip(lines, timestamps, sources):
+            self.append(text, info, timestamp, source)
+
+    def clear(self) -> None:
+        """remove all the lines, the sequence numbers keep growing"""
+        self._slots = [None] * self.max_lines
+        self.first_seq = self.next_seq
+        self.n_bytes = 0
+
+    def _evict_oldest(self) -> None:
+        slot = self.first_seq % self.max_lines
+        self.n_bytes -= len(self._slots[slot].text)
+        self._slots[slot] = None
+        self.first_seq += 1
+        self.n_evicted += 1
@@ -0,0 +1,160 @@
+from array import array
+from bisect import bisect_left
+from itertools import count
+from typing import Iterable, List, Tuple
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.filters import INDEX_BLOCK_SIZE
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+SYMBOL_FIELDS = ["src", "func"]
+
+
+def source_name(text: str, info) -> str:
+    """return the source file of a classified line without the line number, empty if none"""
+    return text[info.source_start:info.source_end].rpartition(":")[0] if info.source_start >= 0 else ""
+
+
+def function_name(text: str, info) -> str:
+    """return the function of a classified line without the brackets, empty if none"""
+    return text[info.function_start + 1:info.function_end - 1] if info.function_start >= 0 else ""
+
+
+class SymbolTable:
+    """
+        Interned names of a field (source files or functions) of the stored lines: the id of
+        the name of each line in a column (0 is the empty name, the lines without the field)
+        and the posting list of each name, the sequence numbers of its lines in order. The
+        empty name has no posting list, its lines are read from the column.
+        Position i of the column holds the line with sequence number base + i, like TagIndex.
+        The names without live lines are forgotten by prune(), their ids are reused.
+    """
+
+    def __init__(self, first_seq: int = 0):
+        self.names = [""]  # None for a forgotten name
+        self.ids = {"": 0}
+        self.postings = [array("Q")]
+        self.free = []  # ids of the forgotten names
+        self.base = first_seq - first_seq % INDEX_BLOCK_SIZE
+        self.column = array("I", bytes(4 * (first_seq - self.base)))
+        self.first_seq = first_seq
+
+    def intern(self, name: str) -> int:
+        """return the id of name, added if new"""
+        symbol = self.ids.get(name)
+        if symbol is None:
+            if self.free:
+                symbol = self.free.pop()
+                self.names[symbol] = name
+            else:
+                symbol = len(self.names)
+                self.names.append(name)
+                self.postings.append(array("Q"))
+            self.ids[name] = symbol
+        return symbol
+
+    @property
+    def next_seq(self) -> int:
+        return self.base + len(self.column)
+
+    def extend(self, symbols: Iterable[int]) -> None:
+        """index the ids of the names of new lines"""
+        symbols = array("I", symbols)
+        postings = self.postings
+        for seq, symbol in zip(count(self.next_seq), symbols):
+            if symbol:
+                postings[symbol].append(seq)
+        self.column.extend(symbols)
+
+    def symbol(self, seq: int) -> int:
+        return self.column[seq - self.base]
+
+    def seqs(self, symbol: int, start_seq: int, end_seq: int) -> array:
+        """return the sequence numbers in [start_seq, end_seq) of the lines of a name"""
+        if not symbol:
+            start_seq, end_seq = max(start_seq, self.base), min(end_seq, self.next_seq)
+            column = self.column
+            return array("Q", (seq for seq in range(start_seq, end_seq) if not column[seq - self.base]))
+        posting = self.postings[symbol]
+        return posting[bisect_left(posting, start_seq):bisect_left(posting, end_seq)]
+
+    def count(self, symbol: int) -> int:
+        """return the number of live lines of a name"""
+        if not symbol:
+            return self.column[self.first_seq - self.base:].tolist().count(0)
+        posting = self.postings[symbol]
+        return len(posting) - bisect_left(posting, self.first_seq)
+
+    def counts(self) -> List[Tuple[str, int]]:
+        """return the (name, number of live lines) of the names with live lines, the empty name aside"""
+        return [(name, lines) for name, lines in ((name, self.count(symbol))
+                                                   for symbol, name in enumerate(self.names) if symbol) if lines]
+
+    def prune(self, first_seq: int) -> None:
+        """forget the lines evicted from the store (seq < first_seq), whole blocks at a time.
+        A posting list drops its evicted lines once they are half of it, a name is forgotten
+        with its last line"""
+        self.first_seq = first_seq
+        dead = (first_seq - self.base) // INDEX_BLOCK_SIZE * INDEX_BLOCK_SIZE
+        if not dead:
+            return
+        del self.column[:dead]
+        self.base += dead
+        for symbol, posting in enumerate(self.postings):
+            if posting and posting[0] < first_seq:
+                evicted = bisect_left(posting, first_seq)
+                if evicted == len(posting):
+                    del self.ids[self.names[symbol]]
+                    self.names[symbol] = None
+                    self.free.append(symbol)
+                if evicted > len(posting) // 2:
+                    del posting[:evicted]
+
+    def clear(self, first_seq: int) -> None:
+        self.__init__(first_seq)
+
+
+class SymbolIndex:
+    """
+        Source file and function symbols of the stored lines, see SymbolTable: the names
+        repeated by millions of lines are stored once and the lines of a name are found
+        from its posting list, without reading the lines.
+    """
+
+    def __init__(self, first_seq: int = 0):
+        self.sources = SymbolTable(first_seq)
+        self.functions = SymbolTable(first_seq)
+
+    def table(self, field: str) -> SymbolTable:
+        """return the table of a field of SYMBOL_FIELDS"""
+        return self.sources if field == "src" else self.functions
+
+    def extend(self, lines: List[tuple]) -> None:
+        """index (text, LineInfo) pairs"""
+        intern = self.sources.intern
+        self.sources.extend([intern(source_name(text, info)) for text, info in lines])
+        intern = self.functions.intern
+        self.functions.extend([intern(function_name(text, info)) for text, info in lines])
+
+    def extend_chunk(self, chunk) -> None:
+        """index the lines of a ParsedChunk, its symbol ids are local to the chunk"""
+        symbols = [self.sources.intern(name) for name in chunk.source_names]
+        self.sources.extend(symbols[symbol] for symbol in chunk.sources)
+        symbols = [self.functions.intern(name) for name in chunk.function_names]
+        self.functions.extend(symbols[symbol] for symbol in chunk.functions)
+
+    @property
+    def next_seq(self) -> int:
+        return self.sources.next_seq
+
+    def prune(self, first_seq: int) -> None:
+        self.sources.prune(first_seq)
+        self.functions.prune(first_seq)
+
+    def clear(self, first_seq: int) -> None:
+        self.__init__(first_seq)
@@ -0,0 +1,155 @@
+import calendar
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from colorful_logger_app.constants import *
+from colorful_logger_app.core.filters import INDEX_BLOCK_SIZE
+
+__author__ = APP_AUTHOR
+__license__ = APP_LICENCE
+__version__ = APP_VERSION
+__email__ = APP_AUTHOR_EMAIL
+__status__ = APP_STATUS
+
+# time of the lines before the first timestamp
+NO_TIME = float("-inf")
+# parsed time of a line without a timestamp, see TimeIndex.extend_times
+NOT_PARSED = float("nan")
+DAY_SECONDS = 86400
+# a time without a date this much earlier in the day than the line before it is on the next day
+DAY_ROLLOVER_SECONDS = DAY_SECONDS // 2
+# time typed by the user: [YYYY/MM/DD ]HH:MM[:SS], the date separator can be / - or :
+TIME_QUERY_RULE = re.compile(r"\s*(?:([0-9]{4})[-/:]([0-9]{1,2})[-/:]([0-9]{1,2})\s+)?"
+                             r"([0-9]{1,2}):([0-9]{2})(?::([0-9]{2}))?\s*$")
+
+
+class TimeIndex:
+    """
+        Time column of the stored lines: the time of the timestamp of each line, see
+        LogClassifier.parse_time, in an array of doubles. A line without a timestamp gets
+        the time of the line before it, and so does a line older than the lines before it:
+        the column is sorted and a time is found by bisection.
+        Position i holds the line with sequence number base + i, like TagIndex.
+    """
+
+    def __init__(self, first_seq: int = 0):
+        self.base = first_seq - first_seq % INDEX_BLOCK_SIZE
+        self.times = array("d", bytes(8 * (first_seq - self.base)))
+        self.first_seq = first_seq
+        self.last = NO_TIME  # time of the last indexed line
+
+    def extend(self, lines: Iterable[tuple], timestamps: Iterable[float],
+               parse_time: Callable[[str, object, float], Optional[float]]) -> None:
+        """index (text, LineInfo) pairs received at timestamps, their time is read by parse_time"""
+        self.extend_times(parse_times(lines, parse_time), timestamps)
+
+    def extend_times(self, times: Iterable[float], timestamps: Iterable[float]) -> None:
+        """
+            index the parsed times of lines received at timestamps, see parse_times.
+            A time without a date is on the day of the line before it, or on the next day
+            when it is DAY_ROLLOVER_SECONDS earlier (past midnight), or on the day the line
+            was received.
+        """
+        last = self.last
+        append = self.times.append
+        for parsed, received in zip(times, timestamps):
+            if parsed == parsed:  # not NOT_PARSED
+                if parsed < DAY_SECONDS:
+                    if last == NO_TIME:
+                        parsed += local_day(received)
+                    else:
+                        midnight = last - last % DAY_SECONDS
+                        if parsed < last - midnight - DAY_ROLLOVER_SECONDS:
+                            midnight += DAY_SECONDS
+                        parsed += midnight
+                if parsed > last:
+                    last = parsed
+            append(last)
+        self.last = last
+
+    @property
+    def next_seq(self) -> int:
+        return self.base + len(self.times)
+
+    def time(self, seq: int) -> float:
+        return self.times[seq - self.base]
+
+    def find(self, timestamp: float) -> int:
+        """return the sequence number of the first line at timestamp or after, next_seq if none"""
+        return self.base + bisect_left(self.times, timestamp, self.first_seq - self.base)
+
+    def range(self, start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+        """return the [first, end) sequence numbers of the lines from start to end included,
+        None is no bound"""
+        first = self.find(start) if start is not None else self.first_seq
+        if end is None:
+            return first, self.next_seq
+        return first, max(first, self.base + bisect_right(self.times, end, self.first_seq - self.base))
+
+    def prune(self, first_seq: int) -> None:
+        """forget the lines evicted from the store (seq < first_seq), whole blocks at a time"""
+        self.first_seq = first_seq
+        dead = (first_seq - self.base) // INDEX_BLOCK_SIZE * INDEX_BLOCK_SIZE
+        if dead:
+            del self.times[:dead]
+            self.base += dead
+
+    def clear(self, first_seq: int) -> None:
+        self.__init__(first_seq)
+
+
+def parse_times(lines: Iterable[tuple], parse_time: Callable[[str, object, float], Optional[float]]) \
+        -> Iterator[float]:
+    """
+        yield the time of each (text, LineInfo) pair read by parse_time on day 0: a time without
+        a date is the time of the day, NOT_PARSED without a timestamp. The consecutive lines
+        with the same timestamp are parsed once.
+    """
+    parsed_key = parsed = None
+    for text, info in lines:
+        if info.timestamp_start < 0:
+            yield NOT_PARSED
+            continue
+        key = (text[info.timestamp_start:info.timestamp_end], info.timestamp_rule)
+        if key != parsed_key:
+            parsed_key, parsed = key, parse_time(text, info, 0.0)
+            if parsed is None:
+                parsed = NOT_PARSED
+        yield parsed
+
+
+def local_day(timestamp: float) -> float:
+    """return the midnight of the local date of a receive time, in the time of TimeIndex"""
+    return calendar.timegm(time.localtime(timestamp)[:3] + (0, 0, 0))
+
+
+def parse_time_query(text: str, reference: float = NO_TIME) -> float:
+    """
+        return the time of a [YYYY/MM/DD ]HH:MM[:SS] text, a time without a date is on the
+        day of reference (the time of a line, today if NO_TIME). Raise ValueError if invalid.
+    """
+    match = TIME_QUERY_RULE.match(text)
+    if match is None:
+        raise ValueError("Invalid time {0}, expected [YYYY/MM/DD ]HH:MM[:SS]".format(text.strip()))
+    year, month, day, hour, minute, second = (int(value) if value else 0 for value in match.groups())
+    if hour > 23 or minute > 59 or second > 59:
+        raise ValueError("Invalid time {0}".format(text.strip()))
+    if match.group(1):
+        if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+            raise ValueError("Invalid date {0}".format(text.strip()))
+        midnight = calendar.timegm((year, month, day, 0, 0, 0))
+    elif reference != NO_TIME:
+        midnight = reference - reference % DAY_SECONDS
+    else:
+        midnight = local_day(time.time())
+    return midnight + hour * 3600 + minute * 60 + second
+
+
+def format_time(timestamp: float) -> str:
+    """return a time of TimeIndex as YYYY/MM/DD HH:MM:SS"""
+    if timestamp == NO_TIME:
+        return ""
+    return time.strftime("%Y/%m/%d %H:%M:%S", time.gmtime(timestamp))
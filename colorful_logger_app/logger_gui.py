@@ -4,18 +4,29 @@ Created on 2 de mar de 2020
 @author: AndersonMacedo
 '''
 import logging
-
-import serial
-import serial.tools.list_ports_windows
-from PyQt5.Qt import QRect, QThread, pyqtSlot, QStandardItem, QColor, QTextDocument, QRegularExpression, QTextCursor
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QSyntaxHighlighter, QTextCharFormat, QBrush, QFont, QFocusEvent
-from PyQt5.QtWidgets import *
-from serial.serialutil import SerialException
-
-from colorful_logger_app import LOGGER_TAGS, find_tag_by_name, LOGGER_TIMESTAMPS
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from itertools import repeat
+
+from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot, QAbstractListModel, QModelIndex, QPointF, QRect, QRectF, QSize, \
+    QThread, QTimer, QElapsedTimer
+from PyQt5.QtGui import QTextCharFormat, QBrush, QColor, QFont, QStandardItem, QTextLayout, QTextOption, QPalette, \
+    QKeySequence
+from PyQt5.QtWidgets import QAbstractItemView, QAction, QActionGroup, QApplication, QCheckBox, QComboBox, QDialog, \
+    QDockWidget, QFileDialog, QFormLayout, QHBoxLayout, QInputDialog, QLabel, QLineEdit, QListView, QMainWindow, \
+    QMenu, QMessageBox, QPlainTextEdit, QProgressDialog, QPushButton, QSpinBox, QStyle, QStyleOptionViewItem, \
+    QStyledItemDelegate, QTabWidget, QTableWidget, QTableWidgetItem, QToolButton, QTreeWidget, QTreeWidgetItem, \
+    QVBoxLayout, QWidget
+
+from colorful_logger_app import LOGGER_TAGS, find_tag_by_name, LOGGER_TIMESTAMPS, DEFAULT_COLORS
 from colorful_logger_app.constants import *
-from colorful_logger_app.log_process import log_filter_by_tag, log_mark_block
+from colorful_logger_app.core import LogBuffer, LogStore, LineInfo, log_classify, default_classifier, merge_by_time, \
+    repeat_label
+from colorful_logger_app.core.metrics import metrics, timed, format_metric, format_duration
+from colorful_logger_app.core.classifier import HEX_DUMP_RULE
 
 __author__ = APP_AUTHOR
 __license__ = APP_LICENCE
@@ -25,32 +36,212 @@ __status__ = APP_STATUS
 
 logger = logging.getLogger(__name__)
 
-LOG_HEADER_SIZE = 35
+serial_bytes = metrics.counter("serial.bytes")
+serial_lines = metrics.counter("serial.lines")
 
 
 class SerialListenerWorker(QThread):
-    """Listen the serial connection and send the data to the main window"""
+    """Listen the serial connection and send the data to the main window
+
+    The port is read with a timeout of batch_interval_ms, so the thread sleeps in
+    the OS while nothing is received. The bytes are decoded incrementally (invalid
+    UTF-8 is replaced) and split in lines. In batch mode (default) the lines are
+    sent through batch_signal, with the source id and the receive time of each
+    line, every batch_interval_ms or as soon as batch_max_lines are pending.
+    Otherwise each line is sent through signal as it arrives.
+    When line_queue is set the batches are put in it instead, see LineQueue.
+    When journal is set every chunk read is recorded, see JournalWriter.
+    stop() ends the thread cooperatively.
+    The bytes and lines read are counted in metrics when enabled.
+    """
     signal = pyqtSignal(str)
+    batch_signal = pyqtSignal(int, list, list)
 
-    def __init__(self):
+    def __init__(self, batch_mode=True, batch_interval_ms=SERIAL_BATCH_INTERVAL_MS,
+                 batch_max_lines=SERIAL_BATCH_MAX_LINES, source=0):
         QThread.__init__(self)
         self.serial_handler = None
+        self.source = source
+        self.journal = None  # :type JournalWriter
+        self.line_queue = None  # :type LineQueue
+        self.batch_mode = batch_mode
+        self.batch_interval_ms = batch_interval_ms
+        self.batch_max_lines = batch_max_lines
+        self.stop_event = threading.Event()
+        # throughput, see lines_per_second
+        self.n_lines = 0
+        self.n_bytes = 0
+        self.start_time = None
+        self.stop_time = None
+
+    def stop(self):
+        """ask the thread to stop, it returns within batch_interval_ms"""
+        self.stop_event.set()
+
+    def lines_per_second(self) -> float:
+        """return the number of lines received per second since the start"""
+        if self.start_time is None:
+            return 0.0
+        elapsed = (self.stop_time or time.monotonic()) - self.start_time
+        return self.n_lines / elapsed if elapsed > 0 else 0.0
+
+    def run(self):
+        from colorful_logger_app.core import LineSplitter
+        from serial.serialutil import SerialException  # pyserial is imported when a port is used
+        interval = self.batch_interval_ms / 1000
+        # never block longer than one interval, so pending lines are flushed and stop() is seen on time
+        self.serial_handler.timeout = interval
+        splitter = LineSplitter()
+        lines = []
+        timestamps = []
+        self.start_time = time.monotonic()
+        self.stop_time = None
+        deadline = self.start_time + interval
+        try:
+            while not self.stop_event.is_set() and self.serial_handler.isOpen():
+                try:
+                    chunk = self.serial_handler.read(self.serial_handler.in_waiting or 1)
+                except SerialException as e:  # device removed or port closed
+                    logger.warning("{0} : {1}".format(self.serial_handler.port, e))
+                    break
+                if chunk:
+                    received = time.time()
+                    journal = self.journal
+                    if journal is not None:
+                        journal.write(self.source, chunk)
+                    complete = splitter.split(chunk)
+                    self.n_bytes += len(chunk)
+                    self.n_lines += len(complete)
+                    if metrics.enabled:
+                        serial_bytes.add(len(chunk))
+                        serial_lines.add(len(complete))
+                    if self.batch_mode:
+                        lines += complete
+                        timestamps += [received] * len(complete)
+                    else:
+                        for line in complete:
+                            self.signal.emit(line)
+                now = time.monotonic()
+                if len(lines) >= self.batch_max_lines or (lines and now >= deadline):
+                    self.send_batch(lines, timestamps)
+                    lines = []
+                    timestamps = []
+                if now >= deadline:
+                    deadline = now + interval
+        finally:
+            complete = splitter.flush()
+            self.n_lines += len(complete)
+            if self.batch_mode:
+                lines += complete
+                if lines:
+                    self.send_batch(lines, timestamps + [time.time()] * len(complete))
+            else:
+                for line in complete:
+                    self.signal.emit(line)
+            self.stop_time = time.monotonic()
+
+    def send_batch(self, lines, timestamps):
+        """put the lines in line_queue, waiting for room with the block policy, or emit them"""
+        if self.line_queue is not None:
+            self.line_queue.put(self.source, lines, timestamps, cancel=self.stop_event)
+        else:
+            self.batch_signal.emit(self.source, lines, timestamps)
+
 
-    def __del__(self):
-        if self.serial_handler and self.serial_handler.isOpen():
-            self.serial_handler.close()
-        self.terminate()
+class FileLoaderWorker(QThread):
+    """Read and classify a log file in chunks and send the classified lines to the main window,
+    on a pool of processes from BULK_PARSE_MIN_SIZE bytes: the chunks are then sent as they were
+    classified, see LogBuffer.append_chunk. Stop when an interruption is requested."""
+    batch_signal = pyqtSignal(list)
+    chunk_signal = pyqtSignal(list, object)
+    progress_signal = pyqtSignal(int)
+
+    def __init__(self, path: str, start: int = 0, classifier=default_classifier):
+        QThread.__init__(self)
+        self.path = path
+        self.start_position = start
+        self.classifier = classifier
+
+    def run(self):
+        from colorful_logger_app.core import read_lines, BulkParser
+        size = max(os.path.getsize(self.path) - self.start_position, 1)
+        if size >= BULK_PARSE_MIN_SIZE:
+            parser = BulkParser(self.classifier)
+            for texts, chunk in parser.texts(self.path, self.start_position, self.isInterruptionRequested):
+                self.chunk_signal.emit(texts, chunk)
+                self.progress_signal.emit((chunk.end - self.start_position) * 100 // size)
+            return
+        classify = self.classifier.classify
+        with open(self.path, "rb") as file:
+            for lines, position in read_lines(file, self.start_position):
+                if self.isInterruptionRequested():
+                    return
+                self.batch_signal.emit([(line, classify(line)) for line in lines])
+                self.progress_signal.emit((position - self.start_position) * 100 // size)
+
+
+class FileIndexWorker(QThread):
+    """Index a MappedLog in chunks on a pool of processes and send each classified chunk to the
+    main window, which adds it to the MappedLog. Stop when an interruption is requested."""
+    index_signal = pyqtSignal(object)
+
+    def __init__(self, mapped_log: "MappedLog"):
+        QThread.__init__(self)
+        self.mapped_log = mapped_log
 
     def run(self):
-        while self.serial_handler.isOpen():
-            msg = self.serial_handler.readline()
-            if msg != "":
-                self.signal.emit(msg.decode().strip())
-            self.sleep(0)
+        from colorful_logger_app.core import BulkParser
+        parser = BulkParser(self.mapped_log.classifier)
+        for chunk in parser.chunks(self.mapped_log.path, self.mapped_log.indexed, self.isInterruptionRequested):
+            self.index_signal.emit(chunk)
+
+
+class IndexCacheWorker(QThread):
+    """Save the index of a MappedLog indexed to the end, see save_index_cache.
+    The cache of a large file is hundreds of MB, it is written out of the GUI thread."""
+
+    def __init__(self, mapped_log: "MappedLog", directory: str):
+        QThread.__init__(self)
+        self.mapped_log = mapped_log
+        self.directory = directory
+
+    def run(self):
+        from colorful_logger_app.core import save_index_cache
+        try:
+            save_index_cache(self.mapped_log, self.directory)
+        except OSError as e:
+            logger.warning("Cannot save the index of {0} : {1}".format(self.mapped_log.path, e))
+
+
+class ExportWorker(QThread):
+    """Write a LogExport to a file and report the progress.
+    Stop when an interruption is requested, the lines already written are kept."""
+    progress_signal = pyqtSignal(int)
+
+    def __init__(self, export: "LogExport", path: str):
+        QThread.__init__(self)
+        self.export = export
+        self.path = path
+
+    def run(self):
+        total = max(len(self.export), 1)
+        with open(self.path, "w", encoding="utf-8", newline="\n") as file:
+            for done in self.export.write(file):
+                if self.isInterruptionRequested():
+                    return
+                self.progress_signal.emit(done * 100 // total)
 
 
 class HighlightOptionsDialog(QDialog):
-    def __init__(self, parent=None):
+    """
+        Select the highlighted fields and edit the highlight rule profiles: keyword, prefix
+        or regex rules, each with a color, a style and optionally the tag given to the
+        lines where it is found. The profile selected when applying becomes the active one.
+    """
+    RULE_COLUMNS = ["Kind", "Pattern", "Tag", "Color", "Bold", "Italic", "Underline"]
+
+    def __init__(self, parent=None, profiles=None, active=None):
+        from colorful_logger_app.core import HighlightRule, default_profile, RULE_KEYWORD
         super(HighlightOptionsDialog, self).__init__(parent)
 
         self.form_layout = QFormLayout(self)
@@ -74,10 +265,14 @@ class HighlightOptionsDialog(QDialog):
         self.module_source_check = QCheckBox("Module/Source")
         self.module_source_check.setChecked(False)
 
+        self.hex_dump_check = QCheckBox("Hex")
+        self.hex_dump_check.setChecked(False)
+
         check_box_layout.addWidget(self.timestamp_check, alignment=Qt.AlignLeft)
         check_box_layout.addWidget(self.tag_check, alignment=Qt.AlignLeft)
         check_box_layout.addWidget(self.func_check, alignment=Qt.AlignLeft)
         check_box_layout.addWidget(self.module_source_check, alignment=Qt.AlignLeft)
+        check_box_layout.addWidget(self.hex_dump_check, alignment=Qt.AlignLeft)
 
         highlight_label = QLabel("Highlight Options")
 
@@ -89,19 +284,146 @@ class HighlightOptionsDialog(QDialog):
         self.timestamp_combo.setCurrentIndex(0)
         self.timestamp_combo.setEnabled(self.timestamp_check.isChecked())
 
+        # rule profiles, edited in place and saved by the main window when applied
+        self.profiles = [default_profile()] if profiles is None else profiles
+        self.profile_index = None  # profile shown in the rule table
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItems([profile.name for profile in self.profiles])
+        self.new_profile_button = QPushButton("New")
+        self.new_profile_button.clicked.connect(self.new_profile)
+        self.delete_profile_button = QPushButton("Delete")
+        self.delete_profile_button.clicked.connect(self.delete_profile)
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(self.profile_combo, 1)
+        profile_layout.addWidget(self.new_profile_button)
+        profile_layout.addWidget(self.delete_profile_button)
+
+        self.rule_table = QTableWidget(0, len(self.RULE_COLUMNS))
+        self.rule_table.setHorizontalHeaderLabels(self.RULE_COLUMNS)
+        self.rule_table.verticalHeader().setVisible(False)
+        self.rule_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.add_rule_button = QPushButton("Add rule")
+        self.add_rule_button.clicked.connect(lambda: self.add_rule_row(HighlightRule(RULE_KEYWORD, "")))
+        self.remove_rule_button = QPushButton("Remove rule")
+        self.remove_rule_button.clicked.connect(self.remove_rule_rows)
+        rule_buttons_layout = QHBoxLayout()
+        rule_buttons_layout.addWidget(self.add_rule_button)
+        rule_buttons_layout.addWidget(self.remove_rule_button)
+
         self.apply_button = QPushButton("Apply")
         self.apply_button.clicked.connect(self.apply)
 
         self.form_layout.addRow(highlight_label)
         self.form_layout.addRow(check_box_layout)
         self.form_layout.addRow("TimeStamp Type :", self.timestamp_combo)
+        self.form_layout.addRow("Profile :", profile_layout)
+        self.form_layout.addRow(self.rule_table)
+        self.form_layout.addRow(rule_buttons_layout)
         self.form_layout.addRow(self.apply_button)
 
+        names = [profile.name for profile in self.profiles]
+        self.select_profile(names.index(active) if active in names else 0)
+        self.profile_combo.currentIndexChanged.connect(self.select_profile)
+
     def timestamp_check_change(self):
         checked = self.timestamp_check.isChecked()
         self.timestamp_combo.setEnabled(checked)
 
+    def profile(self) -> "RuleProfile":
+        """return the selected profile, with the rules of the table"""
+        return self.profiles[self.profile_index]
+
+    @pyqtSlot(int)
+    def select_profile(self, index: int):
+        """keep the rules of the table in the profile shown and show the profile at index"""
+        if index < 0:
+            return
+        if self.profile_index is not None:
+            self.profile().rules = self.table_rules()
+        self.profile_index = index
+        self.profile_combo.blockSignals(True)
+        self.profile_combo.setCurrentIndex(index)
+        self.profile_combo.blockSignals(False)
+        self.rule_table.setRowCount(0)
+        for rule in self.profile().rules:
+            self.add_rule_row(rule)
+        self.delete_profile_button.setEnabled(self.profile().name != DEFAULT_PROFILE_NAME)
+
+    def new_profile(self):
+        """add a profile starting with the rules of the selected one"""
+        from colorful_logger_app.core import HighlightRule, RuleProfile
+        name, ok = QInputDialog.getText(self, "New profile", "Name :")
+        if not ok or not name or name in [profile.name for profile in self.profiles]:
+            return
+        self.profile().rules = self.table_rules()
+        self.profiles.append(RuleProfile(name, [HighlightRule.from_dict(rule.to_dict()) for rule in self.profile().rules],
+                                         self.profile().timestamps))
+        self.profile_combo.addItem(name)
+        self.profile_combo.setCurrentIndex(len(self.profiles) - 1)
+
+    def delete_profile(self):
+        if self.profile().name == DEFAULT_PROFILE_NAME:
+            return
+        index = self.profile_index
+        del self.profiles[index]
+        self.profile_index = None
+        self.profile_combo.blockSignals(True)
+        self.profile_combo.removeItem(index)
+        self.profile_combo.blockSignals(False)
+        self.select_profile(0)
+
+    def add_rule_row(self, rule: "HighlightRule"):
+        from colorful_logger_app.core import RULE_KINDS
+        row = self.rule_table.rowCount()
+        self.rule_table.insertRow(row)
+        kind_combo = QComboBox()
+        kind_combo.addItems(RULE_KINDS)
+        kind_combo.setCurrentText(rule.kind)
+        self.rule_table.setCellWidget(row, 0, kind_combo)
+        self.rule_table.setItem(row, 1, QTableWidgetItem(rule.pattern))
+        tag_combo = QComboBox()
+        tag_combo.addItems([""] + [tag["name"] for tag in LOGGER_TAGS[1:]])
+        tag_combo.setCurrentText(rule.tag or "")
+        self.rule_table.setCellWidget(row, 2, tag_combo)
+        color_combo = QComboBox()
+        color_combo.setEditable(True)
+        color_combo.addItems(DEFAULT_COLORS)
+        color_combo.setCurrentText(rule.color)
+        self.rule_table.setCellWidget(row, 3, color_combo)
+        for column, checked in ((4, rule.bold), (5, rule.italic), (6, rule.underline)):
+            item = QTableWidgetItem()
+            item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
+            item.setCheckState(Qt.Checked if checked else Qt.Unchecked)
+            self.rule_table.setItem(row, column, item)
+
+    def remove_rule_rows(self):
+        for row in sorted({index.row() for index in self.rule_table.selectedIndexes()}, reverse=True):
+            self.rule_table.removeRow(row)
+
+    def table_rules(self) -> list:
+        """return the rules of the table, the rows without pattern are ignored"""
+        from colorful_logger_app.core import HighlightRule
+        rules = []
+        table = self.rule_table
+        for row in range(table.rowCount()):
+            pattern = table.item(row, 1).text() if table.item(row, 1) is not None else ""
+            if not pattern:
+                continue
+            rules.append(HighlightRule(table.cellWidget(row, 0).currentText(), pattern,
+                                       table.cellWidget(row, 3).currentText(),
+                                       table.item(row, 4).checkState() == Qt.Checked,
+                                       table.item(row, 5).checkState() == Qt.Checked,
+                                       table.item(row, 6).checkState() == Qt.Checked,
+                                       table.cellWidget(row, 2).currentText() or None))
+        return rules
+
     def apply(self):
+        self.profile().rules = self.table_rules()
+        try:
+            self.profile().validate()
+        except ValueError as e:
+            QMessageBox.warning(self, APP_NAME, str(e))
+            return
         self.done(True)
 
     def closeEvent(self, QCloseEvent):
@@ -110,12 +432,15 @@ class HighlightOptionsDialog(QDialog):
 
 
 class SerialDialog(QDialog):
-    """Create a dialog interface for connecting and disconnecting from the serial interface"""
+    """Create a dialog interface for connecting and disconnecting from the serial interface.
+    Several ports can be connected at once, the buttons act on the selected port."""
 
     def __init__(self, parent=None):
         super(SerialDialog, self).__init__(parent)
 
-        self.serial_handler = serial.Serial()
+        self.serial_handler = None  # :type serial.Serial of the last connection
+        self.serial_handlers = {}  # port: serial.Serial of the connected ports
+        self.disconnected_port = None  # port of the last disconnection
 
         self.form_layout = QFormLayout(self)
         self.form_layout.setFormAlignment(Qt.AlignLeft)
@@ -123,7 +448,6 @@ class SerialDialog(QDialog):
         self.form_layout.setContentsMargins(2, 2, 2, 2)
         self.setWindowTitle("Serial Configuration")
 
-        # TODO more ports
         # TODO unix port sintax
         # TODO connect with text parameters
 
@@ -146,6 +470,7 @@ class SerialDialog(QDialog):
             item = QStandardItem(port)
             model.appendRow(item)
         self.ports_combo.setCurrentText("COM5")
+        self.ports_combo.currentTextChanged.connect(self.update_buttons)
         logger.debug("port ok")
 
         parity_label = QLabel("Paridade :")
@@ -210,6 +535,12 @@ class SerialDialog(QDialog):
         stop_bit = self.stop_bits_combo.currentText()
         byte_size = self.byte_sizes_combo.currentText()
 
+        if port in self.serial_handlers:
+            self.message_box.appendPlainText("Already connected to {0}".format(port))
+            return
+
+        import serial  # pyserial is imported when a port is used
+        self.serial_handler = serial.Serial()
         self.serial_handler.port = port
         self.serial_handler.baudrate = int(baudrate)
 
@@ -239,50 +570,130 @@ class SerialDialog(QDialog):
 
         try:
             self.serial_handler.open()
-        except (SerialException, IOError) as e:
+        except IOError as e:  # SerialException too
             self.message_box.appendPlainText(str(e))
         except:
             self.message_box.appendPlainText("Connection Error")
         finally:
             if self.serial_handler.isOpen():
-                if self.serial_handler.isOpen():
-                    self.enable_all_widgets(False)
+                self.serial_handlers[port] = self.serial_handler
                 self.message_box.appendPlainText("Connection Success")
-                self.connect_button.setEnabled(False)
-                self.disconnect_button.setEnabled(True)
-            else:
-                self.enable_all_widgets(True)
-                self.connect_button.setEnabled(True)
-                self.disconnect_button.setEnabled(False)
+            self.update_buttons()
             self.done(0)
 
     def closeEvent(self, QCloseEvent):
         """if the user close the window send done(0)
          if connected otherwise done(1)"""
-        if self.serial_handler.isOpen():
+        if self.serial_handler is not None and self.serial_handler.isOpen():
             self.done(0)
         else:
             self.done(1)
 
     def disconnect_from_serial(self):
-        """disconnect from the serial interface send send done(1)"""
+        """disconnect the selected port, the main window closes it, send done(1)"""
+        self.disconnected_port = self.ports_combo.currentText()
+        self.serial_handlers.pop(self.disconnected_port, None)
         self.message_box.appendPlainText("Disconnected from serial")
-        self.enable_all_widgets(True)
-        self.disconnect_button.setEnabled(False)
-        self.connect_button.setEnabled(True)
+        self.update_buttons()
         self.done(1)
 
+    def update_buttons(self):
+        """Enable the connection of a free port, the disconnection of a connected port"""
+        connected = self.ports_combo.currentText() in self.serial_handlers
+        self.enable_all_widgets(not connected)
+        self.ports_combo.setEnabled(True)
+        self.connect_button.setEnabled(not connected)
+        self.disconnect_button.setEnabled(connected)
+
     def enable_all_widgets(self, flag: bool):
         """Enable/disable all widgets(without buttons) of the dialog"""
         for widget in self.widgets_list:
             widget.setEnabled(flag)
 
 
+class SourceDialog(QDialog):
+    """Create a dialog interface for adding a network or file source, see colorful_logger_app.core.sources"""
+    SOURCE_TYPES = ["TCP client", "TCP server", "UDP syslog", "File (tail)"]
+
+    def __init__(self, parent=None):
+        super(SourceDialog, self).__init__(parent)
+
+        self.form_layout = QFormLayout(self)
+        self.form_layout.setFormAlignment(Qt.AlignLeft)
+        self.form_layout.setLabelAlignment(Qt.AlignLeft)
+        self.form_layout.setContentsMargins(2, 2, 2, 2)
+        self.setWindowTitle("Add Source")
+
+        self.type_combo = QComboBox()
+        self.type_combo.addItems(SourceDialog.SOURCE_TYPES)
+        self.type_combo.currentIndexChanged.connect(self.type_change)
+
+        self.host_line = QLineEdit("localhost")
+        self.port_spin = QSpinBox()
+        self.port_spin.setRange(1, 65535)
+        self.port_spin.setValue(SYSLOG_PORT)
+
+        self.path_line = QLineEdit()
+        self.path_button = QPushButton("...")
+        self.path_button.clicked.connect(self.choose_path)
+        path_layout = QHBoxLayout()
+        path_layout.addWidget(self.path_line)
+        path_layout.addWidget(self.path_button)
+
+        self.add_button = QPushButton("Add")
+        self.add_button.clicked.connect(self.apply)
+
+        self.form_layout.addRow("Type :", self.type_combo)
+        self.form_layout.addRow("Host :", self.host_line)
+        self.form_layout.addRow("Port :", self.port_spin)
+        self.form_layout.addRow("File :", path_layout)
+        self.form_layout.addRow(self.add_button)
+        self.type_change()
+
+    def type_change(self):
+        file = self.type_combo.currentIndex() == 3
+        self.host_line.setEnabled(not file)
+        self.port_spin.setEnabled(not file)
+        self.path_line.setEnabled(file)
+        self.path_button.setEnabled(file)
+
+    def choose_path(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Follow log file")
+        if path:
+            self.path_line.setText(path)
+
+    def source(self) -> "LogSource":
+        """return the source described by the dialog"""
+        from colorful_logger_app.core import TcpClientSource, TcpServerSource, UdpSyslogSource, FileTailSource
+        host = self.host_line.text()
+        port = self.port_spin.value()
+        source_type = self.type_combo.currentIndex()
+        if source_type == 0:
+            return TcpClientSource(host, port)
+        if source_type == 1:
+            return TcpServerSource(host, port)
+        if source_type == 2:
+            return UdpSyslogSource(host, port)
+        return FileTailSource(self.path_line.text())
+
+    def apply(self):
+        self.done(True)
+
+    def closeEvent(self, QCloseEvent):
+        super().closeEvent(QCloseEvent)
+        self.done(False)
+
+
 class FilterPanel(QWidget):
     """ Create the area with the filters and find and clear buttons """
     filter_changed = pyqtSignal(str)
+    tags_filter_changed = pyqtSignal(list)
+    time_filter_changed = pyqtSignal(str, str)
+    time_jump_requested = pyqtSignal(str)
+    query_changed = pyqtSignal(str)
 
     def __init__(self, parent=None):
+        from colorful_logger_app.core import SEARCH_MODES, SEARCH_IGNORE_CASE
         super(FilterPanel, self).__init__(parent)
 
         self.form_layout = QFormLayout(parent)
@@ -307,33 +718,201 @@ class FilterPanel(QWidget):
         self.log_types.setCurrentText(LOGGER_TAGS[0]["name"])
         self.log_types.currentTextChanged.connect(self.get_log_type)
 
+        # several tags at once (ex: WARN+ERROR+FATAL)
+        self.log_types_button = QToolButton()
+        self.log_types_button.setText("Tags")
+        self.log_types_button.setPopupMode(QToolButton.InstantPopup)
+        self.log_types_menu = QMenu(self.log_types_button)
+        self.log_types_actions = []
+        for tag in LOGGER_TAGS[1:]:
+            action = self.log_types_menu.addAction(tag['name'])
+            action.setCheckable(True)
+            action.triggered.connect(self.get_log_types)
+            self.log_types_actions.append(action)
+        self.log_types_button.setMenu(self.log_types_menu)
+
         self.filter_layout_1.addWidget(self.log_types)
+        self.filter_layout_1.addWidget(self.log_types_button)
         self.filter_layout_1.addWidget(self.filter_line)
 
+        self.search_mode = QComboBox()
+        self.search_mode.addItems(SEARCH_MODES)
+        self.search_mode.setCurrentIndex(SEARCH_IGNORE_CASE)
+        self.search_count_label = QLabel()
+        self.filter_layout_1.addWidget(self.search_mode)
+
         self.filter_layout_2 = QHBoxLayout()
 
+        self.filter_previous_button = QPushButton("Previous")
         self.filter_search_button = QPushButton("Search")
         self.filter_clear_button = QPushButton("Clear")
+        self.filter_line.returnPressed.connect(self.filter_search_button.click)
 
+        self.filter_layout_2.addWidget(self.search_count_label)
+        self.filter_layout_2.addWidget(self.filter_previous_button)
         self.filter_layout_2.addWidget(self.filter_search_button)
         self.filter_layout_2.addWidget(self.filter_clear_button)
 
+        # time range (from, to) and jump to a time, [YYYY/MM/DD ]HH:MM[:SS]
+        self.time_layout = QHBoxLayout()
+        self.time_label = QLabel("Time :")
+        self.time_from_line = QLineEdit()
+        self.time_from_line.setPlaceholderText("from HH:MM:SS")
+        self.time_to_line = QLineEdit()
+        self.time_to_line.setPlaceholderText("to HH:MM:SS")
+        self.time_jump_line = QLineEdit()
+        self.time_jump_line.setPlaceholderText("go to HH:MM:SS")
+        self.time_from_line.returnPressed.connect(self.get_time_range)
+        self.time_to_line.returnPressed.connect(self.get_time_range)
+        self.time_jump_line.returnPressed.connect(
+            lambda: self.time_jump_requested.emit(self.time_jump_line.text()))
+        self.time_layout.addWidget(self.time_from_line)
+        self.time_layout.addWidget(self.time_to_line)
+        self.time_layout.addWidget(self.time_jump_line)
+
+        # query over the fields of the lines, see colorful_logger_app.core.query
+        self.query_layout = QHBoxLayout()
+        self.query_label = QLabel("Query :")
+        self.query_line = QLineEdit()
+        self.query_line.setPlaceholderText('ex: tag>=WARN and src~"display.c" and time in 15:06:20..15:07')
+        self.query_count_label = QLabel()
+        self.query_line.returnPressed.connect(self.get_query)
+        self.query_layout.addWidget(self.query_line)
+        self.query_layout.addWidget(self.query_count_label)
+
         self.form_layout.addRow(self.filter_label, self.filter_layout_1)
+        self.form_layout.addRow(self.time_label, self.time_layout)
+        self.form_layout.addRow(self.query_label, self.query_layout)
         self.form_layout.addRow(self.filter_layout_2)
 
     def get_log_type(self):
         """Send a signal to the main window with the selected log tag"""
-        self.filter_changed.emit(self.log_types.currentText())
+        name = self.log_types.currentText()
+        for action in self.log_types_actions:
+            action.setChecked(action.text() == name)
+        self.filter_changed.emit(name)
+
+    def get_log_types(self):
+        """Send a signal to the main window with the log tags checked in the tags menu"""
+        names = [action.text() for action in self.log_types_actions if action.isChecked()]
+        self.log_types.blockSignals(True)
+        self.log_types.setCurrentText(names[0] if len(names) == 1 else LOGGER_TAGS[0]["name"])
+        self.log_types.blockSignals(False)
+        self.tags_filter_changed.emit(names)
 
+    def get_time_range(self):
+        """Send a signal to the main window with the from and to times, empty for no bound"""
+        self.time_filter_changed.emit(self.time_from_line.text(), self.time_to_line.text())
 
-class HighlighterTag(QSyntaxHighlighter):
+    def get_query(self):
+        """Send a signal to the main window with the query, empty for every line"""
+        self.query_changed.emit(self.query_line.text())
+
+
+class LogModel(QAbstractListModel):
+    """
+        Expose the visible lines of a LogBuffer (or of a MappedLog) to a view.
+        Only the rows shown by the view are read.
+    """
+    LineRole = Qt.UserRole + 1
+    RepeatRole = Qt.UserRole + 2  # [repeats, receive time of the last one] of a collapsed line
+
+    def __init__(self, source: LogBuffer, parent=None):
+        super(LogModel, self).__init__(parent)
+        self.source = source
+        self._rows = len(source)  # rows known by the view
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._rows
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        line = self.source.line(index.row())
+        if line is None:
+            return None
+        if role == Qt.DisplayRole:
+            return line.text
+        if role == LogModel.LineRole:
+            return line
+        if role == LogModel.RepeatRole:
+            return self.source.repeat(self.source.seq(index.row()))
+        return None
+
+    def seq(self, row: int) -> int:
+        """return the sequence number of the line shown at row"""
+        return self.source.seq(row)
+
+    def row(self, seq: int) -> int:
+        """return the row showing the line seq, -1 if it is not visible"""
+        return self.source.row(seq)
+
+    def set_source(self, source) -> None:
+        """show the lines of another LogBuffer or MappedLog, keeping the tag filter"""
+        self.beginResetModel()
+        source.query = self.source.query  # the query is kept too, set_filter applies it
+        source.set_filter(self.source.tags_selected)
+        self.source = source
+        self._rows = len(source)
+        self.endResetModel()
+
+    def update_rows(self, evicted: int) -> None:
+        """notify the view of the rows evicted from the top and added at the bottom"""
+        evicted = min(evicted, self._rows)
+        if evicted > 0:
+            self.beginRemoveRows(QModelIndex(), 0, evicted - 1)
+            self._rows -= evicted
+            self.endRemoveRows()
+        rows = len(self.source)
+        if rows > self._rows:
+            self.beginInsertRows(QModelIndex(), self._rows, rows - 1)
+            self._rows = rows
+            self.endInsertRows()
+
+    def set_filter(self, tags_selected) -> None:
+        """show only the lines with one of tags_selected and the untagged lines"""
+        self.beginResetModel()
+        self.source.set_filter(tags_selected)
+        self._rows = len(self.source)
+        self.endResetModel()
+
+    def set_time_range(self, start, end) -> None:
+        """show only the lines from start to end, see LogBuffer.set_time_range"""
+        self.beginResetModel()
+        self.source.set_time_range(start, end)
+        self._rows = len(self.source)
+        self.endResetModel()
+
+    def set_query(self, query) -> None:
+        """show only the lines matching query, see VisibleRows.set_query. Rows are added by update_rows
+        as the lines are evaluated"""
+        self.beginResetModel()
+        self.source.set_query(query)
+        self._rows = len(self.source)
+        self.endResetModel()
+
+    def clear(self) -> None:
+        self.beginResetModel()
+        self.source.clear()
+        self._rows = len(self.source)
+        self.endResetModel()
+
+
+class HighlighterTag(QStyledItemDelegate):
     """
-        Search for (ALL|DEBUG|INFO|ERROR|CRITICAL|FATAL) tags in the text
-        inserted on the log area. Format the tag with the correspond color.
+        Format the fields found by the classifier in the rows painted by the log view:
+        (ALL|DEBUG|INFO|ERROR|CRITICAL|FATAL) tags with the correspond color, timestamp,
+        function and module/source, and the hex numbers and dumps.
+        When a rule profile is active its rules are painted instead of the tags, see set_rules.
+        Only the visible rows are highlighted, when they are first painted: the hex rule
+        runs here and not at ingestion. The laid out rows are cached, scrolling back
+        and repainting reuse them.
         See colorful_logger_app.LOGGER_TAGS
     """
 
-    def __init__(self, parent, tag_rules=None, timestamp_rules=None, function_rule=None, module_source_rule=None):
+    def __init__(self, parent=None, tag_rules=None, timestamp_rules=None, function_rule=None, module_source_rule=None):
         super(HighlighterTag, self).__init__(parent)
 
         self.function_rule = function_rule
@@ -341,33 +920,245 @@ class HighlighterTag(QSyntaxHighlighter):
         self.timestamp_rules = timestamp_rules
         self.module_source_rule = module_source_rule
 
-        self.highlight_rules = []
-        if not self.tag_rules:
-            for tag in LOGGER_TAGS:  # Tag rules
-                font = QFont()
-                font.setBold(True)
-                format_text = QTextCharFormat()
-                format_text.setFont(font)
-                format_text.setForeground(QBrush(QColor(tag["color"])))
-                format_text.setFontUnderline(True)
-                self.highlight_rules += [(QRegularExpression(tag["name"]), format_text)]
-         # if not self.timestamp_rules:
-         #     self.highlight_rules.append(self.timestamp_rules)
-
-
-    def highlightBlock(self, p_str):
-        if len(p_str) == 0:
-            pass
-        block = self.currentBlock()
-        for rules, format_text in self.highlight_rules:
-            # Search the tag in the firts LOG_HEADER_SIZE bytes of the string.
-            # TODO: search for more rules like timestamp, line, func|module name
-
-            match = rules.match(p_str[:LOG_HEADER_SIZE] if len(p_str) > LOG_HEADER_SIZE else p_str)
-            if match.hasMatch():
-                self.setFormat(match.capturedStart(), match.capturedLength(), format_text)
-                tag_label = match.captured(0)
-                log_mark_block(block, find_tag_by_name(tag_label))
+        # fields highlighted, see HighlightOptionsDialog
+        self.highlight_tag = True
+        self.highlight_timestamp = False
+        self.highlight_function = False
+        self.highlight_module_source = False
+        self.highlight_hex_dump = False
+        self.timestamp_rule = 0  # index in LOGGER_TIMESTAMPS
+        self.hex_dump_pattern = re.compile(HEX_DUMP_RULE)
+        self.rule_matcher = None  # :type RuleMatcher of the active profile
+        self.rule_formats = []  # QTextCharFormat of each rule of rule_matcher
+
+        # LogLine: QTextLayout of the last painted rows, cleared when the options or the font change
+        self._layouts = OrderedDict()
+        self._layouts_font = None
+
+        # search matches painted over the rows, see MainWindow.search_log_area
+        self.search_pattern = None
+        self.search_current = None  # (sequence number, start, end) of the selected match
+        self.search_color = QColor(SEARCH_MATCH_COLOR)
+        self.search_current_color = QColor(SEARCH_CURRENT_MATCH_COLOR)
+
+        # names of the sources (index is the source id), painted before the rows of a merged view
+        self.source_names = None
+        self.source_color = QColor(SOURCE_LABEL_COLOR)
+
+        self.text_option = QTextOption()
+        self.text_option.setWrapMode(QTextOption.NoWrap)
+
+        self.tag_formats = []
+        for tag in LOGGER_TAGS:  # Tag rules
+            font = QFont()
+            font.setBold(True)
+            format_text = QTextCharFormat()
+            format_text.setFont(font)
+            format_text.setForeground(QBrush(QColor(tag["color"])))
+            format_text.setFontUnderline(True)
+            self.tag_formats.append(format_text)
+
+        self.timestamp_format = QTextCharFormat()
+        self.timestamp_format.setForeground(QBrush(QColor(HIGHLIGHT_TIMESTAMP_COLOR)))
+        self.function_format = QTextCharFormat()
+        self.function_format.setForeground(QBrush(QColor(HIGHLIGHT_FUNCTION_COLOR)))
+        self.module_source_format = QTextCharFormat()
+        self.module_source_format.setForeground(QBrush(QColor(HIGHLIGHT_MODULE_SOURCE_COLOR)))
+        self.module_source_format.setFontItalic(True)
+        self.hex_dump_format = QTextCharFormat()
+        self.hex_dump_format.setForeground(QBrush(QColor(HIGHLIGHT_HEX_DUMP_COLOR)))
+
+    def set_options(self, tag=True, timestamp=False, function=False, module_source=False, timestamp_rule=0,
+                    hex_dump=False):
+        """select the highlighted fields"""
+        self.highlight_tag = tag
+        self.highlight_timestamp = timestamp
+        self.highlight_function = function
+        self.highlight_module_source = module_source
+        self.highlight_hex_dump = hex_dump
+        self.timestamp_rule = timestamp_rule
+        self._layouts.clear()
+
+    def set_rules(self, rule_matcher=None):
+        """paint the rules of a profile instead of the tags, None paints the tags"""
+        self.rule_matcher = rule_matcher
+        self.rule_formats = []
+        for rule in rule_matcher.rules if rule_matcher is not None else []:
+            format_text = QTextCharFormat()
+            format_text.setForeground(QBrush(QColor(rule.color)))
+            format_text.setFontWeight(QFont.Bold if rule.bold else QFont.Normal)
+            format_text.setFontItalic(rule.italic)
+            format_text.setFontUnderline(rule.underline)
+            self.rule_formats.append(format_text)
+        self._layouts.clear()
+
+    def clear_cache(self):
+        """forget the laid out rows, after their lines were classified again"""
+        self._layouts.clear()
+
+    def options(self) -> dict:
+        """return the highlighted fields, see set_options"""
+        return dict(tag=self.highlight_tag, timestamp=self.highlight_timestamp, function=self.highlight_function,
+                    module_source=self.highlight_module_source, timestamp_rule=self.timestamp_rule,
+                    hex_dump=self.highlight_hex_dump)
+
+    @timed("highlightBlock")
+    def highlightBlock(self, p_str, info: LineInfo = None):
+        """return the format ranges of the fields found in the text,
+        info is the cached classification of the line"""
+        if info is None:
+            info = log_classify(p_str)
+        ranges = []
+        if self.highlight_timestamp and info.timestamp_rule == self.timestamp_rule:
+            ranges.append(self._format_range(info.timestamp_start, info.timestamp_end, self.timestamp_format))
+        if self.highlight_tag and self.rule_matcher is not None:
+            for start, end, rule in self.rule_matcher.finditer(p_str):
+                ranges.append(self._format_range(start, end, self.rule_formats[rule]))
+        elif self.highlight_tag and info.tag_start >= 0:
+            ranges.append(self._format_range(info.tag_start, info.tag_end, self.tag_formats[info.tag]))
+        if self.highlight_module_source and info.source_start >= 0:
+            ranges.append(self._format_range(info.source_start, info.source_end, self.module_source_format))
+        if self.highlight_function and info.function_start >= 0:
+            ranges.append(self._format_range(info.function_start, info.function_end, self.function_format))
+        if self.highlight_hex_dump:
+            for match in self.hex_dump_pattern.finditer(p_str):
+                ranges.append(self._format_range(match.start(), match.end(), self.hex_dump_format))
+        return ranges
+
+    @staticmethod
+    def _format_range(start, end, format_text):
+        format_range = QTextLayout.FormatRange()
+        format_range.start = start
+        format_range.length = end - start
+        format_range.format = format_text
+        return format_range
+
+    def paint(self, painter, option, index):
+        line = index.data(LogModel.LineRole)
+        if line is None:
+            return
+        text = line.text
+        option = QStyleOptionViewItem(option)
+        self.initStyleOption(option, index)
+        option.text = ""
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, option, painter, option.widget)
+
+        layout = self.layout(line, option.font)
+        text_line = layout.lineAt(0)
+
+        painter.save()
+        painter.setClipRect(option.rect)
+        left = option.rect.left()
+        if self.source_names is not None and len(self.source_names) > 1:
+            left += self.paint_source(painter, option, line.source)
+        if self.search_pattern is not None:
+            self.paint_matches(painter, option.rect, left, text, text_line, index.model().seq(index.row()))
+        selected = option.state & QStyle.State_Selected
+        painter.setPen(option.palette.color(QPalette.HighlightedText if selected else QPalette.Text))
+        layout.draw(painter, QPointF(left, option.rect.top()))
+        entry = index.data(LogModel.RepeatRole)
+        if entry is not None:
+            self.paint_repeat(painter, option, left + text_line.naturalTextWidth(), line, entry)
+        painter.restore()
+
+    def layout(self, line, font) -> QTextLayout:
+        """return the highlighted layout of a line, from the cache if it was painted recently"""
+        if font != self._layouts_font:
+            self._layouts.clear()
+            self._layouts_font = QFont(font)
+        layout = self._layouts.get(line)
+        if layout is not None:
+            self._layouts.move_to_end(line)
+            return layout
+        layout = QTextLayout(line.text, font)
+        layout.setTextOption(self.text_option)
+        layout.setFormats(self.highlightBlock(line.text, line.info))
+        layout.beginLayout()
+        layout.createLine()
+        layout.endLayout()
+        self._layouts[line] = layout
+        if len(self._layouts) > HIGHLIGHT_CACHE_LINES:
+            self._layouts.popitem(last=False)
+        return layout
+
+    def paint_source(self, painter, option, source) -> int:
+        """paint the name of the source of a row, return the width of the names column"""
+        font_metrics = option.fontMetrics
+        width = (max(font_metrics.horizontalAdvance(name) for name in self.source_names)
+                 + 2 * font_metrics.averageCharWidth())
+        if source:
+            rect = option.rect
+            painter.setPen(self.source_color)
+            painter.drawText(QRectF(rect.left(), rect.top(), width, rect.height()), Qt.AlignLeft | Qt.AlignVCenter,
+                             self.source_names[source])
+        return width
+
+    def paint_repeat(self, painter, option, left, line, entry):
+        """paint the counter of a collapsed line after its text"""
+        rect = option.rect
+        left += 2 * option.fontMetrics.averageCharWidth()
+        painter.setPen(self.source_color)
+        painter.drawText(QRectF(left, rect.top(), rect.right() - left, rect.height()), Qt.AlignLeft | Qt.AlignVCenter,
+                         repeat_label(line, entry))
+
+    def paint_matches(self, painter, rect, left, text, text_line, seq):
+        """paint the background of the search matches of a row, the text starts at left"""
+        for match in self.search_pattern.finditer(text):
+            if match.start() == match.end():
+                continue
+            x_start = text_line.cursorToX(match.start())[0]
+            x_end = text_line.cursorToX(match.end())[0]
+            current = self.search_current is not None and self.search_current[:2] == (seq, match.start())
+            painter.fillRect(QRectF(left + x_start, rect.top(), x_end - x_start, rect.height()),
+                             self.search_current_color if current else self.search_color)
+
+    def sizeHint(self, option, index):
+        font_metrics = option.fontMetrics
+        return QSize(font_metrics.averageCharWidth() * LOG_VIEW_COLUMNS, font_metrics.lineSpacing())
+
+
+class LogView(QListView):
+    """Virtualized log view, only the visible rows are painted.
+    Laying out the rows costs the number of rows, follow_bottom waits for the
+    event loop so the rows inserted meanwhile are laid out once."""
+
+    def __init__(self, parent=None):
+        super(LogView, self).__init__(parent)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setHorizontalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setItemDelegate(HighlighterTag(self))
+        self.follow_timer = QTimer(self)
+        self.follow_timer.setSingleShot(True)
+        self.follow_timer.timeout.connect(self.scrollToBottom)
+
+    def is_at_bottom(self) -> bool:
+        scroll_bar = self.verticalScrollBar()
+        return self.follow_timer.isActive() or scroll_bar.value() == scroll_bar.maximum()
+
+    def follow_bottom(self) -> None:
+        """scroll to the last row when the GUI is idle"""
+        if not self.follow_timer.isActive():
+            self.follow_timer.start(0)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            QApplication.clipboard().setText("\n".join(self.model().data(self.model().index(row)) for row in rows))
+            return
+        super(LogView, self).keyPressEvent(event)
+
+
+class LogPage:
+    """A tab of the main window: a LogBuffer, its model and its view"""
+
+    def __init__(self, name: str, log_buffer: LogBuffer, parent=None):
+        self.name = name
+        self.log_buffer = log_buffer
+        self.log_model = LogModel(log_buffer, parent)
+        self.log_area = LogView()
+        self.log_area.setModel(self.log_model)
 
 
 class MainWindow(QMainWindow):
@@ -375,45 +1166,104 @@ class MainWindow(QMainWindow):
         Create the main window and setup all
         widgets needed.
      """
+    lines_ready_signal = pyqtSignal()  # line_queue is no longer empty, emitted from the reader threads
 
-    log_area: QPlainTextEdit
-    main_document: QTextDocument
+    log_area: LogView
+    log_buffer: LogBuffer
+    log_store: LogStore
+    log_model: LogModel
+    log_tabs: QTabWidget
     serial_dialog: SerialDialog
+    source_dialog: SourceDialog
     serial_menu: QMenu
     help_menu: QMenu
     log_filter_widget: QWidget
     log_filters: FilterPanel
 
-    def __init__(self):
+    def __init__(self, max_lines=LOG_STORE_MAX_LINES, max_bytes=LOG_STORE_MAX_BYTES):
+        from colorful_logger_app.core import LineQueue, POLICY_DROP_OLDEST, load_profiles, index_cache_dir
         super(MainWindow, self).__init__()
 
-        self.log_area = None  # :type QPlainTextEdit
-        self.main_document = None  # :type QTextDocument
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.log_area = None  # :type LogView of the current tab
+        self.log_buffer = LogBuffer(max_lines, max_bytes)  # every line, from every source
+        self.log_store = self.log_buffer.store
+        self.log_model = None  # :type LogModel of the current tab
+        self.log_tabs = None  # :type QTabWidget
+        self.main_page = None  # :type LogPage showing log_buffer
+        self.pages = []  # LogPage of each tab
+        self.source_names = [""]  # index is the source id, 0 is the local lines (files, ...)
+        self.source_pages = {}  # source id: LogPage
+        self.serial_workers = {}  # port: SerialListenerWorker
+        # lines read and not shown yet, from the serial workers and the source_loop
+        self.line_queue = LineQueue(LINE_QUEUE_MAX_LINES, POLICY_DROP_OLDEST, self.lines_ready_signal.emit)
+        self.lines_ready_signal.connect(self.schedule_refresh)
+        self.source_loop = None  # :type SourceLoop reading the network and file sources, from the first one
+        self.source_dialog = None  # :type SourceDialog
+        self.journal = None  # :type JournalWriter recording the serial ports
+        self.file_exporter = None  # :type ExportWorker
+        self.export_progress = None  # :type QProgressDialog
+        self.sources_menu = None  # :type QMenu
+        self.tags_selected = [LOGGER_TAGS[0]]
+        self.time_range = None  # (start, end) times shown, see LogBuffer.set_time_range
+        self.query = None  # :type Query the lines shown match, see filter_document_query
+        self.query_timer = QTimer(self)
+        self.query_timer.timeout.connect(self.query_step)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.timeout.connect(self.flush_pending_lines)
         self.highlight_options_dialog = None  # :type HighlightOptionsDialog
         self.serial_dialog = None  # :type SerialDialog
+        self.file_menu = None  # :type QMenu
         self.serial_menu = None  # :type QMenu
         self.highlight_options_menu = None  # :type QMenu
         self.help_menu = None  # :type QMenu
+        self.view_menu = None  # :type QMenu
+        self.metrics_label = None  # :type QLabel summary of the metrics in the status bar
+        self.metrics_dock = None  # :type QDockWidget
+        self.metrics_table = None  # :type QTableWidget every metric, in the dock
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.update_metrics_panel)
+        self.rates_label = None  # :type QLabel receive rate of each source in the status bar
+        self.sources_dock = None  # :type QDockWidget
+        self.sources_tree = None  # :type QTreeWidget source files and functions with their number of lines
+        self.sources_timer = QTimer(self)
+        self.sources_timer.timeout.connect(self.update_sources_panel)
+        self.source_received = {}  # source id: lines received
+        self.rates_last = {}  # source id: (lines received, lines folded) at the last rate summary
+        self.rates_time = time.monotonic()
+        self.rates_timer = QTimer(self)
+        self.rates_timer.timeout.connect(self.update_rate_summary)
         self.log_filter_widget = None  # :type QWidget
         self.log_filters = None  # :type FilterPanel
-        self.last_search = str()
-        self.last_search_cursor = QTextCursor()
+        self.last_search = None  # (text, mode) of the running search
+        self.log_search = None  # :type LogSearch
+        self.search_index = None  # index of the selected match in log_search
+        self.search_pending = None  # navigation (True next, False previous) waiting for matches
+        self.search_timer = QTimer(self)
+        self.search_timer.timeout.connect(self.search_step)
+        self.file_loader = None  # :type FileLoaderWorker
+        self.file_progress = None  # :type QProgressDialog
+        self.mapped_log = None  # :type MappedLog shown instead of the log buffer in large file mode
+        self.index_cache_dir = index_cache_dir()  # indexes of the large files, None to index them every time
+        self.file_indexer = None  # :type FileIndexWorker
+        self.index_cache_writer = None  # :type IndexCacheWorker saving the index of the large file
+        self.profiles, self.active_profile = load_profiles()  # :type list of RuleProfile, name or None
+        self.classifier = default_classifier  # :type LogClassifier of the active profile
+        self.rule_matcher = None  # :type RuleMatcher of the active profile
+        self.retag_jobs = []  # [log buffer, next sequence number, end, tags changed] re-tagged in background
+        self.retag_timer = QTimer(self)
+        self.retag_timer.timeout.connect(self.retag_step)
 
         container = QWidget()
         self.setup_menu()
         self.setup_text_area()
         self.setup_footer_panel()
-        self.setup_serial_dialog()
-        self.setup_highlight_options_dialog()
-
-        self.first_search_flag = False
-
-        self.serial_worker = SerialListenerWorker()
-        self.serial_worker.signal.connect(self.add_line_to_log_area)
 
         self.log_area_layout = QVBoxLayout()
         self.log_area_layout.setContentsMargins(0, 0, 0, 0)
-        self.log_area_layout.addWidget(self.log_area)
+        self.log_area_layout.addWidget(self.log_tabs)
         self.log_area_layout.addWidget(self.log_filter_widget)
         container.setLayout(self.log_area_layout)
 
@@ -422,52 +1272,298 @@ class MainWindow(QMainWindow):
         self.setWindowTitle(APP_NAME)
         self.setGeometry(QRect(100, 100, 800, 600))
 
+        for profile in self.profiles:
+            if profile.name == self.active_profile:
+                self.apply_profile(profile)
+
+        log_store = self.log_store
+        metrics.gauge("store.lines", lambda: len(log_store))
+        metrics.gauge("store.bytes", lambda: log_store.n_bytes)
+        metrics.gauge("store.evicted", lambda: log_store.n_evicted)
+        metrics.gauge("line_queue", self.line_queue.__len__)
+        self.setup_metrics_panel()
+        self.setup_sources_panel()
+
     def closeEvent(self, event):
-        self.serial_dialog.serial_handler.close()
-        del self.serial_worker
+        self.line_queue.close()
+        self.cancel_file_loading()
+        self.cancel_export()
+        self.close_large_file()
+        for port in list(self.serial_workers):
+            self.stop_serial_capture(port)
+        if self.source_loop is not None:
+            self.source_loop.stop()
+        self.stop_recording()
 
     def setup_serial_dialog(self):
-        """Setup the Serial Dialog interface"""
+        """Setup the Serial Dialog interface, on its first use"""
         self.serial_dialog = SerialDialog(self)
 
+    def setup_source_dialog(self):
+        """Setup the source dialog interface, on its first use"""
+        self.source_dialog = SourceDialog(self)
+
     def setup_highlight_options_dialog(self):
-        """Setup the highlighting options dialog interface"""
-        self.highlight_options_dialog = HighlightOptionsDialog(self)
+        """Setup the highlighting options dialog interface, on its first use"""
+        self.highlight_options_dialog = HighlightOptionsDialog(self, self.profiles, self.active_profile)
 
     def setup_menu(self):
         """Setup the menu"""
+        from colorful_logger_app.core import POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COLLAPSE
+        self.file_menu = self.menuBar().addMenu("File")
         self.serial_menu = self.menuBar().addMenu("Serial")
+        self.sources_menu = self.menuBar().addMenu("Sources")
         self.highlight_options_menu = self.menuBar().addMenu("Highlight Options")
+        self.view_menu = self.menuBar().addMenu("View")
         self.help_menu = self.menuBar().addMenu("Help")
 
+        action_open_file = QAction("Open...", self)
+        action_open_file.setShortcut(QKeySequence.Open)
+        action_open_file.triggered.connect(self.open_file_dialog)
+        self.file_menu.addAction(action_open_file)
+
+        action_open_large_file = QAction("Open large file (read only)...", self)
+        action_open_large_file.triggered.connect(self.open_large_file_dialog)
+        self.file_menu.addAction(action_open_large_file)
+
+        action_export = QAction("Export view...", self)
+        action_export.triggered.connect(self.export_dialog)
+        self.file_menu.addAction(action_export)
+
+        action_replay = QAction("Replay journal...", self)
+        action_replay.triggered.connect(self.replay_journal_dialog)
+        self.file_menu.addAction(action_replay)
+
         action_serial_setup = QAction("Setup", self)
         action_serial_setup.triggered.connect(self.serial_setup)
         self.serial_menu.addAction(action_serial_setup)
 
+        action_record = QAction("Record to journal...", self)
+        action_record.triggered.connect(self.record_journal_dialog)
+        self.serial_menu.addAction(action_record)
+
+        action_stop_recording = QAction("Stop recording", self)
+        action_stop_recording.triggered.connect(self.stop_recording)
+        self.serial_menu.addAction(action_stop_recording)
+
+        overload_menu = self.serial_menu.addMenu("When the view falls behind")
+        overload_group = QActionGroup(self)
+        for policy, text in ((POLICY_BLOCK, "Stop reading (the device buffers the lines)"),
+                             (POLICY_DROP_OLDEST, "Drop the oldest lines"),
+                             (POLICY_COLLAPSE, "Collapse the repeated lines, then drop the oldest")):
+            action_policy = QAction(text, overload_group)
+            action_policy.setCheckable(True)
+            action_policy.setChecked(policy == POLICY_DROP_OLDEST)
+            action_policy.triggered.connect(lambda checked, policy=policy: self.set_overload_policy(policy))
+            overload_menu.addAction(action_policy)
+
+        action_add_source = QAction("Add...", self)
+        action_add_source.triggered.connect(self.source_setup)
+        self.sources_menu.addAction(action_add_source)
+
+        action_stop_source = QAction("Stop the source of this tab", self)
+        action_stop_source.triggered.connect(self.stop_current_source)
+        self.sources_menu.addAction(action_stop_source)
+
         action_highlight_options = QAction("Highlight Options", self)
         action_highlight_options.triggered.connect(self.highlight_options_setup)
         self.highlight_options_menu.addAction(action_highlight_options)
 
+        action_collapse = QAction("Collapse repeated lines", self)
+        action_collapse.setCheckable(True)
+        action_collapse.toggled.connect(self.set_collapse_repeats)
+        self.view_menu.addAction(action_collapse)
+
+        action_metrics = QAction("Metrics", self)
+        action_metrics.setCheckable(True)
+        action_metrics.toggled.connect(self.set_metrics_enabled)
+        self.view_menu.addAction(action_metrics)
+
+        action_sources = QAction("Sources", self)
+        action_sources.setCheckable(True)
+        action_sources.toggled.connect(self.set_sources_visible)
+        self.view_menu.addAction(action_sources)
+
         action_about_box = QAction("About", self)
         action_about_box.triggered.connect(self.about_box_show)
         self.help_menu.addAction(action_about_box)
 
     def setup_text_area(self):
-        """Setup the log text area and the highlighter class"""
-        self.log_area = QPlainTextEdit()
-        self.log_area.setReadOnly(True)
-        self.log_area.centerOnScroll()
-
-        self.main_document = self.log_area.document()
-        HighlighterTag(self.log_area.document())
+        """Setup the tabs, the first one shows the lines of every source merged by receive time"""
+        self.log_tabs = QTabWidget()
+        self.log_tabs.setTabBarAutoHide(True)
+        self.main_page = self.add_page("All", self.log_buffer)
+        self.main_page.log_area.itemDelegate().source_names = self.source_names
+        self.log_model = self.main_page.log_model
+        self.log_area = self.main_page.log_area
+        self.log_tabs.currentChanged.connect(self.select_page)
+
+    def add_page(self, name: str, log_buffer: LogBuffer) -> LogPage:
+        """Add a tab showing log_buffer"""
+        page = LogPage(name, log_buffer, self)
+        page.log_model.set_filter(self.tags_selected)
+        if self.pages:
+            page.log_area.itemDelegate().set_options(**self.main_page.log_area.itemDelegate().options())
+            page.log_area.itemDelegate().set_rules(self.rule_matcher)
+        self.pages.append(page)
+        self.log_tabs.addTab(page.log_area, name)
+        return page
+
+    @pyqtSlot(int)
+    def select_page(self, index: int):
+        """Show the tab at index, the filter follows and the search restarts"""
+        if index < 0:
+            return
+        self.search_restart()
+        page = self.pages[index]
+        self.log_area = page.log_area
+        self.log_model = page.log_model
+        if page.log_model.source.tags_selected != self.tags_selected:
+            page.log_model.set_filter(self.tags_selected)
+        if page.log_model.source.time_range != self.time_range:
+            page.log_model.set_time_range(*(self.time_range or (None, None)))
+        if page.log_model.source.query is not self.query:
+            page.log_model.set_query(self.query)
+        self.query_continue()
+        self.log_area.scrollToBottom()
+
+    def setup_metrics_panel(self):
+        """Setup the metrics summary of the status bar and the dock listing every metric, hidden until enabled"""
+        self.metrics_label = QLabel()
+        self.rates_label = QLabel()
+        self.statusBar().addPermanentWidget(self.rates_label)
+        self.statusBar().addPermanentWidget(self.metrics_label, 1)
+        self.metrics_label.hide()
+        self.statusBar().hide()
+        self.metrics_table = QTableWidget(0, 2)
+        self.metrics_table.setHorizontalHeaderLabels(["Metric", "Value"])
+        self.metrics_table.verticalHeader().setVisible(False)
+        self.metrics_table.horizontalHeader().setStretchLastSection(True)
+        self.metrics_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.metrics_dock = QDockWidget("Metrics", self)
+        self.metrics_dock.setWidget(self.metrics_table)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.metrics_dock)
+        self.metrics_dock.hide()
+
+    @pyqtSlot(bool)
+    def set_metrics_enabled(self, enabled: bool):
+        """Start or stop measuring the hot paths and showing the metrics"""
+        metrics.enabled = enabled
+        if enabled:
+            metrics.reset()
+            self.metrics_timer.start(METRICS_REFRESH_INTERVAL_MS)
+            self.update_metrics_panel()
+        else:
+            self.metrics_timer.stop()
+        self.metrics_label.setVisible(enabled)
+        self.statusBar().setVisible(enabled or bool(self.source_received))
+        self.metrics_dock.setVisible(enabled)
+
+    def update_metrics_panel(self):
+        """Show a summary of the metrics in the status bar and all of them in the dock"""
+        values = metrics.snapshot()
+        self.metrics_label.setText(
+            "serial {0:.0f} lines/s {1:.1f} kB/s | queue {2} lines, {3} dropped | flush p99 {4} | "
+            "highlight p99 {5} | store {6} lines {7:.1f} MB, {8} evicted".format(
+                values["serial.lines"]["rate"], values["serial.bytes"]["rate"] / 1024, values["line_queue"]["value"],
+                values["lines.dropped"]["total"], format_duration(values["flush_pending_lines"]["p99"]),
+                format_duration(values["highlightBlock"]["p99"]), values["store.lines"]["value"],
+                values["store.bytes"]["value"] / (1024 * 1024), values["store.evicted"]["value"]))
+        self.metrics_table.setRowCount(len(values))
+        for row, name in enumerate(sorted(values)):
+            self.metrics_table.setItem(row, 0, QTableWidgetItem(name))
+            self.metrics_table.setItem(row, 1, QTableWidgetItem(format_metric(values[name])))
+
+    def setup_sources_panel(self):
+        """Setup the dock listing the source files and the functions of the lines, hidden until shown"""
+        self.sources_tree = QTreeWidget()
+        self.sources_tree.setHeaderLabels(["Name", "Lines"])
+        self.sources_tree.setSortingEnabled(True)
+        self.sources_tree.sortByColumn(0, Qt.AscendingOrder)
+        for title, field in (("Files", "src"), ("Functions", "func")):
+            item = QTreeWidgetItem(self.sources_tree, [title])
+            item.setData(0, Qt.UserRole, field)
+            item.setExpanded(True)
+        self.sources_tree.itemClicked.connect(self.filter_document_symbol)
+        self.sources_dock = QDockWidget("Sources", self)
+        self.sources_dock.setWidget(self.sources_tree)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.sources_dock)
+        self.sources_dock.hide()
+
+    @pyqtSlot(bool)
+    def set_sources_visible(self, visible: bool):
+        """Show or hide the sources panel, refreshed while shown"""
+        if visible:
+            self.sources_timer.start(SOURCES_REFRESH_INTERVAL_MS)
+            self.update_sources_panel()
+        else:
+            self.sources_timer.stop()
+        self.sources_dock.setVisible(visible)
+
+    def update_sources_panel(self):
+        """List the source files and the functions of the lines of the current tab with their number of lines"""
+        symbol_index = self.log_model.source.symbol_index
+        self.sources_tree.setSortingEnabled(False)
+        for index in range(self.sources_tree.topLevelItemCount()):
+            parent = self.sources_tree.topLevelItem(index)
+            counts = symbol_index.table(parent.data(0, Qt.UserRole)).counts()
+            parent.takeChildren()
+            parent.addChildren([self.sources_item(name, lines) for name, lines in counts])
+            parent.setText(1, str(len(counts)))
+        self.sources_tree.setSortingEnabled(True)
+
+    @staticmethod
+    def sources_item(name: str, lines: int) -> QTreeWidgetItem:
+        item = QTreeWidgetItem([name])
+        item.setData(1, Qt.DisplayRole, lines)  # sorted as a number
+        return item
+
+    @pyqtSlot(QTreeWidgetItem, int)
+    def filter_document_symbol(self, item: QTreeWidgetItem, column: int):
+        """Show only the lines of the source file or the function of a sources panel item"""
+        if item.parent() is None:
+            return
+        text = '{0}="{1}"'.format(item.parent().data(0, Qt.UserRole), re.sub(r'(["\\])', r"\\\1", item.text(0)))
+        self.log_filters.query_line.setText(text)
+        self.filter_document_query(text)
+
+    @pyqtSlot(bool)
+    def set_collapse_repeats(self, collapse: bool):
+        """Fold the lines repeating the line before them (timestamp aside) into one row with a counter,
+        in every tab. Only the lines received from now on are folded"""
+        for log_buffer in [self.log_buffer] + [page.log_buffer for page in self.source_pages.values()]:
+            log_buffer.collapse = collapse
+
+    def update_rate_summary(self):
+        """Show the receive rate of each source in the status bar, with the rate of the folded lines"""
+        now = time.monotonic()
+        elapsed = max(now - self.rates_time, 1e-3)
+        self.rates_time = now
+        rates = []
+        for source, received in self.source_received.items():
+            folded = self.log_buffer.folded.get(source, 0)
+            last_received, last_folded = self.rates_last.get(source, (0, 0))
+            self.rates_last[source] = (received, folded)
+            rate = "{0} {1:.0f} lines/s".format(self.source_names[source] or "local",
+                                                (received - last_received) / elapsed)
+            if folded:
+                rate += " ({0:.0f} repeated)".format((folded - last_folded) / elapsed)
+            rates.append(rate)
+        self.rates_label.setText(" | ".join(rates))
 
     def setup_footer_panel(self):
         """Setup the footer area"""
         self.log_filter_widget = QWidget()
         self.log_filters = FilterPanel(self.log_filter_widget)
         self.log_filters.filter_changed.connect(self.filter_document)
+        self.log_filters.tags_filter_changed.connect(self.filter_document_tags)
+        self.log_filters.time_filter_changed.connect(self.filter_document_time)
+        self.log_filters.time_jump_requested.connect(self.jump_to_time)
+        self.log_filters.query_changed.connect(self.filter_document_query)
         self.log_filters.filter_clear_button.clicked.connect(self.clear_log_area)
         self.log_filters.filter_search_button.clicked.connect(self.search_log_area)
+        self.log_filters.filter_previous_button.clicked.connect(self.search_log_area_previous)
+        self.log_filters.search_mode.currentIndexChanged.connect(self.search_restart)
 
     @pyqtSlot(str)
     def filter_document(self, msg: str):
@@ -476,30 +1572,310 @@ class MainWindow(QMainWindow):
            or untagged lines.
         :type msg: str (ALL|DEBUG|INFO|ERROR|CRITICAL|FATAL)
         """
-        tag = find_tag_by_name(msg)
-        log_filter_by_tag(self.main_document, tag)
+        self.filter_document_tags([msg])
+
+    @pyqtSlot(list)
+    def filter_document_tags(self, names: list):
+        """Filter the log area with several tags, showing the lines
+           with any of them or untagged lines. An empty list shows every line.
+        :type names: list of str (ALL|DEBUG|INFO|ERROR|CRITICAL|FATAL)
+        """
+        self.tags_selected = [find_tag_by_name(name) for name in names]
+        self.log_model.set_filter(self.tags_selected)
+        self.search_restart()
+        self.query_continue()
         self.update()
 
+    @pyqtSlot(str, str)
+    def filter_document_time(self, start_text: str, end_text: str):
+        """Show only the lines from a time to another, on top of the tag filter.
+           The times are [YYYY/MM/DD ]HH:MM[:SS], a time without a date is on the day
+           of the last line, an empty time is no bound.
+        """
+        from colorful_logger_app.core import parse_time_query
+        source = self.log_model.source
+        try:
+            start = parse_time_query(start_text, source.time_index.last) if start_text.strip() else None
+            end = parse_time_query(end_text, source.time_index.last) if end_text.strip() else None
+        except ValueError as e:
+            QMessageBox.warning(self, APP_NAME, str(e))
+            return
+        self.time_range = None if start is None and end is None else (start, end)
+        self.log_model.set_time_range(start, end)
+        self.search_restart()
+        self.update()
+
+    @pyqtSlot(str)
+    def filter_document_query(self, text: str):
+        """Show only the lines matching a query, on top of the tag filter and the time range.
+           The lines are evaluated in background by query_step, an empty query shows every line.
+           See colorful_logger_app.core.query for the syntax.
+        """
+        from colorful_logger_app.core import parse_query
+        source = self.log_model.source
+        try:
+            query = parse_query(text, source.time_index.last) if text.strip() else None
+        except ValueError as e:
+            QMessageBox.warning(self, APP_NAME, str(e))
+            return
+        self.query = query
+        self.log_model.set_query(query)
+        self.search_restart()
+        self.query_continue()
+        self.update()
+
+    def query_continue(self):
+        """Evaluate the query on the lines left, if any, see query_step"""
+        if self.query is not None and not self.query_timer.isActive():
+            self.query_timer.start(0)
+        self.query_update_count()
+
+    @timed("query_step")
+    def query_step(self):
+        """Evaluate the query on the lines not evaluated yet for at most SEARCH_STEP_MS, then let the GUI run.
+        The rows found are added at the bottom of the tabs"""
+        timer = QElapsedTimer()
+        timer.start()
+        pending = False
+        for page in self.pages:
+            tag_filter = page.log_model.source.tag_filter
+            if tag_filter is None or tag_filter.is_done():
+                continue
+            while not tag_filter.is_done() and timer.elapsed() < SEARCH_STEP_MS:
+                tag_filter.sync()
+            page.log_model.update_rows(0)
+            pending = pending or not tag_filter.is_done()
+        if not pending:
+            self.query_timer.stop()
+        self.query_update_count()
+
+    def query_update_count(self):
+        """Show the number of lines matching the query, ... while lines are left"""
+        if self.query is None:
+            self.log_filters.query_count_label.clear()
+            return
+        tag_filter = self.log_model.source.tag_filter
+        pending = tag_filter is not None and not tag_filter.is_done()
+        self.log_filters.query_count_label.setText("{0} lines{1}".format(len(self.log_model.source),
+                                                                         " ..." if pending else ""))
+
+    @pyqtSlot(str)
+    def jump_to_time(self, text: str):
+        """Select the first visible line at a time ([YYYY/MM/DD ]HH:MM[:SS]) or after it"""
+        from colorful_logger_app.core import parse_time_query
+        source = self.log_model.source
+        try:
+            timestamp = parse_time_query(text, source.time_index.last)
+        except ValueError as e:
+            QMessageBox.warning(self, APP_NAME, str(e))
+            return
+        row = min(source.find_time(timestamp), self.log_model.rowCount() - 1)
+        if row < 0:
+            return
+        index = self.log_model.index(row)
+        self.log_area.setCurrentIndex(index)
+        self.log_area.scrollTo(index, QAbstractItemView.PositionAtTop)
+
     def highlight_options_setup(self):
+        """Execute the highlight options dialog and apply the selected fields to the log view"""
+        from colorful_logger_app.core import save_profiles
+        if self.highlight_options_dialog is None:
+            self.setup_highlight_options_dialog()
         apply = self.highlight_options_dialog.exec()
+        if apply:
+            dialog = self.highlight_options_dialog
+            for page in self.pages:
+                page.log_area.itemDelegate().set_options(tag=dialog.tag_check.isChecked(),
+                                                         timestamp=dialog.timestamp_check.isChecked(),
+                                                         function=dialog.func_check.isChecked(),
+                                                         module_source=dialog.module_source_check.isChecked(),
+                                                         timestamp_rule=dialog.timestamp_combo.currentIndex(),
+                                                         hex_dump=dialog.hex_dump_check.isChecked())
+            profile = dialog.profile()
+            self.active_profile = profile.name
+            try:
+                save_profiles(self.profiles, self.active_profile)
+            except OSError as e:
+                logger.warning("Cannot save the profiles : {0}".format(e))
+            self.apply_profile(profile)
+            self.log_area.viewport().update()
+
+    def apply_profile(self, profile: "RuleProfile"):
+        """
+            Classify and paint the lines with the rules of profile from now on. The lines
+            already stored are re-tagged in background by retag_step, the filter of each
+            tab is rebuilt when its lines are done. The lines of a large file are re-tagged the
+            same way and the rest of the file is indexed with the new rules. A large file is
+            indexed again only if the timestamp formats changed, its time index depends on them.
+        """
+        self.classifier = profile.classifier()
+        self.rule_matcher = profile.matcher()
+        for page in self.pages:
+            page.log_area.itemDelegate().set_rules(self.rule_matcher)
+        self.retag_jobs = []
+        for log_buffer in [self.log_buffer] + [page.log_buffer for page in self.source_pages.values()]:
+            log_buffer.classifier = self.classifier
+            self.retag_jobs.append([log_buffer, log_buffer.first_seq, log_buffer.next_seq, 0])
+        if self.mapped_log is not None:
+            if self.mapped_log.classifier.timestamps != self.classifier.timestamps:
+                self.open_large_file(self.mapped_log.path)
+            else:
+                if self.index_cache_writer is not None:  # it reads the tags
+                    self.index_cache_writer.wait()
+                self.mapped_log.classifier = self.classifier
+                self.retag_jobs.append([self.mapped_log, 0, self.mapped_log.next_seq, 0])
+                if not self.mapped_log.is_indexed():
+                    self.index_large_file()
+        self.retag_timer.start(0)
+
+    def retag_step(self):
+        """Re-tag the stored lines for at most SEARCH_STEP_MS, then let the GUI run"""
+        timer = QElapsedTimer()
+        timer.start()
+        while self.retag_jobs and timer.elapsed() < SEARCH_STEP_MS:
+            job = self.retag_jobs[0]
+            log_buffer, start, end = job[0], max(job[1], job[0].first_seq), job[2]
+            job[1] = min(start + PROFILE_RETAG_LINES, end)
+            job[3] += log_buffer.retag(start, job[1])
+            if job[1] < end:
+                continue
+            self.retag_jobs.pop(0)
+            if log_buffer is self.mapped_log:  # saved with the digest of the new rules
+                self.save_large_file_index()
+            for page in self.pages:
+                if page.log_model.source is log_buffer:
+                    if job[3]:
+                        page.log_model.set_filter(log_buffer.tags_selected)
+                        self.query_continue()
+                    page.log_area.itemDelegate().clear_cache()
+                    page.log_area.viewport().update()
+        if not self.retag_jobs:
+            self.retag_timer.stop()
 
     def serial_setup(self):
         """
             Execute the serial dialog interface.
             If the the result (:type dialog_result : int)== 0 and the
-            connection is successfully done, start the serial_worker thread
+            connection is successfully done, the port is captured in a new tab
             If the the result (:type dialog_result : int) == 1, disconnection
-            was requested, the worker is closed and the serial connection are closed
+            was requested, the worker of the port and its serial connection are closed
         """
+        if self.serial_dialog is None:
+            self.setup_serial_dialog()
         dialog_result = self.serial_dialog.exec()
         logger.debug("SerialDialog result : " + str(dialog_result))
+        serial_handler = self.serial_dialog.serial_handler
         if dialog_result == 0:
-            if self.serial_dialog.serial_handler.isOpen():
-                self.serial_worker.serial_handler = self.serial_dialog.serial_handler
-                self.serial_worker.start()
+            if serial_handler is not None and serial_handler.isOpen() and serial_handler.port not in self.serial_workers:
+                self.start_serial_capture(serial_handler)
         elif dialog_result == 1:
-            self.serial_worker.terminate()
-            self.serial_dialog.serial_handler.close()
+            self.stop_serial_capture(self.serial_dialog.disconnected_port)
+
+    def add_source(self, name: str) -> int:
+        """Add a source of lines with its own tab, return its id"""
+        source = len(self.source_names)
+        self.source_names.append(name)
+        self.source_pages[source] = self.add_page(name, LogBuffer(self.max_lines, self.max_bytes, self.classifier))
+        self.source_pages[source].log_buffer.collapse = self.log_buffer.collapse
+        return source
+
+    def start_serial_capture(self, serial_handler) -> SerialListenerWorker:
+        """Listen an open serial port on its own worker, its lines are shown in a new tab and in the first one"""
+        worker = SerialListenerWorker(source=self.add_source(serial_handler.port))
+        worker.serial_handler = serial_handler
+        worker.journal = self.journal
+        worker.line_queue = self.line_queue
+        worker.signal.connect(self.add_line_to_log_area)
+        self.serial_workers[serial_handler.port] = worker
+        worker.start()
+        return worker
+
+    def stop_serial_capture(self, port: str):
+        """Stop listening a port, its tab is kept"""
+        worker = self.serial_workers.pop(port, None)
+        if worker is None:
+            return
+        worker.stop()
+        worker.wait()
+        worker.serial_handler.close()
+        logger.info("{0} : {1} lines, {2:.0f} lines/s".format(port, worker.n_lines, worker.lines_per_second()))
+        self.close_source_page(worker.source)
+
+    def record_journal_dialog(self):
+        """Ask for a journal file and record the serial ports to it"""
+        path, _ = QFileDialog.getSaveFileName(self, "Record to journal", "capture.clj.gz",
+                                              "Journal (*.clj *.clj.gz *.clj.zst)")
+        if path:
+            try:
+                self.record_journal(path)
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, APP_NAME, str(e))
+
+    def record_journal(self, path: str) -> "JournalWriter":
+        """Record the raw chunks of every serial port, connected now or later, to a journal.
+        The compression follows the extension, see journal_compression"""
+        from colorful_logger_app.core import JournalWriter
+        self.stop_recording()
+        self.journal = JournalWriter(path)
+        for worker in self.serial_workers.values():
+            worker.journal = self.journal
+        return self.journal
+
+    def stop_recording(self):
+        if self.journal is None:
+            return
+        for worker in self.serial_workers.values():
+            worker.journal = None
+        self.journal.close()
+        logger.info("{0} : {1} chunks recorded".format(self.journal.path, self.journal.n_records))
+        self.journal = None
+
+    def replay_journal_dialog(self):
+        """Ask for a journal and a speed and replay it in a new tab"""
+        path, _ = QFileDialog.getOpenFileName(self, "Replay journal", "", "Journal (*.clj *.clj.gz *.clj.zst)")
+        if not path:
+            return
+        speeds = ["1x", "10x", "100x", "As fast as possible"]
+        speed, ok = QInputDialog.getItem(self, "Replay journal", "Speed :", speeds, 0, False)
+        if ok:
+            self.replay_journal(path, float(speed[:-1]) if speed.endswith("x") else 0)
+
+    def replay_journal(self, path: str, speed: float = 1.0) -> int:
+        """Replay a journal through the source loop, speed 0 is as fast as possible"""
+        from colorful_logger_app.core import ReplaySource
+        return self.add_log_source(ReplaySource(path, speed))
+
+    def source_setup(self):
+        """Execute the source dialog and start reading the new source"""
+        if self.source_dialog is None:
+            self.setup_source_dialog()
+        if self.source_dialog.exec():
+            self.add_log_source(self.source_dialog.source())
+
+    def add_log_source(self, source: "LogSource") -> int:
+        """Read a source on the source loop, its lines are shown in a new tab and in the first one"""
+        if self.source_loop is None:
+            from colorful_logger_app.core import SourceLoop
+            self.source_loop = SourceLoop(self.line_queue.put)
+        source_id = self.add_source(source.name)
+        self.source_loop.add(source_id, source)
+        return source_id
+
+    def stop_current_source(self):
+        """Stop reading the source shown in the current tab"""
+        for source_id, page in self.source_pages.items():
+            if page.log_area is self.log_area:
+                if self.source_loop is not None and source_id in self.source_loop.sources:
+                    self.source_loop.remove(source_id)
+                    self.close_source_page(source_id)
+                for port, worker in list(self.serial_workers.items()):
+                    if worker.source == source_id:
+                        self.stop_serial_capture(port)
+
+    def close_source_page(self, source_id: int):
+        """Mark the tab of a stopped source, its lines are kept"""
+        page = self.source_pages[source_id]
+        self.log_tabs.setTabText(self.pages.index(page), "{0} (closed)".format(page.name))
 
     def about_box_show(self):
         about_msg_box = QMessageBox(self)
@@ -514,56 +1890,360 @@ class MainWindow(QMainWindow):
         about_msg_box.exec()
 
     @pyqtSlot(str)
+    @timed("add_line_to_log_area")
     def add_line_to_log_area(self, log):
         """
         Add a string to the log area
         :param log: str
         """
-        self.log_area.appendPlainText(log)
+        self.add_lines_to_log_area([log])
 
-    def clear_log_area(self):
+    @pyqtSlot(list)
+    def add_lines_to_log_area(self, lines):
         """
-        clear the log area
+        Tag and store a batch of lines, the view is updated once per batch
+        :param lines: list of str
         """
-        self.log_area.clear()
+        if not lines:
+            return
+        self.update_log_area(self.log_buffer, self.log_buffer.append(lines))
 
-    def search_log_area(self):
-        """ Search a word in log area.
-        Keep last cursor and word used for iteration
-        in the document.
+    @pyqtSlot(int, list, list)
+    def queue_lines(self, source: int, lines: list, timestamps: list):
+        """
+        Keep a batch received from a source until the next refresh, so the view is
+        updated at most once every LOG_REFRESH_INTERVAL_MS whatever the number of sources
+        :param lines: list of str
+        :param timestamps: list of float, the receive time of each line
+        """
+        self.line_queue.put(source, lines, timestamps, block=False)
+
+    @pyqtSlot()
+    def schedule_refresh(self):
+        """Show the lines of line_queue at the next refresh"""
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start(LOG_REFRESH_INTERVAL_MS)
+
+    def set_overload_policy(self, policy: str):
+        """Select what the line_queue does when the readers are faster than the view, see POLICIES"""
+        self.line_queue.policy = policy
+
+    @timed("flush_pending_lines")
+    def flush_pending_lines(self):
+        """Classify the queued batches once, add them to the tab of their source
+        and to the first tab interleaved by receive time"""
+        batches = self.line_queue.take()
+        classify = self.classifier.classify
+        runs = {}  # source: (source, lines, timestamps)
+        for source, texts, timestamps in batches:
+            lines = [(text, classify(text)) for text in texts]
+            run = runs.setdefault(source, (source, [], []))
+            run[1].extend(lines)
+            run[2].extend(timestamps)
+            self.source_received[source] = self.source_received.get(source, 0) + len(texts)
+        if runs and not self.rates_timer.isActive():
+            self.rates_timer.start(RATE_SUMMARY_INTERVAL_MS)
+            self.statusBar().show()
+        for source, lines, timestamps in runs.values():
+            page = self.source_pages.get(source)
+            if page is not None:
+                self.update_log_area(page.log_buffer,
+                                     page.log_buffer.append_classified(lines, timestamps, repeat(source)))
+        if runs:
+            lines, timestamps, sources = merge_by_time(list(runs.values()))
+            self.update_log_area(self.log_buffer, self.log_buffer.append_classified(lines, timestamps, sources))
+
+    @pyqtSlot(list)
+    def add_classified_lines_to_log_area(self, lines):
+        """
+        Store a batch of lines already classified
+        :param lines: list of (str, LineInfo)
+        """
+        self.update_log_area(self.log_buffer, self.log_buffer.append_classified(lines))
+
+    def add_chunk_to_log_area(self, texts, chunk):
+        """Store the lines of a chunk classified by a BulkParser, see LogBuffer.append_chunk"""
+        self.update_log_area(self.log_buffer, self.log_buffer.append_chunk(texts, chunk))
+
+    def update_log_area(self, source, evicted: int):
+        """Update the tabs showing source after lines were added to it, following the end if it was shown"""
+        for page in self.pages:
+            if page.log_model.source is not source:
+                continue
+            at_bottom = page.log_area.is_at_bottom()
+            page.log_model.update_rows(evicted)
+            if at_bottom:
+                page.log_area.follow_bottom()
+            if source.collapse:  # the counters of the rows shown may have changed
+                page.log_area.viewport().update()
+        if self.log_model.source is source and self.log_search is not None and not self.search_timer.isActive():
+            self.search_timer.start(0)
+        self.query_continue()
+
+    def open_file_dialog(self):
+        """Ask for a log file and load it"""
+        path, _ = QFileDialog.getOpenFileName(self, "Open log file")
+        if path:
+            self.open_log_file(path)
+
+    def open_log_file(self, path: str) -> FileLoaderWorker:
         """
+            Load a log file on a FileLoaderWorker, showing the progress and a cancel button.
+            Only the end of the file that fits in the log store is read.
+        """
+        from colorful_logger_app.core import log_tail_offset
+        self.cancel_file_loading()
+        with open(path, "rb") as file:
+            start = log_tail_offset(file, self.log_store.max_lines, self.log_store.max_bytes)
+        if start:
+            logger.info("Skipping the first {0} bytes of {1}, they do not fit in the log store".format(start, path))
+
+        self.file_loader = FileLoaderWorker(path, start, self.classifier)
+        self.file_loader.batch_signal.connect(self.add_classified_lines_to_log_area)
+        self.file_loader.chunk_signal.connect(self.add_chunk_to_log_area)
+
+        self.file_progress = QProgressDialog("Loading {0}".format(os.path.basename(path)), "Cancel", 0, 100, self)
+        self.file_progress.setWindowModality(Qt.WindowModal)
+        self.file_progress.setMinimumDuration(500)
+        self.file_progress.canceled.connect(self.cancel_file_loading)
+        self.file_loader.progress_signal.connect(self.file_progress.setValue)
+        self.file_loader.finished.connect(self.file_progress.reset)
+
+        self.log_area.scrollToBottom()
+        self.file_loader.start()
+        return self.file_loader
+
+    def open_large_file_dialog(self):
+        """Ask for a log file and show it in the read only large file mode"""
+        path, _ = QFileDialog.getOpenFileName(self, "Open large log file")
+        if path:
+            self.open_large_file(path)
+
+    def open_large_file(self, path: str) -> FileIndexWorker:
+        """
+            Show a file in the read only large file mode: the file is memory-mapped and
+            indexed in background, lines are decoded only when shown. The index saved the
+            last time the file was indexed is loaded first, only the lines added since are indexed.
+            Clear returns to the live log.
+        """
+        from colorful_logger_app.core import MappedLog, load_index_cache
+        self.close_large_file()
+        self.mapped_log = MappedLog(path, self.classifier)
+        if self.index_cache_dir is not None and load_index_cache(self.mapped_log, self.index_cache_dir):
+            logger.info("Loaded the index of {0} lines of {1}".format(self.mapped_log.next_seq, path))
+        self.log_tabs.setCurrentIndex(0)
+        self.main_page.log_model.set_source(self.mapped_log)
+        self.search_restart()
+        self.query_continue()
+        self.setWindowTitle("{0} - {1} (read only)".format(APP_NAME, path))
+        return self.index_large_file()
+
+    def index_large_file(self) -> FileIndexWorker:
+        """Index the rest of the large file in background, with its classifier"""
+        if self.file_indexer is not None:
+            self.file_indexer.requestInterruption()
+            self.file_indexer.wait()
+        self.file_indexer = FileIndexWorker(self.mapped_log)
+        self.file_indexer.index_signal.connect(self.add_file_index)
+        self.file_indexer.start()
+        return self.file_indexer
+
+    @pyqtSlot(object)
+    def add_file_index(self, chunk):
+        """Add a chunk indexed by the FileIndexWorker to the large file"""
+        if self.mapped_log is None or self.sender() is not self.file_indexer:
+            return
+        self.update_log_area(self.mapped_log, self.mapped_log.add_scan(chunk))
+        self.save_large_file_index()
+
+    def save_large_file_index(self):
+        """Save the index of the large file once indexed to the end and re-tagged, see IndexCacheWorker"""
+        if (self.mapped_log.is_indexed() and self.index_cache_dir is not None
+                and not any(job[0] is self.mapped_log for job in self.retag_jobs)):
+            if self.index_cache_writer is not None:
+                self.index_cache_writer.wait()
+            self.index_cache_writer = IndexCacheWorker(self.mapped_log, self.index_cache_dir)
+            self.index_cache_writer.start()
+
+    def close_large_file(self):
+        """Leave the large file mode and show the live log again"""
+        if self.file_indexer is not None:
+            self.file_indexer.requestInterruption()
+            self.file_indexer.wait()
+            self.file_indexer = None
+        if self.index_cache_writer is not None:  # it reads the mapped file
+            self.index_cache_writer.wait()
+            self.index_cache_writer = None
+        if self.mapped_log is not None:
+            self.main_page.log_model.set_source(self.log_buffer)
+            self.search_restart()
+            self.query_continue()
+            self.mapped_log.close()
+            self.mapped_log = None
+            self.setWindowTitle(APP_NAME)
+
+    def export_dialog(self):
+        """Ask for a file and export the current view to it"""
+        from colorful_logger_app.core import EXPORT_FORMATS
+        path, selected = QFileDialog.getSaveFileName(self, "Export view", "", ";;".join(EXPORT_FORMATS))
+        if path:
+            self.export_view(path, EXPORT_FORMATS.index(selected) if selected in EXPORT_FORMATS else None)
+
+    def export_view(self, path: str, export: int = None) -> ExportWorker:
+        """
+            Export the lines of the current tab shown by the filters and the query and matched
+            by the running search on an ExportWorker, showing the progress and a cancel button.
+            The format follows the extension if export is None, see export_format
+        """
+        from colorful_logger_app.core import LogExport, export_format
+        self.cancel_export()
+        if self.query_timer.isActive():
+            # the export follows the view, the query is evaluated to the end first
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            while self.query_timer.isActive():
+                self.query_step()
+            QApplication.restoreOverrideCursor()
+        pattern = self.log_search.pattern if self.log_search is not None else None
+        log_export = LogExport(self.log_model.source, export_format(path) if export is None else export, pattern)
+        self.file_exporter = ExportWorker(log_export, path)
+
+        self.export_progress = QProgressDialog("Exporting {0}".format(os.path.basename(path)), "Cancel", 0, 100, self)
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(500)
+        self.export_progress.canceled.connect(self.cancel_export)
+        self.file_exporter.progress_signal.connect(self.export_progress.setValue)
+        self.file_exporter.finished.connect(self.export_progress.reset)
+
+        self.file_exporter.start()
+        return self.file_exporter
+
+    def cancel_export(self):
+        """Stop the running export, the lines already written are kept"""
+        if self.file_exporter is not None and self.file_exporter.isRunning():
+            self.file_exporter.requestInterruption()
+            self.file_exporter.wait()
+
+    def cancel_file_loading(self):
+        """Stop the file being loaded, the lines already loaded are kept"""
+        if self.file_loader is not None and self.file_loader.isRunning():
+            self.file_loader.requestInterruption()
+            self.file_loader.wait()
 
-        cursor: QTextCursor
-        doc: QTextDocument
-        text: str
-        search_format: QTextCharFormat
+    def clear_log_area(self):
+        """
+        clear the log area, in large file mode return to the live log
+        """
+        if self.mapped_log is not None:
+            self.close_large_file()
+        else:
+            self.log_model.clear()
+            self.search_restart()
 
+    @pyqtSlot()
+    @timed("search_log_area")
+    def search_log_area(self):
+        """Select the next match of the searched text, see search_step"""
+        self.search_navigate(True)
+
+    def search_log_area_previous(self):
+        """Select the previous match of the searched text"""
+        self.search_navigate(False)
+
+    def search_restart(self):
+        """Forget the matches, the search restarts with the current text, mode and filter"""
+        self.last_search = None
+        self.log_search = None
+        self.search_index = None
+        self.search_pending = None
+        self.search_timer.stop()
+        delegate = self.log_area.itemDelegate()
+        delegate.search_pattern = delegate.search_current = None
+        self.log_filters.search_count_label.clear()
+        self.log_area.viewport().update()
+
+    def search_navigate(self, forward: bool):
+        """
+            Start a search if the text or the mode changed, then go to the next or previous match.
+            Matches are found by search_step in the background, the navigation waits for
+            the first match if there is none yet.
+        """
+        from colorful_logger_app.core import LogSearch, compile_search
         text = self.log_filters.filter_line.text()
-        doc = self.log_area.document()
-
-        search_format = QTextCharFormat()
-        color = QColor("yellow")
-        color.setAlpha(255)
-        search_format.setBackground(color)
-
-        # remove the previous search highlight
-        if not self.last_search_cursor.isNull():
-            self.last_search_cursor.setCharFormat(QTextCharFormat())
-
-        # if search word changed or erased, reset cursor and last_search
-        if len(text) == 0 or text != self.last_search:
-            self.last_search_cursor = QTextCursor()
-            self.last_search = text
-            self.log_area.unsetCursor()
-        # if has no word to search, just return
-        if len(text) == 0:
+        mode = self.log_filters.search_mode.currentIndex()
+        if (text, mode) != self.last_search:
+            self.search_restart()
+            if len(text) == 0:
+                return
+            try:
+                pattern = compile_search(text, mode)
+            except re.error as e:
+                self.log_filters.search_count_label.setText("Invalid regex : {0}".format(e))
+                return
+            self.last_search = (text, mode)
+            self.log_search = LogSearch(self.log_model.source, pattern)
+            self.log_area.itemDelegate().search_pattern = pattern
+            self.search_timer.start(0)
+
+        search = self.log_search
+        if search is None:
             return
-
-        cursor = self.last_search_cursor if not self.last_search_cursor.isNull() else QTextCursor(doc)
-        cursor = doc.find(text, cursor)
-        if not cursor.isNull():
-            self.log_area.setTextCursor(cursor)
-            cursor.setCharFormat(search_format)
+        if not len(search):
+            self.search_pending = forward
+            return
+        if self.search_index is not None and self.search_index >= search.first:
+            seq, start, end = search.match(self.search_index)
+        else:
+            current = self.log_area.currentIndex()
+            seq = self.log_model.seq(current.row()) if current.isValid() else self.log_model.source.first_seq
+            start = -1
+        self.search_index = search.next(seq, start) if forward else search.previous(seq, start)
+        self.search_show_match()
+
+    @timed("search_step")
+    def search_step(self):
+        """Search the lines not searched yet for at most SEARCH_STEP_MS, then let the GUI run"""
+        search = self.log_search
+        if search is None:
+            self.search_timer.stop()
+            return
+        timer = QElapsedTimer()
+        timer.start()
+        found = 0
+        while not search.is_done() and timer.elapsed() < SEARCH_STEP_MS:
+            scanned = search.scanned
+            found += search.scan()
+            if search.scanned == scanned:  # waiting for query_step
+                break
+        if search.is_done():
+            self.search_timer.stop()
+        if self.search_pending is not None and len(search):
+            forward, self.search_pending = self.search_pending, None
+            self.search_navigate(forward)
+        else:
+            self.search_update_count()
+        if found:
+            self.log_area.viewport().update()
+
+    def search_show_match(self):
+        """Select and show the row of the current match"""
+        seq, start, end = self.log_search.match(self.search_index)
+        self.log_area.itemDelegate().search_current = (seq, start, end)
+        row = self.log_model.row(seq)
+        if row >= 0:
+            index = self.log_model.index(row)
+            self.log_area.setCurrentIndex(index)
+            self.log_area.scrollTo(index, QAbstractItemView.PositionAtCenter)
+        self.log_area.viewport().update()
+        self.search_update_count()
+
+    def search_update_count(self):
+        """Show "n of M" for the current match"""
+        search = self.log_search
+        if search is None:
+            return
+        total = "{0}{1}".format(len(search), "" if search.is_done() else "+")
+        if self.search_index is not None and self.search_index >= search.first:
+            text = "{0} of {1}".format(search.position(self.search_index) + 1, total)
         else:
-            self.log_area.unsetCursor()
-        self.last_search_cursor = cursor
+            text = "{0} matches".format(total)
+        self.log_filters.search_count_label.setText(text)
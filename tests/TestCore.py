@@ -0,0 +1,877 @@
+import calendar
+import gzip
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+from colorful_logger_app import LOGGER_TAGS, find_tag_by_name
+from colorful_logger_app.core import LogBuffer, LogStore, log_classify, log_tail_offset, read_lines, merge_by_time, \
+    SourceLoop, PipeSource, TcpClientSource, TcpServerSource, UdpSyslogSource, FileTailSource, SerialSource, \
+    JournalWriter, JournalReader, ReplaySource, LogExport, EXPORT_HTML, EXPORT_JSON, compile_search, \
+    HighlightRule, RuleProfile, default_profile, load_profiles, save_profiles, RULE_KEYWORD, RULE_PREFIX, RULE_REGEX, \
+    Metrics, metrics, timed, LineQueue, POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COLLAPSE, repeat_label, \
+    default_classifier, NO_TIME, format_time, parse_time_query, BulkParser, MappedLog, chunk_bounds, load_index_cache, \
+    save_index_cache, parse_query, TagIndex, TimeIndex, SymbolTable, SYMBOL_FIELDS, source_name, function_name, \
+    LogSearch
+from colorful_logger_app.core.ansi import ansi_colorize, ANSI_RESET
+from colorful_logger_app.core.filters import INDEX_BLOCK_SIZE
+from colorful_logger_app.core.journal import JOURNAL_HEADER, JOURNAL_MAGIC_STREAM, JOURNAL_RECORD, COMPRESSION_GZIP
+
+SAMPLE = "[2020/04/11 15:06:23] DEBUG src/display.c:476: [displayShowMessageDialog] - message : VERSÃO SOFTWARE"
+
+
+def tag_id(name):
+    return LOGGER_TAGS.index(find_tag_by_name(name))
+
+
+def fields(info):
+    return [getattr(info, name) for name in info.__slots__]
+
+
+class TestClassifier(unittest.TestCase):
+
+    def test_fields(self):
+        info = log_classify(SAMPLE)
+        self.assertEqual(info.tag, tag_id("DEBUG"))
+        self.assertEqual(SAMPLE[info.tag_start:info.tag_end], "DEBUG")
+        self.assertEqual(SAMPLE[info.timestamp_start:info.timestamp_end], "2020/04/11 15:06:23")
+        self.assertEqual(SAMPLE[info.source_start:info.source_end], "src/display.c:476")
+        self.assertEqual(SAMPLE[info.function_start:info.function_end], "[displayShowMessageDialog]")
+
+    def test_untagged(self):
+        info = log_classify("[2020/04/11 15:06:25] retorno gprsInit: -201")
+        self.assertEqual(info.tag, 0)
+        self.assertEqual(info.tag_start, -1)
+        self.assertEqual(log_classify("0100").timestamp_start, -1)
+
+    def test_bracketed_tag(self):
+        info = log_classify("[INFO] boot")
+        self.assertEqual((info.tag, info.tag_start, info.tag_end), (tag_id("INFO"), 1, 5))
+        self.assertEqual(info.function_start, -1)
+        text = "2020/03/02 15:06:24 [ERROR] src/a.c:12 [fn] x"
+        info = log_classify(text)
+        self.assertEqual(info.tag, tag_id("ERROR"))
+        self.assertEqual(text[info.timestamp_start:info.timestamp_end], "2020/03/02 15:06:24")
+        self.assertEqual(text[info.source_start:info.source_end], "src/a.c:12")
+        self.assertEqual(text[info.function_start:info.function_end], "[fn]")
+        info = log_classify("[INFO_x] y")
+        self.assertEqual((info.tag, info.function_start, info.function_end), (0, 0, 8))
+        self.assertEqual(log_classify("array[3] = buffer[12345]").function_start, -1)
+        self.assertEqual(log_classify("x [_init2] y").function_start, 2)
+
+    def test_tag_only_in_header(self):
+        info = log_classify("[2020/04/11 15:06:25] retorno gprsInit: -201 ................ ERROR")
+        self.assertEqual(info.tag, 0)
+
+
+class TestImport(unittest.TestCase):
+
+    def test_core_import_time(self):
+        # the modules imported on first use stay out of the import of the package
+        code = ("import sys, time\nstart = time.perf_counter()\nimport colorful_logger_app.core\n"
+                "print(time.perf_counter() - start)\n"
+                "print(sorted(set(sys.modules) & {0!r}))".format({"asyncio", "multiprocessing", "logging", "json"}))
+        times = []
+        for run in range(3):
+            output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.split("\n")
+            times.append(float(output[0]))
+            self.assertEqual(output[1], "[]")
+        self.assertLess(min(times), 0.05)
+
+
+class TestLogStore(unittest.TestCase):
+
+    def test_max_lines(self):
+        store = LogStore(max_lines=10)
+        for i in range(25):
+            store.append(str(i))
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store[0].text, "15")
+        self.assertIsNone(store.line(14))
+        self.assertEqual(store.line(24).text, "24")
+
+    def test_max_bytes(self):
+        store = LogStore(max_lines=100, max_bytes=50)
+        for i in range(20):
+            store.append("0123456789")
+        self.assertEqual(len(store), 5)
+        self.assertLessEqual(store.n_bytes, 50)
+
+
+class TestLogBuffer(unittest.TestCase):
+
+    def test_tag_index_order(self):
+        tag_index = TagIndex(10)
+        tag_index.add(10, tag_id("ERROR"))
+        self.assertEqual(tag_index.tag(10), tag_id("ERROR"))
+        self.assertRaises(ValueError, tag_index.add, 12, tag_id("INFO"))
+        self.assertEqual(tag_index.next_seq, 11)
+
+    def test_filter_with_eviction(self):
+        random.seed(3)
+        names = [tag["name"] for tag in LOGGER_TAGS[1:]] + ["untagged"]
+        log_buffer = LogBuffer(max_lines=5000)
+        log_buffer.set_filter([find_tag_by_name("WARN"), find_tag_by_name("ERROR")])
+        selected = {0, tag_id("WARN"), tag_id("ERROR")}
+        for _ in range(20):
+            log_buffer.append(["{0} - {1}".format(random.choice(names), i) for i in range(random.randint(1, 3000))])
+            expected = [line.text for line in log_buffer.store if line.tag in selected]
+            self.assertEqual([log_buffer.line(row).text for row in range(len(log_buffer))], expected)
+
+    def test_fake_logs(self):
+        log_buffer = LogBuffer()
+        with open("fake_logs.txt", encoding="utf-8") as file:
+            log_buffer.append(line.rstrip("\n") for line in file)
+        log_buffer.set_filter(find_tag_by_name("ERROR"))
+        self.assertEqual(log_buffer.tag_index.count(tag_id("ERROR")), 13)
+        self.assertIn("ERROR - TESTE2", [log_buffer.line(row).text for row in range(len(log_buffer))])
+
+    def test_merge_by_time(self):
+        first = [("a0", log_classify("a0")), ("a1", log_classify("a1"))]
+        second = [("b0", log_classify("b0")), ("b1", log_classify("b1"))]
+        lines, timestamps, sources = merge_by_time([(1, first, [1.0, 3.0]), (2, second, [2.0, 3.0])])
+        self.assertEqual([text for text, info in lines], ["a0", "b0", "a1", "b1"])
+        self.assertEqual(sources, [1, 2, 1, 2])
+        log_buffer = LogBuffer()
+        log_buffer.append_classified(lines, timestamps, sources)
+        self.assertEqual([(line.source, line.timestamp) for line in log_buffer.store],
+                         [(1, 1.0), (2, 2.0), (1, 3.0), (2, 3.0)])
+
+    def test_collapse(self):
+        log_buffer = LogBuffer(max_lines=3)
+        log_buffer.collapse = True
+        storm = ["[2020/04/11 15:06:2{0}] ERROR - timeout".format(i) for i in range(4)]
+        lines = [(text, log_classify(text)) for text in storm + ["other"]]
+        log_buffer.append_classified(lines, [1.0, 2.0, 3.0, 4.0, 5.0], [1, 1, 1, 2, 1])
+        self.assertEqual([(line.text, line.source) for line in log_buffer.store],
+                         [(storm[0], 1), (storm[3], 2), ("other", 1)])
+        self.assertEqual(log_buffer.repeat(log_buffer.store.first_seq), [2, 3.0])
+        self.assertIsNone(log_buffer.repeat(log_buffer.store.first_seq + 1))
+        self.assertEqual(log_buffer.folded, {1: 2})
+        log_buffer.append_classified([("other", log_classify("other"))], [6.0], [1])
+        self.assertEqual(log_buffer.repeat(log_buffer.seq(2)), [1, 6.0])
+        log_buffer.append(["new"])
+        self.assertEqual(log_buffer.repeats, {log_buffer.seq(1): [1, 6.0]})  # the pruned line is forgotten
+
+
+class TestTimeIndex(unittest.TestCase):
+
+    def visible(self, log_buffer, selected, start, end):
+        return [line.text for seq, line in zip(range(log_buffer.first_seq, log_buffer.next_seq), log_buffer.store)
+                if (line.tag == 0 or line.tag in selected) and start <= log_buffer.time_index.time(seq) <= end]
+
+    def test_parse_time(self):
+        self.assertEqual(default_classifier.parse_time(SAMPLE, log_classify(SAMPLE)),
+                         calendar.timegm((2020, 4, 11, 15, 6, 23)))
+        self.assertEqual(default_classifier.parse_time("12:00:01 boot", log_classify("12:00:01 boot"), 86400),
+                         86400 + 12 * 3600 + 1)
+        self.assertIsNone(default_classifier.parse_time("no time", log_classify("no time")))
+        self.assertEqual(format_time(calendar.timegm((2020, 4, 11, 15, 6, 23))), "2020/04/11 15:06:23")
+
+    def test_continuations(self):
+        log_buffer = LogBuffer()
+        log_buffer.append(["DEBUG - before", SAMPLE, "    continuation", "[2020/04/11 15:06:20] older", "15:07:00 day"])
+        time_index = log_buffer.time_index
+        sample_time = calendar.timegm((2020, 4, 11, 15, 6, 23))
+        self.assertEqual([time_index.time(seq) for seq in range(5)],
+                         [NO_TIME, sample_time, sample_time, sample_time, sample_time + 37])
+        self.assertEqual(time_index.find(sample_time), 1)
+        self.assertEqual(time_index.range(sample_time + 1, None), (4, 5))
+
+    def test_midnight(self):
+        time_index = TimeIndex()
+        time_index.extend_times([86380, 86399, 5, 60, 3600, 3000, 86000], [0.0] * 7)
+        day = time_index.time(0) - 86380
+        self.assertEqual([time_index.time(seq) - day for seq in range(7)],
+                         [86380, 86399, 86405, 86460, 90000, 90000, 86400 + 86000])
+
+    def test_range_with_tags(self):
+        log_buffer = LogBuffer(max_lines=100)
+        selected = {tag_id("ERROR"), tag_id("INFO")}
+        log_buffer.set_filter([find_tag_by_name("ERROR"), find_tag_by_name("INFO")])
+        start, end = calendar.timegm((2020, 4, 11, 15, 6, 25)), calendar.timegm((2020, 4, 11, 15, 6, 56))
+        log_buffer.set_time_range(start, end)
+        with open("fake_logs.txt", encoding="utf-8") as file:
+            lines = [line.rstrip("\n") for line in file]
+        rows = 0
+        for offset in range(0, len(lines), 30):
+            evicted = log_buffer.append(lines[offset:offset + 30])
+            expected = self.visible(log_buffer, selected, start, end)
+            self.assertEqual([log_buffer.line(row).text for row in range(len(log_buffer))], expected)
+            self.assertEqual([log_buffer.row(seq) for seq in log_buffer.visible_seqs()], list(range(len(expected))))
+            self.assertGreaterEqual(rows - evicted, 0)
+            rows = len(log_buffer)
+        self.assertEqual(log_buffer.find_time(end + 1), len(log_buffer))
+        log_buffer = LogBuffer()
+        log_buffer.append(lines)
+        log_buffer.set_time_range(start, None)
+        row = log_buffer.find_time(calendar.timegm((2020, 4, 11, 15, 7, 4)))
+        self.assertTrue(log_buffer.line(row).text.startswith("[2020/04/11 15:07:04]"))
+        self.assertFalse(log_buffer.line(row - 1).text.startswith("[2020/04/11 15:07:04]"))
+
+    def test_parse_time_query(self):
+        reference = calendar.timegm((2020, 4, 11, 15, 6, 23))
+        self.assertEqual(parse_time_query("15:06:24", reference), reference + 1)
+        self.assertEqual(parse_time_query(" 15:07 ", reference), reference + 37)
+        self.assertEqual(parse_time_query("2020-04-12 00:00:00", reference), calendar.timegm((2020, 4, 12, 0, 0, 0)))
+        for text in ["25:00", "2020/02/30 10:00", "tomorrow"]:
+            self.assertRaises(ValueError, parse_time_query, text, reference)
+
+
+class TestLoader(unittest.TestCase):
+
+    def test_read_lines(self):
+        data = "VERSÃO\r\nDEBUG - 1\nERROR - 2".encode("utf-8")
+        lines = [line for chunk, _ in read_lines(io.BytesIO(data), chunk_size=3) for line in chunk]
+        self.assertEqual(lines, ["VERSÃO", "DEBUG - 1", "ERROR - 2"])
+
+    def test_tail_offset(self):
+        data = "".join("line {0}\n".format(i) for i in range(1000)).encode()
+        file = io.BytesIO(data)
+        start = log_tail_offset(file, 10, 10 ** 6)
+        lines = [line for chunk, _ in read_lines(file, start) for line in chunk]
+        self.assertEqual(lines, ["line {0}".format(i) for i in range(990, 1000)])
+
+    def test_bulk_parser(self):
+        with open("fake_logs.txt", "rb") as file:
+            data = file.read() + "VERSÃO\r\nDEBUG - \xff\n".encode("latin-1") + b"ERROR - last"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bulk.log")
+            with open(path, "wb") as file:
+                file.write(data)
+            texts = [line for chunk, _ in read_lines(io.BytesIO(data)) for line in chunk]
+            self.assertEqual(chunk_bounds(path, 10, 1000)[0][0], data.index(b"\n") + 1)
+            self.assertEqual(chunk_bounds(path, 0, 1000)[-1][1], len(data))
+            for workers in (1, 2):
+                parser = BulkParser(workers=workers, chunk_size=1000)
+                chunks = list(parser.texts(path))
+                lines = [line for chunk_texts, chunk in chunks for line in chunk.lines(chunk_texts)]
+                self.assertEqual([text for text, _ in lines], texts)
+                self.assertEqual([fields(info) for _, info in lines], [fields(log_classify(text)) for text in texts])
+            log_buffer, expected = LogBuffer(max_lines=250), LogBuffer(max_lines=250)
+            for chunk_texts, chunk in chunks:
+                log_buffer.append_chunk(chunk_texts, chunk)
+                expected.append(chunk_texts)
+            self.assertEqual([(line.text, line.tag, fields(line.info)) for line in log_buffer.store],
+                             [(line.text, line.tag, fields(line.info)) for line in expected.store])
+            self.assertEqual(list(log_buffer.time_index.times), list(expected.time_index.times))
+            self.assertEqual(log_buffer.symbol_index.functions.counts(), expected.symbol_index.functions.counts())
+
+    def test_mapped_time_range(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "mapped.log")
+            with open("fake_logs.txt", "rb") as source, open(path, "wb") as file:
+                file.write(source.read())
+            mapped_log = MappedLog(path)
+            log_buffer = LogBuffer()
+            with open(path, encoding="utf-8") as file:
+                log_buffer.append([line.rstrip("\n") for line in file])
+            try:
+                mapped_log.index_all(1000)
+                self.assertEqual(list(mapped_log.time_index.times), list(log_buffer.time_index.times))
+                start, end = calendar.timegm((2020, 4, 11, 15, 6, 25)), calendar.timegm((2020, 4, 11, 15, 6, 56))
+                for source in (mapped_log, log_buffer):
+                    source.set_filter([find_tag_by_name("ERROR"), find_tag_by_name("INFO")])
+                    source.set_time_range(start, end)
+                self.assertEqual([mapped_log.line(row).text for row in range(len(mapped_log))],
+                                 [log_buffer.line(row).text for row in range(len(log_buffer))])
+                self.assertEqual(mapped_log.find_time(start + 10), log_buffer.find_time(start + 10))
+            finally:
+                mapped_log.close()
+
+
+class TestIndexCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cached.log")
+        with open("fake_logs.txt", "rb") as file:
+            self.data = file.read().rstrip(b"\n") + b"\n"
+        self.write(self.data + b"ERROR - incomplete")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, data, mode="wb"):
+        with open(self.path, mode) as file:
+            file.write(data)
+
+    def index(self, cached=None, classifier=None):
+        mapped_log = MappedLog(self.path, classifier)
+        self.addCleanup(mapped_log.close)
+        if cached is not None:
+            self.assertEqual(load_index_cache(mapped_log, self.directory.name), cached)
+        mapped_log.index_all()
+        return mapped_log
+
+    def assertSameIndex(self, mapped_log, expected):
+        self.assertEqual(mapped_log.offsets, expected.offsets)
+        self.assertEqual(mapped_log.tag_index.tags, expected.tag_index.tags)
+        self.assertEqual(mapped_log.time_index.times, expected.time_index.times)
+        for field in SYMBOL_FIELDS:
+            table, expected_table = mapped_log.symbol_index.table(field), expected.symbol_index.table(field)
+            self.assertEqual(table.names, expected_table.names)
+            self.assertEqual(table.column, expected_table.column)
+            self.assertEqual(table.postings, expected_table.postings)
+
+    def test_reopen(self):
+        save_index_cache(self.index(False), self.directory.name)
+        mapped_log = MappedLog(self.path)
+        self.addCleanup(mapped_log.close)
+        self.assertTrue(load_index_cache(mapped_log, self.directory.name))
+        self.assertTrue(mapped_log.is_indexed())
+        self.assertIsInstance(mapped_log.offsets, memoryview)  # read from the cache file, not copied
+        self.assertIsNotNone(mapped_log.index_map)
+        self.assertSameIndex(mapped_log, self.index())
+        mapped_log.set_filter([find_tag_by_name("ERROR")])
+        self.assertEqual(mapped_log.line(len(mapped_log) - 1).text, "ERROR - incomplete")
+
+    def test_grown_file(self):
+        save_index_cache(self.index(False), self.directory.name)
+        self.write(b" line\nINFO - appended\n", "ab")
+        mapped_log = self.index(True)
+        self.assertIsNone(mapped_log.index_map)  # copied to grow
+        self.assertSameIndex(mapped_log, self.index())
+        self.assertEqual(mapped_log.text(mapped_log.next_seq - 2), "ERROR - incomplete line")
+
+    def test_invalid_cache(self):
+        save_index_cache(self.index(False), self.directory.name)
+        self.index(False, RuleProfile("other", [HighlightRule(RULE_KEYWORD, "saiu", tag="ERROR")]).classifier())
+        self.write(self.data[::-1])
+        self.index(False)
+        self.write(b"truncated\n")
+        self.index(False)
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self):
+        with open("fake_logs.txt", encoding="utf-8") as file:
+            self.lines = [line.rstrip("\n") for line in file]
+
+    def evaluate(self, source):
+        while not source.tag_filter.is_done():
+            source.tag_filter.sync()
+        return [source.line(row).text for row in range(len(source))]
+
+    def expected(self, log_buffer, test):
+        return [line.text for seq, line in zip(range(log_buffer.first_seq, log_buffer.next_seq), log_buffer.store)
+                if test(line, log_buffer.time_index.time(seq))]
+
+    def test_query(self):
+        log_buffer = LogBuffer()
+        log_buffer.append(self.lines)
+        start, end = calendar.timegm((2020, 4, 11, 15, 6, 20)), calendar.timegm((2020, 4, 11, 15, 7, 0))
+
+        def field(line, start, end):
+            return line.text[start:end] if start >= 0 else ""
+
+        queries = {
+            'tag>=WARN and src~"SSL.c"': lambda line, t: line.tag >= tag_id("WARN")
+            and "ssl.c" in field(line, line.info.source_start, line.info.source_end).lower(),
+            "func=displayShowMessageDialog and time in 15:06:20..15:07": lambda line, t: start <= t <= end
+            and field(line, line.info.function_start, line.info.function_end) == "[displayShowMessageDialog]",
+            "SAIU or (tag = FATAL)": lambda line, t: "saiu" in line.text.lower() or line.tag == tag_id("FATAL"),
+            'not tag<=INFO text!~"ssl"': lambda line, t: not 0 < line.tag <= tag_id("INFO")
+            and "ssl" not in line.text.lower(),
+            "src=src/display.c time > 15:06:56": lambda line, t: t > start + 36
+            and field(line, line.info.source_start, line.info.source_end).startswith("src/display.c:"),
+        }
+        for text, test in queries.items():
+            log_buffer.set_query(parse_query(text, log_buffer.time_index.last))
+            expected = self.expected(log_buffer, test)
+            self.assertTrue(expected, text)
+            self.assertEqual(self.evaluate(log_buffer), expected, text)
+        log_buffer.set_filter([find_tag_by_name("DEBUG")])
+        self.assertEqual(self.evaluate(log_buffer), [text for text in expected if " DEBUG " in text])
+        for text in ["tag>=FOO", "time in ..x", "(tag=ERROR", "and", "src ! x", '"unterminated', "tag~ERROR"]:
+            self.assertRaises(ValueError, parse_query, text)
+
+    def test_streaming_with_eviction(self):
+        log_buffer = LogBuffer(max_lines=100)
+        log_buffer.set_query(parse_query('tag=ERROR or func~"event"'))
+        test = lambda line, t: line.tag == tag_id("ERROR") or "event" in line.text[line.info.function_start:
+                                                                                   line.info.function_end].lower()
+        for offset in range(0, len(self.lines), 30):
+            log_buffer.append(self.lines[offset:offset + 30])
+            self.assertEqual(self.evaluate(log_buffer), self.expected(log_buffer, test))
+
+    def test_symbol_index(self):
+        log_buffer = LogBuffer(max_lines=5000)
+        for offset in range(0, 12000, 700):
+            log_buffer.append([self.lines[index % len(self.lines)] for index in range(offset, offset + 700)])
+        seqs = range(log_buffer.first_seq, log_buffer.next_seq)
+        for field, name in zip(SYMBOL_FIELDS, [source_name, function_name]):
+            table = log_buffer.symbol_index.table(field)
+            self.assertGreater(table.base, 0)  # evicted lines forgotten
+            names = [name(line.text, line.info) for line in log_buffer.store]
+            self.assertEqual(dict(table.counts()), {key: lines for key, lines in Counter(names).items() if key})
+            for symbol in range(1, len(table.names)):
+                self.assertEqual(list(table.seqs(symbol, log_buffer.first_seq, log_buffer.next_seq)),
+                                 [seq for seq, key in zip(seqs, names) if key == table.names[symbol]])
+        self.assertIn("src/display.c", dict(log_buffer.symbol_index.sources.counts()))
+        self.assertIn("displayShowMessageDialog", dict(log_buffer.symbol_index.functions.counts()))
+
+    def test_symbol_eviction(self):
+        table = SymbolTable()
+        for block in range(4):
+            table.extend([table.intern("name{0}".format(block)), 0] * (INDEX_BLOCK_SIZE // 2))
+            table.prune(table.next_seq - INDEX_BLOCK_SIZE)
+        self.assertEqual(table.counts(), [("name3", INDEX_BLOCK_SIZE // 2)])
+        self.assertEqual(table.names, ["", None, "name3"])  # the ids of the evicted names are reused
+        self.assertEqual(table.ids, {"": 0, "name3": 2})
+        self.assertEqual(len(table.postings[0]), 0)
+        self.assertEqual(table.count(0), INDEX_BLOCK_SIZE // 2)
+        self.assertEqual(list(table.seqs(0, table.first_seq, table.first_seq + 6)),
+                         [table.first_seq + 1, table.first_seq + 3, table.first_seq + 5])
+
+    @mock.patch("colorful_logger_app.core.query.QUERY_SCAN_LINES", 50)
+    def test_search_while_evaluating(self):
+        log_buffer = LogBuffer()
+        log_buffer.append(self.lines)
+        log_buffer.set_query(parse_query("tag>=WARN"))
+        search = LogSearch(log_buffer, compile_search("ssl"))
+        search.scan()
+        self.assertEqual(search.scanned, 50)  # not past the evaluated lines
+        self.assertFalse(search.is_done())
+        while not search.is_done():
+            log_buffer.tag_filter.sync()
+            search.scan()
+        log_buffer.append(self.lines)  # streamed lines are evaluated a step at a time
+        search.scan()
+        self.assertFalse(search.is_done())
+        search.scan_all()
+        texts = dict(zip(range(log_buffer.first_seq, log_buffer.next_seq), (line.text for line in log_buffer.store)))
+        expected = [seq for seq in log_buffer.tag_filter if "ssl" in texts[seq].lower()]
+        self.assertTrue(expected)
+        self.assertEqual(sorted(set(search.seqs[search.first:])), expected)
+
+    def test_mapped_log(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "query.log")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("\n".join(self.lines))
+            mapped_log = MappedLog(path)
+            try:
+                mapped_log.index_all()
+                mapped_log.set_query(parse_query('tag>=ERROR and src~"tcpSSL"'))
+                texts = self.evaluate(mapped_log)
+            finally:
+                mapped_log.close()
+        self.assertTrue(texts)
+        self.assertTrue(all("tcpSSL" in text and (" ERROR " in text or " FATAL " in text) for text in texts))
+
+class TestSources(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lines = []
+        self.received = threading.Condition()
+        self.source_loop = SourceLoop(self.sink, batch_interval_ms=5)
+
+    def tearDown(self) -> None:
+        self.source_loop.stop()
+
+    def sink(self, source_id, lines, timestamps):
+        with self.received:
+            self.lines += [(source_id, line) for line in lines]
+            self.received.notify_all()
+
+    def wait_lines(self, count):
+        with self.received:
+            self.received.wait_for(lambda: len(self.lines) >= count, timeout=5)
+        return self.lines
+
+    def add(self, source_id, source):
+        self.source_loop.add(source_id, source)
+        self.assertTrue(source.started.wait(5))
+        return source
+
+    def test_pipe(self):
+        read_fd, write_fd = os.pipe()
+        self.add(1, PipeSource(os.fdopen(read_fd, "rb")))
+        os.write(write_fd, "INFO - first\nVERS\xc3".encode("latin-1"))
+        os.write(write_fd, b"\x83O\nlast")
+        os.close(write_fd)
+        self.assertEqual(self.wait_lines(3), [(1, "INFO - first"), (1, "VERSÃO"), (1, "last")])
+
+    def test_tcp(self):
+        server = self.add(1, TcpServerSource("127.0.0.1", 0))
+        listener = socket.create_server(("127.0.0.1", 0))
+        self.add(2, TcpClientSource("127.0.0.1", listener.getsockname()[1]))
+        connection, _ = listener.accept()
+        connection.sendall(b"to the client\n")
+        with socket.create_connection(("127.0.0.1", server.port)) as client:
+            client.sendall(b"to the server\n")
+            self.assertEqual(sorted(self.wait_lines(2)), [(1, "to the server"), (2, "to the client")])
+        connection.close()
+        listener.close()
+
+    def test_udp_syslog(self):
+        source = self.add(1, UdpSyslogSource("127.0.0.1", 0))
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            client.sendto(b"<11>ERROR - syslog message\n", ("127.0.0.1", source.port))
+            self.assertEqual(self.wait_lines(1), [(1, "<11>ERROR - syslog message")])
+
+    def test_file_tail_rotation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "device.log")
+            with open(path, "wb") as file:
+                file.write(b"old line\n")
+            self.add(1, FileTailSource(path, poll_interval_ms=5))
+            with open(path, "ab") as file:
+                file.write(b"appended\nbefore rotation\n")
+            self.wait_lines(2)
+            os.rename(path, path + ".1")
+            with open(path, "wb") as file:
+                file.write(b"after rotation\n")
+            lines = self.wait_lines(3)
+        self.assertEqual([line for _, line in lines], ["appended", "before rotation", "after rotation"])
+
+    @unittest.skipUnless(hasattr(os, "openpty"), "needs a pty")
+    def test_serial_pty(self):
+        import serial
+        master, slave = os.openpty()
+        port = serial.Serial(os.ttyname(slave))
+        self.add(1, SerialSource(port))
+        os.write(master, b"DEBUG - from the pty\r\n")
+        self.assertEqual(self.wait_lines(1), [(1, "DEBUG - from the pty")])
+        self.source_loop.stop()
+        port.close()
+        os.close(master)
+        os.close(slave)
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write_journal(self, name):
+        path = os.path.join(self.directory.name, name)
+        with JournalWriter(path) as journal:
+            journal.write(1, b"INFO - first\nVERS\xc3", 0.0)
+            journal.write(2, b"ERROR - other port\n", 0.1)
+            journal.write(1, b"\x83O\n", 0.2)
+        return path
+
+    def test_write_read(self):
+        for name in ("capture.clj", "capture.clj.gz"):
+            with JournalReader(self.write_journal(name)) as journal:
+                self.assertEqual(list(journal), [(0.0, 1, b"INFO - first\nVERS\xc3"),
+                                                 (0.1, 2, b"ERROR - other port\n"), (0.2, 1, b"\x83O\n")])
+
+    def test_cut_record(self):
+        path = self.write_journal("capture.clj")
+        with open(path, "r+b") as file:
+            file.truncate(os.path.getsize(path) - 2)
+        with JournalReader(path) as journal:
+            self.assertEqual(len(list(journal)), 2)
+
+    def test_cut_block(self):
+        for name in ("capture.clj", "capture.clj.gz"):
+            path = os.path.join(self.directory.name, name)
+            with JournalWriter(path) as journal:
+                journal.write(1, b"block 1\n", 0.0)
+                journal.flush()
+                for index in range(100):
+                    journal.write(1, "line {0}\n".format(index).encode() * 20, 1.0 + index)
+            with open(path, "r+b") as file:
+                file.truncate(os.path.getsize(path) - 100)
+            with JournalReader(path) as journal:
+                records = list(journal)
+            self.assertEqual(records[0], (0.0, 1, b"block 1\n"), name)
+            self.assertGreater(len(records), 2, name)  # the complete records of the cut block
+            self.assertLess(len(records), 101, name)
+
+    def test_cut_stream(self):
+        # a gzip journal of the first version, one stream cut without its end marker
+        path = os.path.join(self.directory.name, "capture.clj.gz")
+        records = b"".join(JOURNAL_RECORD.pack(index, 1, 6) + b"line \n" for index in range(50))
+        with open(path, "wb") as file:
+            file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC_STREAM, COMPRESSION_GZIP, 0.0))
+            file.write(gzip.compress(records)[:-8])  # no trailer
+        with JournalReader(path) as journal:
+            self.assertEqual(len(list(journal)), 50)
+        self.assertEqual(self.replay_all(path), ["line "] * 50)
+
+    def test_seek(self):
+        path = os.path.join(self.directory.name, "capture.clj.gz")
+        with JournalWriter(path) as journal:
+            for index in range(10):
+                journal.write(1, "line {0}\n".format(index).encode(), float(index))
+                journal.flush()
+        with JournalReader(path) as journal:
+            journal.seek(6.5)
+            self.assertEqual([record[0] for record in journal], [7.0, 8.0, 9.0])
+
+    def replay_all(self, path, n_lines=50):
+        lines = []
+        source_loop = SourceLoop(lambda source_id, batch, timestamps: lines.extend(batch), batch_interval_ms=5)
+        source_loop.add(1, ReplaySource(path, 0))
+        deadline = time.monotonic() + 5
+        while len(lines) < n_lines and time.monotonic() < deadline:
+            time.sleep(0.01)
+        source_loop.stop()
+        return lines
+
+    def replay(self, path, speed):
+        lines = []
+        done = threading.Event()
+
+        def sink(source_id, batch, timestamps):
+            lines.extend(batch)
+            if len(lines) == 3:
+                done.set()
+
+        source_loop = SourceLoop(sink, batch_interval_ms=5)
+        source_loop.add(1, ReplaySource(path, speed))
+        self.assertTrue(done.wait(5))
+        source_loop.stop()
+        return lines
+
+    def test_replay(self):
+        path = self.write_journal("capture.clj.gz")
+        self.assertEqual(self.replay(path, 0), ["INFO - first", "ERROR - other port", "VERSÃO"])
+        start = time.monotonic()
+        self.assertEqual(self.replay(path, 2), ["INFO - first", "ERROR - other port", "VERSÃO"])
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.log_buffer = LogBuffer()
+        with open("fake_logs.txt", encoding="utf-8") as file:
+            self.log_buffer.append(line.rstrip("\n") for line in file)
+
+    def export(self, log_export, chunk_lines=50):
+        file = io.StringIO()
+        progress = list(log_export.write(file, chunk_lines))
+        self.assertEqual(progress[-1], len(log_export))
+        return file.getvalue()
+
+    def test_text_filtered(self):
+        self.log_buffer.set_filter(find_tag_by_name("ERROR"))
+        text = self.export(LogExport(self.log_buffer))
+        expected = [self.log_buffer.line(row).text for row in range(len(self.log_buffer))]
+        self.assertEqual(text.split("\n")[:-1], expected)
+
+    def test_search(self):
+        log_export = LogExport(self.log_buffer, pattern=compile_search("saiu"))
+        text = self.export(log_export)
+        expected = [line.text for line in self.log_buffer.store if "saiu" in line.text.lower()]
+        self.assertEqual(text.split("\n")[:-1], expected)
+        self.assertEqual(log_export.n_lines, len(expected))
+
+    def test_query(self):
+        self.log_buffer.set_query(parse_query('gprs or func="displayShowMessageDialog"'))
+        while not self.log_buffer.tag_filter.is_done():
+            self.log_buffer.tag_filter.sync()
+        expected = [self.log_buffer.line(row).text for row in range(len(self.log_buffer))]
+        self.assertLess(len(expected), len(self.log_buffer.store))
+        self.assertEqual(self.export(LogExport(self.log_buffer)).split("\n")[:-1], expected)
+
+    def test_json(self):
+        self.log_buffer.clear()
+        self.log_buffer.append([SAMPLE, "untagged <line>"])
+        lines = [json.loads(line) for line in self.export(LogExport(self.log_buffer, EXPORT_JSON)).splitlines()]
+        self.assertEqual(lines[0]["timestamp"], "2020/04/11 15:06:23")
+        self.assertEqual(lines[0]["tag"], "DEBUG")
+        self.assertEqual(lines[0]["source"], "src/display.c:476")
+        self.assertEqual(lines[0]["function"], "displayShowMessageDialog")
+        self.assertEqual(lines[0]["message"], "message : VERSÃO SOFTWARE")
+        self.assertEqual((lines[1]["tag"], lines[1]["message"]), (None, "untagged <line>"))
+
+    def test_html(self):
+        self.log_buffer.clear()
+        self.log_buffer.append(["ERROR - <b>", "plain & simple"])
+        text = self.export(LogExport(self.log_buffer, EXPORT_HTML))
+        self.assertIn('<span class="tag{0}">ERROR</span> - &lt;b&gt;\n'.format(tag_id("ERROR")), text)
+        self.assertIn("plain &amp; simple\n", text)
+        self.assertTrue(text.rstrip().endswith("</html>"))
+
+    def test_repeats(self):
+        self.log_buffer.clear()
+        self.log_buffer.collapse = True
+        lines = [(SAMPLE, log_classify(SAMPLE))] * 3
+        self.log_buffer.append_classified(lines, [1.0, 2.0, 3.5])
+        text = self.export(LogExport(self.log_buffer))
+        self.assertEqual(text, "{0}  [{1}]\n".format(SAMPLE, repeat_label(self.log_buffer.store[0], [2, 3.5])))
+        self.assertTrue(repeat_label(self.log_buffer.store[0], [2, 3.5]).startswith("x3 "))
+        line = json.loads(self.export(LogExport(self.log_buffer, EXPORT_JSON)))
+        self.assertEqual((line["repeats"], line["last_time"]), (3, 3.5))
+
+
+class TestProfiles(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.profile = RuleProfile("device", [
+            HighlightRule(RULE_KEYWORD, "E", "red", bold=True, tag="ERROR"),
+            HighlightRule(RULE_KEYWORD, "ERR", "red", tag="ERROR"),
+            HighlightRule(RULE_KEYWORD, "W", "darkMagenta", tag="WARN"),
+            HighlightRule(RULE_PREFIX, ">>", "blue", tag="DEBUG"),
+            HighlightRule(RULE_REGEX, r"crc=[0-9a-f]+", "darkred"),
+        ] + [HighlightRule(RULE_KEYWORD, "word{0}".format(i)) for i in range(200)])
+
+    def test_matcher(self):
+        matcher = self.profile.matcher()
+        text = "12:00:01 E ERRNO word7 crc=1f >> word199 ERR"
+        found = sorted((text[start:end], rule) for start, end, rule in matcher.finditer(text))
+        self.assertEqual(found, [("E", 0), ("ERR", 1), ("crc=1f", 4), ("word199", 204), ("word7", 12)])
+        self.assertEqual([rule for _, _, rule in matcher.finditer(">> boot")], [3])
+
+    def test_classifier(self):
+        classifier = self.profile.classifier()
+        self.assertEqual(classifier.classify("12:00:01 ERR sensor").tag, tag_id("ERROR"))
+        self.assertEqual(classifier.classify("12:00:01 W low battery").tag, tag_id("WARN"))
+        self.assertEqual(classifier.classify(">> boot").tag, tag_id("DEBUG"))
+        self.assertEqual(classifier.classify("12:00:01 Error WARNING").tag, 0)
+        self.assertEqual(classifier.tag_bytes(b"12:00:01 E x"), tag_id("ERROR"))
+        for text in open("fake_logs.txt", encoding="utf-8").read().splitlines():
+            self.assertEqual(default_profile().classifier().classify(text).tag, log_classify(text).tag)
+
+    def test_save_load(self):
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "config", "profiles.json")
+        self.assertEqual([profile.name for profile in load_profiles(path)[0]], [default_profile().name])
+        save_profiles([default_profile(), self.profile], "device", path)
+        profiles, active = load_profiles(path)
+        self.assertEqual(active, "device")
+        self.assertEqual(profiles[1].digest(), self.profile.digest())
+        with open(path, "w") as file:
+            file.write("{not json")
+        profiles, active = load_profiles(path)
+        self.assertEqual(([profile.name for profile in profiles], active), ([default_profile().name], None))
+        directory.cleanup()
+
+    def test_invalid_rule(self):
+        with self.assertRaises(ValueError):
+            HighlightRule(RULE_REGEX, "crc=(").validate()
+        with self.assertRaises(ValueError):
+            HighlightRule(RULE_REGEX, "(?P<tag0>x)").validate()
+        with self.assertRaises(ValueError):
+            HighlightRule(RULE_KEYWORD, "E", tag="SEVERE").validate()
+
+    def test_retag(self):
+        log_buffer = LogBuffer()
+        log_buffer.append(["E sensor {0}".format(i) for i in range(100)] + ["ERROR - x"])
+        log_buffer.set_filter(find_tag_by_name("ERROR"))
+        self.assertEqual(len(log_buffer), 101)  # untagged lines are visible
+        log_buffer.set_filter(find_tag_by_name("WARN"))
+        self.assertEqual(len(log_buffer), 100)
+        log_buffer.classifier = self.profile.classifier()
+        self.assertEqual(log_buffer.retag(0, 50) + log_buffer.retag(50, 200), 101)
+        log_buffer.set_filter(find_tag_by_name("WARN"))
+        self.assertEqual(len(log_buffer), 1)  # ERROR is not a tag of the profile
+        self.assertEqual(log_buffer.tag_index.count(tag_id("ERROR")), 100)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Metrics().histogram("latency")
+        for _ in range(98):
+            histogram.record(0.000010)
+        histogram.record(0.001)
+        histogram.record(0.5)
+        values = histogram.snapshot()
+        self.assertEqual(values["count"], 100)
+        self.assertEqual(values["p50"], 16e-6)  # bucket [8, 16) us
+        self.assertEqual(values["p99"], 1024e-6)
+        self.assertEqual(values["max"], 0.5)
+
+    def test_counter_and_gauge(self):
+        registry = Metrics()
+        counter = registry.counter("lines")
+        counter.add(10)
+        gauge = registry.gauge("queue")
+        gauge.add(3)
+        gauge.add(-2)
+        registry.gauge("size", lambda: 42)
+        values = registry.snapshot()
+        self.assertEqual(values["lines"]["total"], 10)
+        self.assertGreater(values["lines"]["rate"], 0)
+        self.assertEqual(values["queue"], {"value": 1, "peak": 3})
+        self.assertEqual(values["size"], {"value": 42})
+        registry.reset()
+        self.assertEqual(registry.snapshot()["queue"], {"value": 1, "peak": 1})
+
+    def test_timed(self):
+        @timed("test.timed")
+        def work(value):
+            return value * 2
+
+        histogram = metrics.histogram("test.timed")
+        self.assertEqual(work(2), 4)
+        self.assertEqual(histogram.count, 0)
+        metrics.enabled = True
+        try:
+            self.assertEqual(work(3), 6)
+        finally:
+            metrics.enabled = False
+        self.assertEqual(histogram.count, 1)
+
+
+class TestLineQueue(unittest.TestCase):
+
+    def test_drop_oldest(self):
+        notified = []
+        queue = LineQueue(10, POLICY_DROP_OLDEST, lambda: notified.append(True))
+        queue.put(1, ["a{0}".format(i) for i in range(8)], [float(i) for i in range(8)])
+        queue.put(2, ["b{0}".format(i) for i in range(6)], [float(i) for i in range(8, 14)])
+        self.assertEqual((len(queue), queue.n_dropped, notified), (10, 4, [True]))
+        batches = queue.take()
+        self.assertEqual(batches[0], (1, ["<<< 4 lines dropped >>>"], [3.0]))
+        self.assertEqual(batches[1][1], ["a4", "a5", "a6", "a7"])
+        self.assertEqual(len(queue.take()), 0)
+        queue.put(1, ["c"], [20.0])
+        self.assertEqual(len(notified), 2)
+
+    def test_collapse(self):
+        queue = LineQueue(6, POLICY_COLLAPSE)
+        queue.put(1, ["x", "x", "x", "x", "y", "y", "z"], [float(i) for i in range(7)])
+        batches = queue.take()
+        self.assertEqual(batches, [(1, ["x", "<<< previous line repeated 3 more times >>>", "y", "y", "z"],
+                                    [0.0, 3.0, 4.0, 5.0, 6.0])])
+
+    def test_block(self):
+        queue = LineQueue(4, POLICY_BLOCK)
+        queue.put(1, ["a", "b", "c"], [0.0] * 3)
+        writer = threading.Thread(target=queue.put, args=(1, ["d", "e"], [1.0] * 2))
+        writer.start()
+        writer.join(0.2)
+        self.assertTrue(writer.is_alive())  # waits for room
+        self.assertEqual(queue.take(), [(1, ["a", "b", "c"], [0.0] * 3)])
+        writer.join(1)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(queue.take(), [(1, ["d", "e"], [1.0] * 2)])
+        queue.put(1, ["f"] * 4, [2.0] * 4)
+        cancel = threading.Event()
+        cancel.set()
+        queue.put(1, ["g"], [3.0], cancel=cancel)  # a stopping reader does not wait
+        self.assertEqual((len(queue), queue.n_dropped), (5, 0))
+
+
+class TestAnsi(unittest.TestCase):
+
+    def test_colorize_tag(self):
+        text = ansi_colorize(SAMPLE, log_classify(SAMPLE))
+        self.assertIn("DEBUG" + ANSI_RESET, text)
+        self.assertEqual(text.replace(ANSI_RESET, "").count("\x1b["), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
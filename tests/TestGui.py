@@ -1,13 +1,30 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
-from PyQt5.QtGui import QTextDocument, QTextBlock
+import serial
+
 from PyQt5.QtWidgets import QApplication
 
-from colorful_logger_app.logger_gui import MainWindow
+from colorful_logger_app import LOGGER_TAGS, find_tag_by_name
+from colorful_logger_app.core import UdpSyslogSource, JournalReader, JournalWriter, HighlightRule, RuleProfile, \
+    RULE_KEYWORD
+from colorful_logger_app.logger_gui import MainWindow, SerialListenerWorker, LogModel
+from bench_main import run_benchmark, compare
+from colorful_logger_app.core import metrics
 
 app = QApplication([])
 
 
+def tag_id(name):
+    return LOGGER_TAGS.index(find_tag_by_name(name))
+
+
 class TestLogArea(unittest.TestCase):
 
     def setUp(self) -> None:
@@ -15,26 +32,369 @@ class TestLogArea(unittest.TestCase):
         self.n_lines = 0
         with open("fake_logs.txt") as file:
             for line in file.readlines():
-                self.window.log_area.appendPlainText(line.rstrip("\n"))
+                self.window.add_line_to_log_area(line.rstrip("\n"))
                 self.n_lines += 1
 
     def test_insert_text(self):
-        doc: QTextDocument
-        block: QTextBlock
-
         new_line = "New Line"
-        lines = self.window.log_area.document().blockCount()
+        model = self.window.log_model
+        lines = model.rowCount()
         self.assertEqual(lines, self.n_lines, "Expected [{0}], find [{1}]".format(lines, self.n_lines))
-        self.window.log_area.appendPlainText(new_line)
-        lines = self.window.log_area.document().blockCount()
+        self.window.add_line_to_log_area(new_line)
+        lines = model.rowCount()
         self.assertEqual(lines, self.n_lines + 1, "Expected [{0}], find [{1}]".format(lines, self.n_lines + 1))
 
-        doc = self.window.log_area.document()
-        block = doc.lastBlock()
-        self.assertIn(new_line, block.text(), "Expected [{0}], found [{1}]".format(new_line, block.text()))
+        text = model.data(model.index(lines - 1))
+        self.assertIn(new_line, text, "Expected [{0}], found [{1}]".format(new_line, text))
+
+    def test_insert_batch(self):
+        lines = ["batch line {0}".format(i) for i in range(10)]
+        self.window.add_lines_to_log_area(lines)
+        model = self.window.log_model
+        self.assertEqual(model.rowCount(), self.n_lines + len(lines))
+        self.assertEqual(model.data(model.index(model.rowCount() - 1)), lines[-1])
+
+    def test_bounded_store(self):
+        window = MainWindow(max_lines=100)
+        window.add_lines_to_log_area(["line {0}".format(i) for i in range(250)])
+        model = window.log_model
+        self.assertEqual(model.rowCount(), 100)
+        self.assertEqual(model.data(model.index(0)), "line 150")
+        self.assertEqual(window.log_store.n_evicted, 150)
+
+    def test_filter(self):
+        model = self.window.log_model
+        self.window.filter_document("ERROR")
+        error = LOGGER_TAGS.index(find_tag_by_name("ERROR"))
+        tags = {model.data(model.index(row), model.LineRole).tag for row in range(model.rowCount())}
+        self.assertEqual(tags, {0, error})
+        self.window.filter_document("ALL")
+        self.assertEqual(model.rowCount(), self.n_lines)
+
+    def test_filter_tags(self):
+        model = self.window.log_model
+        self.window.filter_document_tags(["DEBUG", "ERROR"])
+        selected = {0, LOGGER_TAGS.index(find_tag_by_name("DEBUG")), LOGGER_TAGS.index(find_tag_by_name("ERROR"))}
+        tags = [model.data(model.index(row), model.LineRole).tag for row in range(model.rowCount())]
+        self.assertTrue(set(tags) <= selected)
+        expected = sum(1 for line in self.window.log_store if line.tag in selected)
+        self.assertEqual(len(tags), expected)
+
+    def test_open_file(self):
+        window = MainWindow()
+        loader = window.open_log_file("fake_logs.txt")
+        loader.wait()
+        app.processEvents()
+        self.assertEqual(window.log_model.rowCount(), self.n_lines)
+        self.assertEqual([line.text for line in window.log_store], [line.text for line in self.window.log_store])
+
+    def test_open_large_file(self):
+        window = MainWindow()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        window.index_cache_dir = directory.name
+        window.add_line_to_log_area("live line")
+        indexer = window.open_large_file("fake_logs.txt")
+        indexer.wait()
+        app.processEvents()
+        model = window.log_model
+        self.assertEqual(model.rowCount(), self.n_lines)
+        self.assertEqual(model.data(model.index(2)), self.window.log_store[2].text)
+        window.filter_document("ERROR")
+        self.assertIn("ERROR - TESTE2", [model.data(model.index(row)) for row in range(model.rowCount())])
+        self.assertTrue(window.index_cache_writer.wait(5000))  # saved out of the GUI thread
+        self.assertEqual(len(os.listdir(directory.name)), 1)
+        window.clear_log_area()
+        self.assertEqual(model.data(model.index(0)), "live line")
+        window.filter_document("ALL")
+        indexer = window.open_large_file("fake_logs.txt")
+        indexer.wait()
+        self.assertEqual(model.rowCount(), self.n_lines)  # from the index cache, before any chunk is added
+        mapped_log = window.mapped_log
+        window.filter_document("ERROR")
+        window.apply_profile(RuleProfile("device", [HighlightRule(RULE_KEYWORD, "TESTE2", "red", tag="WARN")]))
+        while window.retag_timer.isActive():
+            app.processEvents()
+        self.assertIs(window.mapped_log, mapped_log)  # re-tagged, not indexed again
+        self.assertIs(window.file_indexer, indexer)
+        rows = [model.data(model.index(row)) for row in range(model.rowCount())]
+        self.assertEqual(len(rows), self.n_lines - 1)  # the other lines are untagged now
+        self.assertNotIn("ERROR - TESTE2", rows)
+        self.assertEqual(mapped_log.line_at(mapped_log.next_seq - 1).tag, mapped_log.tag_index.tag(
+            mapped_log.next_seq - 1))
+        self.assertTrue(window.index_cache_writer.wait(5000))
+        window.filter_document("ALL")
+        window.open_large_file("fake_logs.txt").wait()
+        self.assertEqual(model.rowCount(), self.n_lines)  # the index saved with the rules of the profile
+        window.close_large_file()
+
+    def test_search(self):
+        filters = self.window.log_filters
+        filters.filter_line.setText("SAIU")
+        filters.filter_search_button.click()
+        while self.window.search_timer.isActive():
+            app.processEvents()
+        expected = sum(1 for line in self.window.log_store if "saiu" in line.text.lower())
+        self.assertEqual(filters.search_count_label.text(), "1 of {0}".format(expected))
+        self.assertIn("saiu", self.window.log_area.currentIndex().data())
+        filters.filter_previous_button.click()
+        self.assertEqual(filters.search_count_label.text(), "{0} of {0}".format(expected))
+
+        self.window.add_line_to_log_area("saiu again")
+        while self.window.search_timer.isActive():
+            app.processEvents()
+        filters.filter_search_button.click()
+        self.assertEqual(filters.search_count_label.text(), "{0} of {0}".format(expected + 1))
+
+    def test_multiple_sources(self):
+        window = MainWindow()
+        first = window.add_source("COM1")
+        second = window.add_source("COM2")
+        window.queue_lines(first, ["COM1 line 0", "COM1 line 1"], [1.0, 3.0])
+        window.queue_lines(second, ["COM2 line 0"], [2.0])
+        self.assertEqual(window.log_model.rowCount(), 0)  # shown on the next refresh only
+        while window.refresh_timer.isActive():
+            app.processEvents()
+        model = window.log_model
+        self.assertEqual([model.data(model.index(row)) for row in range(model.rowCount())],
+                         ["COM1 line 0", "COM2 line 0", "COM1 line 1"])
+        self.assertEqual([line.source for line in window.log_store], [first, second, first])
+        self.assertEqual(window.log_tabs.count(), 3)
+        window.log_tabs.setCurrentIndex(2)
+        self.assertEqual(window.log_model.rowCount(), 1)
+        self.assertEqual(window.log_model.data(window.log_model.index(0)), "COM2 line 0")
+
+    def test_collapse_repeats(self):
+        window = MainWindow()
+        window.set_collapse_repeats(True)
+        source = window.add_source("COM1")
+        window.queue_lines(source, ["ERROR - timeout"] * 5 + ["done"], [float(i) for i in range(6)])
+        while window.refresh_timer.isActive():
+            app.processEvents()
+        model = window.log_model
+        self.assertEqual(model.rowCount(), 2)
+        self.assertEqual(model.data(model.index(0), LogModel.RepeatRole), [4, 4.0])
+        self.assertIsNone(model.data(model.index(1), LogModel.RepeatRole))
+        self.assertEqual(len(window.source_pages[source].log_buffer), 2)
+        window.update_rate_summary()
+        self.assertIn("COM1", window.rates_label.text())
+        self.assertIn("repeated", window.rates_label.text())
+
+    def test_network_source(self):
+        window = MainWindow()
+        source = UdpSyslogSource("127.0.0.1", 0)
+        source_id = window.add_log_source(source)
+        self.assertTrue(source.started.wait(5))
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            client.sendto(b"WARN - over udp", ("127.0.0.1", source.port))
+        deadline = time.monotonic() + 5
+        while window.log_model.rowCount() == 0 and time.monotonic() < deadline:
+            app.processEvents()
+        window.source_loop.stop()
+        self.assertEqual(window.log_model.data(window.log_model.index(0)), "WARN - over udp")
+        self.assertEqual(window.log_store[0].source, source_id)
+
+    @unittest.skipUnless(hasattr(os, "openpty"), "needs a pty")
+    def test_serial_worker(self):
+        master, slave = os.openpty()
+        port = serial.Serial(os.ttyname(slave))
+        worker = SerialListenerWorker(source=3)
+        worker.serial_handler = port
+        directory = tempfile.TemporaryDirectory()
+        worker.journal = JournalWriter(os.path.join(directory.name, "capture.clj"))
+        batches = []
+        worker.batch_signal.connect(lambda source, lines, timestamps: batches.append((source, lines)))
+        worker.start()
+        # a UTF-8 character cut between two writes, a Latin-1 byte and an unfinished line
+        os.write(master, b"INFO - VERS\xc3")
+        time.sleep(0.1)
+        os.write(master, b"\x83O\nERROR - VERS\xc3O\nlast")
+        time.sleep(0.2)
+        worker.stop()
+        self.assertTrue(worker.wait(1000))
+        app.processEvents()
+        lines = [line for source, batch in batches for line in batch]
+        self.assertEqual(lines, ["INFO - VERSÃO", "ERROR - VERS\ufffdO", "last"])
+        self.assertEqual({source for source, batch in batches}, {3})
+        self.assertEqual(worker.n_lines, 3)
+        self.assertGreater(worker.lines_per_second(), 0)
+        worker.journal.close()
+        with JournalReader(worker.journal.path) as journal:
+            records = list(journal)
+        self.assertEqual(b"".join(data for timestamp, source, data in records),
+                         b"INFO - VERS\xc3\x83O\nERROR - VERS\xc3O\nlast")
+        self.assertEqual({source for timestamp, source, data in records}, {3})
+        directory.cleanup()
+        port.close()
+        os.close(master)
+        os.close(slave)
+
+    def test_export(self):
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "export.log")
+        self.window.filter_document("ERROR")
+        self.window.export_view(path).wait()
+        with open(path, encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        model = self.window.log_model
+        self.assertEqual(lines, [model.data(model.index(row)) for row in range(model.rowCount())])
+        directory.cleanup()
+
+    def test_export_query(self):
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "export.log")
+        self.window.filter_document_query("gprs")  # exported before the query is evaluated
+        self.window.export_view(path).wait()
+        with open(path, encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        model = self.window.log_model
+        self.assertTrue(lines)
+        self.assertLess(len(lines), self.n_lines)
+        self.assertEqual(lines, [model.data(model.index(row)) for row in range(model.rowCount())])
+        directory.cleanup()
+
+    def test_time_range(self):
+        window = self.window
+        window.log_filters.log_types.setCurrentText("DEBUG")
+        window.log_filters.time_from_line.setText("15:06:32")
+        window.log_filters.time_to_line.setText("15:06:33")
+        window.log_filters.get_time_range()
+        model = window.log_model
+        texts = [model.data(model.index(row)) for row in range(model.rowCount())]
+        self.assertTrue(texts)
+        self.assertTrue(all(text.startswith("[2020/04/11 15:06:3") for text in texts))
+        self.assertTrue(all(" DEBUG " in text or " INFO " not in text for text in texts))
+        window.filter_document_time("", "")
+        window.jump_to_time("15:07:04")
+        current = model.data(window.log_area.currentIndex())
+        self.assertTrue(current.startswith("[2020/04/11 15:07:04]"))
+
+    def test_query(self):
+        window = self.window
+        window.log_filters.query_line.setText('tag>=WARN and func~"tcp"')
+        window.log_filters.get_query()
+        while window.query_timer.isActive():
+            app.processEvents()
+        model = window.log_model
+        texts = [model.data(model.index(row)) for row in range(model.rowCount())]
+        self.assertTrue(texts)
+        self.assertTrue(all("tcp" in text and (" ERROR " in text or " WARN " in text) for text in texts))
+        self.assertEqual(window.log_filters.query_count_label.text(), "{0} lines".format(len(texts)))
+        window.filter_document_query("")
+        self.assertEqual(model.rowCount(), self.n_lines)
+
+    def test_sources_panel(self):
+        window = self.window
+        window.set_sources_visible(True)
+        functions = window.sources_tree.topLevelItem(1)
+        items = {functions.child(index).text(0): functions.child(index) for index in range(functions.childCount())}
+        self.assertIn("displayShowMessageDialog", items)
+        window.sources_tree.itemClicked.emit(items["displayShowMessageDialog"], 0)
+        while window.query_timer.isActive():
+            app.processEvents()
+        model = window.log_model
+        texts = [model.data(model.index(row)) for row in range(model.rowCount())]
+        self.assertEqual(len(texts), int(items["displayShowMessageDialog"].text(1)))
+        self.assertTrue(all("[displayShowMessageDialog]" in text for text in texts))
+        self.assertEqual(window.log_filters.query_line.text(), 'func="displayShowMessageDialog"')
+        window.set_sources_visible(False)
+        window.filter_document_query("")
+
+    def test_lazy_startup(self):
+        window = self.window
+        self.assertIsNone(window.serial_dialog)
+        self.assertIsNone(window.highlight_options_dialog)
+        self.assertIsNone(window.source_loop)
+        modules = {"asyncio", "serial", "multiprocessing", "PyQt5.Qt"} | {
+            "colorful_logger_app.core." + name for name in ["bulk", "export", "handoff", "indexcache", "journal",
+                                                            "mapped", "profiles", "search", "sources"]}
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for module in ["colorful_logger_app.logger_gui", "app_main"]:
+            code = "import sys, {0}; print(sorted(set(sys.modules) & {1!r}))".format(module, modules)
+            output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                    cwd=root).stdout
+            self.assertEqual(output.strip(), "[]", module)
+
+    def test_highlight_cache(self):
+        delegate = self.window.log_area.itemDelegate()
+        self.window.resize(800, 600)
+        self.window.log_area.grab()
+        cached = len(delegate._layouts)
+        self.assertGreater(cached, 0)
+        self.assertLess(cached, self.n_lines)  # only the visible rows
+        self.window.log_area.grab()
+        self.assertEqual(len(delegate._layouts), cached)
+        delegate.set_options(hex_dump=True)
+        self.assertEqual(len(delegate._layouts), 0)
+        ranges = delegate.highlightBlock("INFO - rx 0A 1B 2C 3D crc 0x1F40 id 12")
+        self.assertEqual([(r.start, r.length) for r in ranges[1:]], [(10, 11), (26, 6)])
+
+    def test_apply_profile(self):
+        window = self.window
+        model = window.log_model
+        window.filter_document_tags(["ERROR"])
+        self.assertIn("ERROR - TESTE2", [model.data(model.index(row)) for row in range(model.rowCount())])
+        window.apply_profile(RuleProfile("device", [HighlightRule(RULE_KEYWORD, "TESTE2", "red", tag="WARN")]))
+        while window.retag_timer.isActive():
+            app.processEvents()
+        rows = [model.data(model.index(row)) for row in range(model.rowCount())]
+        self.assertEqual(len(rows), self.n_lines - 1)  # the other lines are untagged now
+        self.assertNotIn("ERROR - TESTE2", rows)
+        window.add_line_to_log_area("DEBUG TESTE2")
+        self.assertEqual(window.log_buffer.line_at(window.log_buffer.next_seq - 1).tag, tag_id("WARN"))
+        ranges = window.log_area.itemDelegate().highlightBlock("ERROR - TESTE2")
+        self.assertEqual([(r.start, r.length) for r in ranges], [(8, 6)])
+
+    def test_benchmark(self):
+        results = run_benchmark(2000)
+        self.assertEqual(results["lines"], 2000)
+        self.assertGreater(results["search_matches"], 0)
+        self.assertGreater(results["append_lines_per_s"], 0)
+        slower = dict(results, append_lines_per_s=results["append_lines_per_s"] / 2,
+                      filter_by_tag_ms=results["filter_by_tag_ms"] * 0.5)
+        self.assertEqual([name for size, name, old, new in compare({"2000": slower}, {"2000": results}, 0.2)],
+                         ["append_lines_per_s"])
+
+    def test_metrics(self):
+        window = self.window
+        window.set_metrics_enabled(True)
+        try:
+            window.queue_lines(0, ["ERROR - queued"], [time.time()])
+            window.flush_pending_lines()
+            window.filter_document_tags(["ERROR"])
+            window.log_filters.filter_line.setText("TESTE")
+            window.search_log_area()
+            window.log_area.grab()
+            window.update_metrics_panel()
+        finally:
+            window.set_metrics_enabled(False)
+        values = metrics.snapshot()
+        for name in ("flush_pending_lines", "log_filter_by_tag", "search_log_area", "highlightBlock"):
+            self.assertGreater(values[name]["count"], 0, name)
+        self.assertEqual(values["store.lines"]["value"], self.n_lines + 1)
+        self.assertIn("store {0} lines".format(self.n_lines + 1), window.metrics_label.text())
+        self.assertEqual(window.metrics_table.rowCount(), len(values))
+        count = values["highlightBlock"]["count"]
+        window.log_area.itemDelegate().highlightBlock("INFO - not measured")
+        self.assertEqual(metrics.histogram("highlightBlock").count, count)
+
+    def test_overload(self):
+        window = self.window
+        window.line_queue.max_lines = 1000
+        reader = threading.Thread(target=lambda: [window.line_queue.put(1, ["storm {0}".format(i)] * 100,
+                                                                         [time.time()] * 100) for i in range(50)])
+        reader.start()
+        reader.join()
+        self.assertEqual(len(window.line_queue), 1000)
+        while window.refresh_timer.isActive() or not window.log_store[-1].text.startswith("storm"):
+            app.processEvents()
+        texts = [line.text for line in window.log_store][self.n_lines:]
+        self.assertEqual(texts[0], "<<< 4000 lines dropped >>>")
+        self.assertEqual(texts[1:], ["storm {0}".format(i) for i in range(40, 50) for _ in range(100)])
 
     def test_button_clear(self):
-        pass
+        self.window.log_filters.filter_clear_button.click()
+        self.assertEqual(self.window.log_model.rowCount(), 0)
 
 
 if __name__ == '__main__':